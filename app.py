@@ -5,29 +5,76 @@
 整合所有组件的主入口
 """
 
+import argparse
 import asyncio
+import os
+import time
 from datetime import datetime
 
 # 导入核心组件
-from storage.sbt_engine import SBTEngineAdapter
+from storage.engines import ENGINES, create_storage_engine
+from core.memory import allocation_report, format_size, parse_size, start_tracing, tracing_enabled
 from core.storage_adapter import TaskStorageAdapter
+from core.task_codec import TaskMigrator
+from core.tenants import TenantRepositories
 from services.todo_service import TodoService
 from services.weather_service import MockWeatherService
+from core.metrics import metrics
+from core.tracing import tracer
 
 
 class Application:
     """主应用程序类"""
     
-    def __init__(self):
-        # 初始化存储引擎
-        self.storage_engine = SBTEngineAdapter("app_data.dat")
+    def __init__(self, enable_metrics: bool = False, trace_sample_rate: float = None,
+                 profile: bool = None, lazy_start: bool = False, engine: str = None,
+                 compression: str = None, data_file: str = "app_data.dat",
+                 memory_budget: str = None, budget_policy: str = None, trace_memory: bool = None):
+        # 内存分配诊断（也可通过 TODO_APP_TRACEMALLOC=1 开启），尽早开始以记录加载数据的分配
+        if trace_memory or (trace_memory is None and os.environ.get("TODO_APP_TRACEMALLOC", "") == "1"):
+            start_tracing()
+        
+        # 启用指标采集（也可通过环境变量 TODO_APP_METRICS=1 启用）
+        if enable_metrics:
+            metrics.enable()
+        
+        # 追踪采样与性能剖析（也可通过 TODO_APP_TRACE_SAMPLE / TODO_APP_PROFILE 设置）
+        tracer.configure(sample_rate=trace_sample_rate, profile=profile)
+        
+        # 初始化存储引擎（lazy_start 时后台加载数据，构造立即返回）
+        # 内存索引结构可选 sbt / sbt_arena / sorted_array / skiplist / hash（也可通过环境变量
+        # TODO_APP_ENGINE 设置），各引擎的数据文件格式相同，可以直接切换；lsm 打开已有数据文件时自动导入
+        # 快照压缩可选 zlib / lzma，可带级别如 zlib:9（也可通过 TODO_APP_COMPRESSION 设置）
+        self.engine_name = engine or os.environ.get("TODO_APP_ENGINE", "sbt")
+        self.compression = compression or os.environ.get("TODO_APP_COMPRESSION")
+        self.data_file = data_file
+        # 内存预算如 512MB，超出时告警或把冷数据溢出到磁盘（budget_policy 为 warn / spill，
+        # 也可通过 TODO_APP_MEMORY_BUDGET / TODO_APP_MEMORY_POLICY 设置）
+        memory_budget = memory_budget or os.environ.get("TODO_APP_MEMORY_BUDGET")
+        self.memory_budget = parse_size(str(memory_budget)) if memory_budget else None
+        self.budget_policy = budget_policy or os.environ.get("TODO_APP_MEMORY_POLICY", "warn")
+        self.storage_engine = create_storage_engine(self.engine_name, data_file, lazy=lazy_start,
+                                                    compression=self.compression,
+                                                    memory_budget=self.memory_budget,
+                                                    budget_policy=self.budget_policy)
         
         # 初始化任务存储适配器
         self.task_repository = TaskStorageAdapter(self.storage_engine)
+        # 旧版任务记录在后台改写为紧凑格式，读取不受影响
+        self.migrator = TaskMigrator(self.task_repository).start()
         
         # 初始化服务
         self.todo_service = TodoService(self.task_repository)
         self.weather_service = MockWeatherService()
+        
+        # 按用户分区的任务仓库，每个租户使用独立的数据文件，按需加载
+        self.tenants = TenantRepositories(
+            "tenants", lambda path: create_storage_engine(self.engine_name, path,
+                                                          compression=self.compression))
+    
+    def todo_service_for(self, tenant_id: str) -> TodoService:
+        """指定租户的任务服务（在当前请求内使用）"""
+        return TodoService(self.tenants.repository(tenant_id))
     
     async def run_demo(self):
         """运行演示程序"""
@@ -89,12 +136,17 @@ class Application:
         print(f"   待完成: {stats['pending']}")
         print(f"   完成率: {stats['completion_rate']:.1%}")
         
+        # 全文检索
+        results = self.todo_service.search_tasks("存储引擎")
+        print(f"   检索 '存储引擎': {[task.text for task in results]}")
+        
         print()
         
         # 3. 存储引擎演示
         print("3. 存储引擎状态:")
+        print(f"   存储引擎: {self.engine_name}")
         print(f"   存储的数据项: {self.storage_engine.size()}")
-        print(f"   存储文件: app_data.dat")
+        print(f"   存储文件: {self.data_file}")
         
         # 显示存储的原始数据
         all_data = self.storage_engine.get_all()
@@ -106,9 +158,14 @@ class Application:
         print("4. 持久化测试:")
         print("   重新创建应用实例...")
         
-        # 创建新的应用实例
-        new_app = Application()
-        restored_tasks = new_app.todo_service.get_all_tasks()
+        # 创建新的应用实例（延迟加载，只读检查无需等待树构建完成），用完即关闭
+        new_app = Application(lazy_start=True, engine=self.engine_name,
+                              compression=self.compression, data_file=self.data_file,
+                              memory_budget=self.memory_budget, budget_policy=self.budget_policy)
+        try:
+            restored_tasks = new_app.todo_service.get_all_tasks()
+        finally:
+            new_app.close()
         
         print(f"   恢复的任务数量: {len(restored_tasks)}")
         print("   恢复的任务:")
@@ -118,15 +175,44 @@ class Application:
         
         print("\n=== 演示完成 ===")
     
+    def metrics_report(self) -> str:
+        """导出Prometheus文本格式的指标"""
+        return metrics.render_prometheus()
+    
+    def memory_report(self) -> str:
+        """存储和派生索引的内存占用，开启诊断时附带分配最多的代码位置"""
+        usage = self.task_repository.memory_usage()
+        storage = usage["storage"]
+        lines = [f"内存估算: {format_size(usage['total'])}"]
+        if storage:
+            lines.append(f"  存储 {storage['items']} 项: 节点 {format_size(storage['nodes'])}，"
+                         f"键 {format_size(storage['keys'])}，值 {format_size(storage['values'])}")
+            if storage.get("spilled"):
+                lines.append(f"  已溢出 {storage['spilled']} 个值（{format_size(storage['spill_file_bytes'])}）")
+        lines.append(f"  检索索引 {format_size(usage['index'])}，时间索引 {format_size(usage['schedule_index'])}")
+        if tracing_enabled():
+            lines.append(allocation_report())
+        return "\n".join(lines)
+    
+    def close(self):
+        """关闭前停止迁移并持久化检索索引"""
+        self.migrator.stop()
+        self.task_repository.flush_index()
+        self.tenants.close()
+    
     def cleanup(self):
-        """清理资源"""
+        """清理资源：清空数据并删除数据文件"""
         print("清理应用数据...")
         self.storage_engine.clear()
+        self.task_repository.drop_index()
+        if os.path.exists(self.data_file):
+            os.remove(self.data_file)
 
 
-async def main():
-    """主函数"""
-    app = Application()
+async def main(**options):
+    """主函数（options 为 Application 的构造参数）"""
+    # 延迟加载：数据在后台载入，与天气请求并行
+    app = Application(lazy_start=True, **options)
     
     try:
         await app.run_demo()
@@ -135,6 +221,26 @@ async def main():
     except Exception as e:
         print(f"程序运行出错: {e}")
     finally:
+        app.close()
+        
+        # 输出指标
+        if metrics.enabled:
+            metrics.dump("app_metrics.prom")
+            print("\n指标已写入 app_metrics.prom")
+        
+        # 输出追踪数据
+        if tracer.enabled:
+            count = tracer.export_chrome_trace("app_trace.json")
+            print(f"追踪数据已写入 app_trace.json ({count} 个span)")
+            if tracer.export_profile("app_profile.prof"):
+                print("剖析数据已写入 app_profile.prof")
+        
+        # 输出内存分配诊断
+        if tracing_enabled():
+            with open("app_memory.txt", "w", encoding="utf-8") as f:
+                f.write(app.memory_report() + "\n")
+            print("内存诊断已写入 app_memory.txt")
+        
         # 询问是否清理数据
         try:
             choice = input("\n是否清理测试数据? (y/N): ").strip().lower()
@@ -144,9 +250,93 @@ async def main():
             pass
 
 
-def cli_main():
+async def serve_main(host: str, port: int, **options):
+    """HTTP任务API服务"""
+    from services.http_api import serve
+    
+    app = Application(lazy_start=True, **options)
+    try:
+        await serve(app.todo_service, host, port)
+    finally:
+        app.close()
+
+
+def simulate_main(args, **options) -> None:
+    """负载模拟（非交互）"""
+    import json
+    from services.load_simulator import LoadSimulator, parse_mix
+    
+    app = Application(data_file=args.data_file, **options)
+    try:
+        simulator = LoadSimulator(app.todo_service, MockWeatherService(latency=args.weather_latency),
+                                  mix=parse_mix(args.mix), clients=args.clients, mode=args.mode,
+                                  seed=args.seed, data_file=app.data_file)
+        start = time.perf_counter()
+        simulator.seed_tasks(args.tasks)
+        print(f"预置 {args.tasks} 个任务: {time.perf_counter() - start:.2f}s")
+        report = simulator.run(args.operations)
+        if args.json:
+            data = report.as_dict()
+            data["memory"] = app.task_repository.memory_usage()
+            print(json.dumps(data, ensure_ascii=False, indent=2))
+        else:
+            print(report.format())
+            print()
+            print(app.memory_report())
+    finally:
+        app.close()
+        if not args.keep:
+            app.cleanup()
+
+
+def cli_main(argv=None):
     """命令行入口点"""
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(prog="todo-app", description="基于SBT算法的Todo和天气应用")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("demo", help="运行演示程序（默认）")
+    serve_parser = subparsers.add_parser("serve", help="启动HTTP任务API服务")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    serve_parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    sim_parser = subparsers.add_parser("simulate", aliases=["bench"],
+                                       help="负载模拟：预置任务后并发重放操作，报告吞吐和延迟")
+    sim_parser.add_argument("--tasks", type=int, default=10000, help="预置任务数")
+    sim_parser.add_argument("--operations", type=int, default=20000, help="重放的操作总数")
+    sim_parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    sim_parser.add_argument("--mode", choices=["asyncio", "threads"], default="asyncio",
+                            help="客户端为 asyncio 协程或工作线程")
+    sim_parser.add_argument("--mix", help="操作比例，如 create=15,toggle=25,update=15,delete=5,"
+                                          "list=25,stats=10,weather=5")
+    sim_parser.add_argument("--weather-latency", type=float, default=0.05, help="模拟天气请求延迟（秒）")
+    sim_parser.add_argument("--seed", type=int, help="随机种子")
+    sim_parser.add_argument("--data-file", default="simulate_data.dat", help="模拟使用的数据文件")
+    sim_parser.add_argument("--keep", action="store_true", help="保留模拟数据")
+    sim_parser.add_argument("--json", action="store_true", help="以JSON输出报告")
+    parser.add_argument("--engine", choices=sorted(ENGINES), help="存储引擎（默认sbt）")
+    parser.add_argument("--compression", help="数据文件压缩方式：none / zlib / lzma，可带级别如 zlib:9")
+    parser.add_argument("--memory-budget", help="内存预算，如 512MB，超出时按 --memory-policy 处理")
+    parser.add_argument("--memory-policy", choices=["warn", "spill"],
+                        help="超出内存预算时告警（默认）或把冷数据溢出到磁盘")
+    parser.add_argument("--trace-memory", action="store_true", help="用 tracemalloc 记录内存分配并输出报告")
+    args = parser.parse_args(argv)
+    
+    # 命令行选项作为构造参数传入，未指定的仍按环境变量和默认值
+    options = {
+        "engine": args.engine,
+        "compression": args.compression,
+        "memory_budget": args.memory_budget,
+        "budget_policy": args.memory_policy,
+        "trace_memory": True if args.trace_memory else None,
+    }
+    
+    if args.command in ("simulate", "bench"):
+        simulate_main(args, **options)
+    elif args.command == "serve":
+        try:
+            asyncio.run(serve_main(args.host, args.port, **options))
+        except KeyboardInterrupt:
+            print("\n服务已停止")
+    else:
+        asyncio.run(main(**options))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务记录编解码基准测试
+比较旧版字典记录（ISO 时间字符串）与紧凑元组记录的编码/解码吞吐、pickle 大小和内存占用，
+并测量 get_all_tasks 的端到端耗时
+
+用法: python benchmarks/bench_codec.py [--count 100000] [--repeat 3]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.interfaces import Task
+from core.storage_adapter import TaskStorageAdapter
+from core.task_codec import _decode_legacy, decode_task, encode_task
+from storage.sbt_engine import SBTEngineAdapter
+
+
+def make_tasks(count: int) -> list:
+    """生成任务，部分带更新时间和截止时间"""
+    start = datetime(2026, 1, 1)
+    tasks = []
+    for i in range(count):
+        created = start + timedelta(seconds=i * 37, microseconds=i)
+        tasks.append(Task(
+            id=f"task-{i:08x}",
+            text=f"完成第 {i} 项工作",
+            completed=i % 3 == 0,
+            created_at=created,
+            updated_at=created + timedelta(hours=2) if i % 4 == 0 else None,
+            due_at=created + timedelta(days=1) if i % 5 == 0 else None,
+        ))
+    return tasks
+
+
+def encode_legacy(task: Task) -> dict:
+    """旧版字典记录"""
+    return {
+        "id": task.id,
+        "text": task.text,
+        "completed": task.completed,
+        "created_at": task.created_at.isoformat(),
+        "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+        "due_at": task.due_at.isoformat() if task.due_at else None,
+        "remind_at": task.remind_at.isoformat() if task.remind_at else None,
+    }
+
+
+def best_of(repeat: int, fn) -> float:
+    """多次运行取最短耗时"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def retained_bytes(build) -> int:
+    """build() 返回的对象占用的内存"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def measure_get_all(tasks: list, encode, repeat: int) -> float:
+    """以给定格式写入存储后 get_all_tasks 的耗时"""
+    path = "bench_codec.dat"
+    engine = SBTEngineAdapter(path)
+    try:
+        engine.replace_all(sorted((f"task:{t.id}", encode(t)) for t in tasks))
+        repository = TaskStorageAdapter(engine)
+        return best_of(repeat, repository.get_all_tasks)
+    finally:
+        engine.clear()
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="任务记录编解码基准")
+    parser.add_argument("--count", type=int, default=100000, help="任务数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最好成绩）")
+    args = parser.parse_args()
+    
+    tasks = make_tasks(args.count)
+    formats = [("dict (v1)", encode_legacy, _decode_legacy), ("tuple (v2)", encode_task, decode_task)]
+    
+    print(f"{args.count} 个任务\n")
+    print(f"{'格式':<12}{'编码/s':>12}{'解码/s':>12}{'pickle':>10}{'内存':>10}{'get_all':>10}")
+    for name, encode, decode in formats:
+        records = [encode(t) for t in tasks]
+        assert [decode(r) for r in records] == tasks, name
+        encode_time = best_of(args.repeat, lambda: [encode(t) for t in tasks])
+        decode_time = best_of(args.repeat, lambda: [decode(r) for r in records])
+        size = len(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL))
+        memory = retained_bytes(lambda: [encode(t) for t in tasks])
+        get_all = measure_get_all(tasks, encode, args.repeat)
+        print(f"{name:<12}{args.count / encode_time:>12,.0f}{args.count / decode_time:>12,.0f}"
+              f"{size / args.count:>9.0f}B{memory / args.count:>9.0f}B{get_all:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快照压缩基准测试
+比较原始 pickle、整体 zlib 压缩的 pickle 与前缀/字段列编码加块压缩的文件大小和编解码耗时
+
+用法: python benchmarks/bench_compression.py [--count 100000] [--modes pickle zlib lzma:0] [--workers 4]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.snapshot_codec import decode_snapshot, encode_snapshot, parse_compression
+
+
+def make_items(count: int) -> list:
+    """生成与任务存储相同形式的有序键值对"""
+    start = datetime(2026, 1, 1)
+    items = []
+    for i in range(count):
+        task_id = f"task-{i:08x}"
+        created = start + timedelta(seconds=i * 37)
+        items.append((f"task:{task_id}", {
+            "id": task_id,
+            "text": f"完成第 {i} 项工作",
+            "completed": i % 3 == 0,
+            "created_at": created.isoformat(),
+            "updated_at": (created + timedelta(hours=2)).isoformat() if i % 4 == 0 else None,
+        }))
+    return items
+
+
+def codec_for(mode: str, workers: int = 1):
+    """返回(编码, 解码)函数"""
+    if mode == "pickle":
+        return (lambda items: pickle.dumps({"format": 2, "seq": 0, "items": items}),
+                lambda data: pickle.loads(data)["items"])
+    if mode == "pickle+zlib":
+        return (lambda items: zlib.compress(pickle.dumps({"format": 2, "seq": 0, "items": items})),
+                lambda data: pickle.loads(zlib.decompress(data))["items"])
+    codec, level = parse_compression(mode)
+    return (lambda items: encode_snapshot(items, 0, codec, level),
+            lambda data: decode_snapshot(data, workers)[0])
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="快照压缩基准")
+    parser.add_argument("--count", type=int, default=100000, help="任务数量")
+    parser.add_argument("--modes", nargs="+",
+                        default=["pickle", "pickle+zlib", "zlib:1", "zlib", "zlib:9", "lzma:0", "lzma"])
+    parser.add_argument("--workers", type=int, default=1, help="块格式加载时的解压线程数")
+    args = parser.parse_args()
+    
+    items = make_items(args.count)
+    raw_size = len(pickle.dumps({"format": 2, "seq": 0, "items": items}))
+    
+    print(f"{args.count} 个任务，原始 pickle {raw_size / 1024 / 1024:.1f}MB\n")
+    print(f"{'方式':<14}{'大小':>10}{'压缩比':>8}{'保存':>10}{'加载':>10}{'保存MB/s':>10}{'加载MB/s':>10}")
+    for mode in args.modes:
+        encode, decode = codec_for(mode, args.workers)
+        start = time.perf_counter()
+        data = encode(items)
+        save = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = decode(data)
+        load = time.perf_counter() - start
+        assert decoded == items, mode
+        mb = raw_size / 1024 / 1024
+        print(f"{mode:<14}{len(data) / 1024:>8.0f}KB{raw_size / len(data):>7.1f}x"
+              f"{save:>9.3f}s{load:>9.3f}s{mb / save:>10.1f}{mb / load:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
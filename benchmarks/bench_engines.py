@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储引擎内存索引基准测试
+在相同的操作序列下比较 SBT、有序数组、跳表和哈希+有序键，报告每种负载的最快实现
+
+只测内存索引本身，不包含持久化（各引擎的持久化代码相同）。
+
+用法: python benchmarks/bench_engines.py [--size 100000] [--ops 100000] [--engines sbt hash]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.engines import INDEXES
+
+
+def key_of(i: int) -> str:
+    """与任务键形式相同的键"""
+    return f"task:task-{i:08x}"
+
+
+def make_ops(mix: str, size: int, count: int, seed: int) -> list:
+    """生成操作序列：(操作, 键编号)"""
+    rng = random.Random(seed)
+    ops = []
+    next_key = size
+    for _ in range(count):
+        r = rng.random()
+        if mix == "point_read":
+            ops.append(("search", rng.randrange(size)))
+        elif mix == "read_heavy":
+            ops.append(("search" if r < 0.9 else "update", rng.randrange(size)))
+        elif mix == "write_heavy":
+            if r < 0.5:
+                ops.append(("upsert", next_key))
+                next_key += 1
+            else:
+                ops.append(("search", rng.randrange(next_key)))
+        elif mix == "churn":
+            if r < 0.4:
+                ops.append(("upsert", next_key))
+                next_key += 1
+            elif r < 0.8:
+                ops.append(("delete", rng.randrange(next_key)))
+            else:
+                ops.append(("search", rng.randrange(next_key)))
+        elif mix == "scan":
+            # 每100次写入做一次全量有序遍历（相当于每次保存快照）
+            if r < 0.01:
+                ops.append(("get_all", 0))
+            else:
+                ops.append(("upsert", rng.randrange(size * 2)))
+    return ops
+
+
+MIXES = {
+    "point_read": "100% 点查询",
+    "read_heavy": "90% 查询 / 10% 更新",
+    "write_heavy": "50% 新增 / 50% 查询",
+    "churn": "40% 新增 / 40% 删除 / 20% 查询",
+    "scan": "99% 写入 / 1% 全量遍历",
+}
+
+
+def run_ops(index, ops: list, keys: dict) -> float:
+    """执行操作序列，返回耗时"""
+    search, upsert, update, delete, get_all = (index.search, index.upsert, index.update,
+                                               index.delete, index.get_all)
+    start = time.perf_counter()
+    for op, i in ops:
+        if op == "search":
+            search(keys[i])
+        elif op == "upsert":
+            upsert(keys[i], i)
+        elif op == "update":
+            update(keys[i], i)
+        elif op == "delete":
+            delete(keys[i])
+        else:
+            get_all()
+    return time.perf_counter() - start
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="存储引擎内存索引基准")
+    parser.add_argument("--size", type=int, default=100000, help="初始数据量")
+    parser.add_argument("--ops", type=int, default=100000, help="每种负载的操作数")
+    parser.add_argument("--engines", nargs="+", choices=sorted(INDEXES), default=list(INDEXES))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    
+    items = [(key_of(i), i) for i in range(args.size)]
+    keys = {}
+    
+    print(f"初始数据量 {args.size}，每种负载 {args.ops} 次操作（单位：千次操作/秒）\n")
+    print(f"{'负载':<14}" + "".join(f"{name:>14}" for name in args.engines) + f"{'最快':>14}")
+    
+    # 加载：由有序快照构建
+    row = {}
+    for name in args.engines:
+        start = time.perf_counter()
+        INDEXES[name]().load(items)
+        row[name] = args.size / (time.perf_counter() - start) / 1000
+    results = {"load": row}
+    
+    for mix in MIXES:
+        ops = make_ops(mix, args.size, args.ops, args.seed)
+        for _, i in ops:
+            if i not in keys:
+                keys[i] = key_of(i)
+        row = {}
+        for name in args.engines:
+            index = INDEXES[name]()
+            index.load(items)
+            row[name] = len(ops) / run_ops(index, ops, keys) / 1000
+        results[mix] = row
+    
+    for mix, row in results.items():
+        winner = max(row, key=row.get)
+        print(f"{mix:<14}" + "".join(f"{row[name]:>14.1f}" for name in args.engines) + f"{winner:>14}")
+    
+    print()
+    for mix, description in MIXES.items():
+        print(f"  {mix:<12} {description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+树结构内存占用基准测试
+用 tracemalloc 测量各内存索引在给定键数下每项的结构开销（不含键和值本身）
+
+对照组 dict 节点为加 __slots__ 之前的 SBTNode 写法。
+
+用法: python benchmarks/bench_memory.py [--count 1000000] [--engines sbt sbt_arena]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sbt_storage_engine
+from storage.engines import INDEXES
+
+
+class DictSBTNode:
+    """未使用 __slots__ 的节点（对照组）"""
+    
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.left = None
+        self.right = None
+        self.size = 1
+        self.version = 0
+
+
+def measure(factory, items: list) -> tuple:
+    """返回(结构占用字节数, 构建耗时)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = factory()
+    index.load(items)
+    elapsed = time.perf_counter() - start
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # 构建过程中访问一次，防止被提前回收
+    assert index.size() == len(items)
+    return used, elapsed
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="树结构内存占用基准")
+    parser.add_argument("--count", type=int, default=1000000, help="键数量")
+    parser.add_argument("--engines", nargs="+", choices=["sbt_dict"] + sorted(INDEXES),
+                        default=["sbt_dict", "sbt", "sbt_arena", "sorted_array", "skiplist", "hash"])
+    args = parser.parse_args()
+    
+    # 键和值在测量前创建，所有索引共享
+    items = [(f"task:task-{i:08x}", i) for i in range(args.count)]
+    
+    print(f"{args.count} 个键（不含键和值本身的占用）\n")
+    print(f"{'索引':<14}{'总占用':>12}{'每项字节':>10}{'构建耗时':>10}")
+    for name in args.engines:
+        if name == "sbt_dict":
+            original = sbt_storage_engine.SBTNode
+            sbt_storage_engine.SBTNode = DictSBTNode
+            try:
+                used, elapsed = measure(sbt_storage_engine.SBTTree, items)
+            finally:
+                sbt_storage_engine.SBTNode = original
+        else:
+            used, elapsed = measure(INDEXES[name], items)
+        print(f"{name:<14}{used / 1024 / 1024:>10.1f}MB{used / args.count:>10.1f}{elapsed:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准测试
+比较逐条插入加载、线性构建加载和延迟加载在不同数据量下的启动时间
+
+用法: python benchmarks/bench_startup.py [--sizes 10000 100000 1000000] [--legacy]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sbt_storage_engine import SBTStorageEngine, SBTTree
+
+
+def make_data_file(path: str, count: int) -> None:
+    """生成包含 count 个任务的有序快照文件"""
+    now = datetime.now().isoformat()
+    items = []
+    for i in range(count):
+        task_id = f"task-{i:08x}"
+        items.append((f"task:{task_id}", {
+            "id": task_id,
+            "text": f"任务 {i}",
+            "completed": i % 3 == 0,
+            "created_at": now,
+            "updated_at": None,
+        }))
+    with open(path, 'wb') as f:
+        pickle.dump(items, f)
+
+
+def measure_legacy(path: str) -> float:
+    """原始加载方式：逐条插入"""
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    tree = SBTTree()
+    for key, value in data:
+        tree.insert(key, value)
+    return time.perf_counter() - start
+
+
+def measure_eager(path: str) -> float:
+    """同步加载（线性构建）"""
+    start = time.perf_counter()
+    SBTStorageEngine(path)
+    return time.perf_counter() - start
+
+
+def measure_lazy(path: str, probe_key: str) -> tuple:
+    """延迟加载：构造耗时、首次点查询耗时、完全加载耗时"""
+    start = time.perf_counter()
+    engine = SBTStorageEngine(path, lazy=True)
+    opened = time.perf_counter() - start
+    engine.search(probe_key)
+    first_read = time.perf_counter() - start
+    engine.wait_until_loaded()
+    loaded = time.perf_counter() - start
+    return opened, first_read, loaded
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="SBT存储引擎启动耗时基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--legacy", action="store_true", help="同时测量逐条插入的原始加载方式")
+    args = parser.parse_args()
+    
+    path = "bench_startup.dat"
+    print(f"{'任务数':>10} {'文件大小':>10} {'逐条插入':>10} {'同步加载':>10} "
+          f"{'延迟-构造':>10} {'延迟-首读':>10} {'延迟-完成':>10}")
+    try:
+        for count in args.sizes:
+            make_data_file(path, count)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            legacy = f"{measure_legacy(path):.3f}s" if args.legacy else "-"
+            eager = measure_eager(path)
+            opened, first_read, loaded = measure_lazy(path, f"task:task-{count // 2:08x}")
+            print(f"{count:>10} {size_mb:>8.1f}MB {legacy:>10} {eager:>9.3f}s "
+                  f"{opened * 1000:>8.2f}ms {first_read:>9.3f}s {loaded:>9.3f}s")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
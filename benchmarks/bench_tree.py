@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SBT树操作基准测试
+比较迭代实现（显式路径栈，只在失衡节点上维护）与原先的递归实现
+
+用法: python benchmarks/bench_tree.py [--size 100000] [--ops 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sbt_storage_engine import ArenaSBTTree, SBTNode, SBTTree
+
+
+class RecursiveSBTTree(SBTTree):
+    """递归实现（对照组）：每层一个栈帧，回溯时每层都调用 _maintain"""
+    
+    def _insert(self, node, key, value):
+        if not node:
+            return SBTNode(key, value)
+        if key < node.key:
+            node.left = self._insert(node.left, key, value)
+        elif key > node.key:
+            node.right = self._insert(node.right, key, value)
+        else:
+            node.value = value
+            return node
+        self._update_size(node)
+        return self._maintain(node)
+    
+    def _delete(self, node, key):
+        if not node:
+            return None
+        if key < node.key:
+            node.left = self._delete(node.left, key)
+        elif key > node.key:
+            node.right = self._delete(node.right, key)
+        else:
+            if not node.left:
+                return node.right
+            elif not node.right:
+                return node.left
+            min_node = node.right
+            while min_node.left:
+                min_node = min_node.left
+            node.key = min_node.key
+            node.value = min_node.value
+            node.right = self._delete(node.right, min_node.key)
+        self._update_size(node)
+        return self._maintain(node)
+    
+    def _search(self, node, key):
+        if not node:
+            return None
+        if key == node.key:
+            return node.value
+        elif key < node.key:
+            return self._search(node.left, key)
+        return self._search(node.right, key)
+    
+    def _inorder(self, node, result):
+        if node:
+            self._inorder(node.left, result)
+            result.append((node.key, node.value))
+            self._inorder(node.right, result)
+    
+    def upsert(self, key, value, version=0):
+        before = self.size()
+        self.root = self._insert(self.root, key, value)
+        return self.size() > before
+    
+    def delete(self, key):
+        before = self.size()
+        self.root = self._delete(self.root, key)
+        return self.size() < before
+    
+    def search(self, key):
+        return self._search(self.root, key)
+    
+    def get_all(self):
+        result = []
+        self._inorder(self.root, result)
+        return result
+
+
+TREES = {
+    "recursive": RecursiveSBTTree,
+    "iterative": SBTTree,
+    "arena": ArenaSBTTree,
+}
+
+
+def make_workloads(size: int, count: int, seed: int) -> dict:
+    """生成各负载的操作序列"""
+    rng = random.Random(seed)
+    universe = [f"task:task-{i:08x}" for i in range(size * 2)]
+    existing = universe[:size]
+    return {
+        "insert_random": [("upsert", k) for k in rng.sample(universe, size)],
+        "lookup": [("search", rng.choice(existing)) for _ in range(count)],
+        "mixed": [(rng.choice(("search", "search", "upsert", "delete")), rng.choice(universe))
+                  for _ in range(count)],
+        "scan": [("get_all", None)] * 20,
+    }
+
+
+def run(tree, ops: list) -> float:
+    """执行操作序列，返回耗时"""
+    start = time.perf_counter()
+    for op, key in ops:
+        if op == "search":
+            tree.search(key)
+        elif op == "upsert":
+            tree.upsert(key, 1)
+        elif op == "delete":
+            tree.delete(key)
+        else:
+            tree.get_all()
+    return time.perf_counter() - start
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="SBT树操作基准")
+    parser.add_argument("--size", type=int, default=100000, help="初始键数量")
+    parser.add_argument("--ops", type=int, default=200000, help="查询/混合负载的操作数")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    
+    workloads = make_workloads(args.size, args.ops, args.seed)
+    initial = sorted((f"task:task-{i:08x}", 1) for i in range(args.size))
+    
+    print(f"初始键数量 {args.size}（单位：秒）\n")
+    print(f"{'负载':<16}" + "".join(f"{name:>12}" for name in TREES) + f"{'迭代/递归':>12}")
+    for name, ops in workloads.items():
+        times = {}
+        results = []
+        for tree_name, tree_class in TREES.items():
+            tree = tree_class()
+            if name != "insert_random":
+                tree.load(initial)
+            times[tree_name] = run(tree, ops)
+            results.append(tree.get_all())
+        # 三种实现的结果必须一致
+        assert all(r == results[0] for r in results), name
+        speedup = times["recursive"] / times["iterative"]
+        print(f"{name:<16}" + "".join(f"{times[t]:>12.3f}" for t in TREES) + f"{speedup:>11.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更流
+为每次写操作分配单调递增序列号，支持增量拉取、异步订阅和按键压缩
+"""
+
+import asyncio
+import bisect
+import threading
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+OP_PUT = "put"
+OP_DELETE = "delete"
+OP_CLEAR = "clear"
+
+
+@dataclass
+class Change:
+    """一次写操作"""
+    seq: int
+    op: str
+    key: Optional[str]
+    value: Any = None
+
+
+class ChangeFeed:
+    """内存变更流
+    
+    floor 之前的变更已被丢弃：changes_since(seq) 在 seq < floor 时返回 None，
+    调用方需要全量重新同步。超过 max_entries 时先按键去重压缩，
+    仍然过多再丢弃最旧的记录并抬高 floor。自动压缩会多丢弃四分之一的余量，
+    避免批量写入时每次追加都触发一次全量压缩。
+    """
+    
+    def __init__(self, start_seq: int = 0, max_entries: int = 10000):
+        self.last_seq = start_seq
+        self.floor = start_seq
+        self.max_entries = max_entries
+        self._entries: List[Change] = []
+        self._seqs: List[int] = []
+        self._subscribers: List['ChangeSubscription'] = []
+        self._lock = threading.Lock()
+    
+    def append(self, op: str, key: Optional[str], value: Any = None,
+               seq: Optional[int] = None) -> Change:
+        """记录一次变更并分配序列号；seq 不为空时沿用给定的序列号（须大于当前序列号，用于副本）"""
+        with self._lock:
+            if seq is not None and seq <= self.last_seq:
+                raise ValueError(f"序列号 {seq} 不大于当前序列号 {self.last_seq}")
+            self.last_seq = self.last_seq + 1 if seq is None else seq
+            change = Change(self.last_seq, op, key, value)
+            if op == OP_CLEAR:
+                # 清空后旧记录不再有意义
+                self._entries = [change]
+                self._seqs = [change.seq]
+            else:
+                self._entries.append(change)
+                self._seqs.append(change.seq)
+            if len(self._entries) > self.max_entries:
+                self._compact_locked(self.max_entries - self.max_entries // 4)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber._push(change)
+        return change
+    
+    def changes_since(self, seq: int) -> Optional[List[Change]]:
+        """获取序列号大于 seq 的变更，历史已被丢弃时返回None"""
+        with self._lock:
+            if seq < self.floor or seq > self.last_seq:
+                return None
+            index = bisect.bisect_right(self._seqs, seq)
+            return self._entries[index:]
+    
+    def compact(self) -> int:
+        """按键去重压缩，返回移除的记录数"""
+        with self._lock:
+            return self._compact_locked()
+    
+    def _compact_locked(self, limit: Optional[int] = None) -> int:
+        """压缩（需持有锁），去重后最多保留 limit 条"""
+        before = len(self._entries)
+        seen = set()
+        kept = []
+        for change in reversed(self._entries):
+            if change.op == OP_CLEAR:
+                kept.append(change)
+                break
+            if change.key in seen:
+                continue
+            seen.add(change.key)
+            kept.append(change)
+        kept.reverse()
+        
+        # 去重后仍超出上限，丢弃最旧的记录
+        overflow = len(kept) - (self.max_entries if limit is None else limit)
+        if overflow > 0:
+            self.floor = kept[overflow - 1].seq
+            kept = kept[overflow:]
+        
+        self._entries = kept
+        self._seqs = [c.seq for c in kept]
+        return before - len(kept)
+    
+    def reset(self, seq: int) -> None:
+        """丢弃全部历史（例如从备份恢复后）"""
+        with self._lock:
+            self._entries = []
+            self._seqs = []
+            self.last_seq = max(self.last_seq, seq)
+            self.floor = self.last_seq
+    
+    def subscribe(self, since: Optional[int] = None) -> 'ChangeSubscription':
+        """订阅变更，since 不为空时先回放其后的历史变更"""
+        subscription = ChangeSubscription(self, asyncio.get_running_loop())
+        with self._lock:
+            if since is not None:
+                if since < self.floor or since > self.last_seq:
+                    raise ValueError(f"序列号 {since} 之后的变更已不可用")
+                index = bisect.bisect_right(self._seqs, since)
+                for change in self._entries[index:]:
+                    subscription._queue.put_nowait(change)
+            self._subscribers.append(subscription)
+        return subscription
+    
+    def _unsubscribe(self, subscription: 'ChangeSubscription') -> None:
+        """移除订阅"""
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+
+class ChangeSubscription:
+    """变更订阅（异步迭代器）"""
+    
+    def __init__(self, feed: ChangeFeed, loop: asyncio.AbstractEventLoop):
+        self._feed = feed
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+    
+    def _push(self, change: Change) -> None:
+        """由写入方调用，可能来自其它线程"""
+        if self.closed:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, change)
+        except RuntimeError:
+            # 事件循环已关闭
+            self.closed = True
+    
+    def close(self) -> None:
+        """取消订阅"""
+        if not self.closed:
+            self.closed = True
+            self._feed._unsubscribe(self)
+            try:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+            except RuntimeError:
+                pass
+    
+    def __aiter__(self) -> 'ChangeSubscription':
+        return self
+    
+    async def __anext__(self) -> Change:
+        change = await self._queue.get()
+        if change is None:
+            raise StopAsyncIteration
+        return change
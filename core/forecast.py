@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+天气预报时间序列
+多个地点的逐小时预报保存在一个 (地点 × 时间 × 指标) 的 NumPy 数组中，
+按日统计和滑动窗口对所有地点一次向量化计算（需要 numpy，可选依赖）
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+METRICS = ("temperature", "humidity", "wind_speed", "pressure")
+
+
+def require_numpy():
+    """导入 numpy（可选依赖）"""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("天气预报数组需要 numpy: pip install numpy") from None
+    return numpy
+
+
+@dataclass
+class WeatherForecast:
+    """逐小时天气预报
+    
+    values 的形状为 (len(locations), 小时数, len(METRICS))，float32；
+    第 i 个小时对应 start + i 小时。
+    """
+    locations: List[str]
+    start: datetime
+    values: Any
+    
+    @property
+    def hours(self) -> int:
+        """预报小时数"""
+        return self.values.shape[1]
+    
+    def times(self) -> Any:
+        """各小时的时间（datetime64[h] 数组）"""
+        np = require_numpy()
+        return np.datetime64(self.start.replace(minute=0, second=0, microsecond=0), 'h') + \
+            np.arange(self.hours)
+    
+    def metric(self, name: str) -> Any:
+        """单个指标的 (地点 × 时间) 视图"""
+        return self.values[:, :, METRICS.index(name)]
+    
+    def location(self, name: str) -> Any:
+        """单个地点的 (时间 × 指标) 视图"""
+        return self.values[self.locations.index(name)]
+    
+    def _day_starts(self) -> Tuple[List[datetime], List[int]]:
+        """每个自然日的日期和在时间轴上的起始下标（首尾可以是不完整的一天）"""
+        first = 24 - self.start.hour if self.start.hour else 24
+        starts = [0] + list(range(first, self.hours, 24))
+        day0 = datetime(self.start.year, self.start.month, self.start.day)
+        return [day0 + timedelta(days=i) for i in range(len(starts))], starts
+    
+    def daily(self) -> Tuple[List[datetime], Dict[str, Any]]:
+        """按自然日统计，返回(日期, {"min"/"max"/"mean": (地点 × 天 × 指标) 数组})"""
+        np = require_numpy()
+        days, starts = self._day_starts()
+        starts = np.asarray(starts)
+        counts = np.diff(np.append(starts, self.hours))
+        values = self.values.astype(np.float64)
+        return days, {
+            "min": np.minimum.reduceat(values, starts, axis=1),
+            "max": np.maximum.reduceat(values, starts, axis=1),
+            "mean": np.add.reduceat(values, starts, axis=1) / counts[None, :, None],
+        }
+    
+    def rolling(self, window: int, stat: str = "mean") -> Any:
+        """时间轴上的滑动窗口统计，返回 (地点 × (小时数 - window + 1) × 指标) 数组"""
+        np = require_numpy()
+        if not 0 < window <= self.hours:
+            raise ValueError(f"窗口大小应在 1 到 {self.hours} 之间: {window}")
+        if stat == "mean":
+            # 前缀和相减，每个窗口 O(1)
+            cumsum = np.cumsum(self.values, axis=1, dtype=np.float64)
+            cumsum = np.concatenate([np.zeros_like(cumsum[:, :1]), cumsum], axis=1)
+            return (cumsum[:, window:] - cumsum[:, :-window]) / window
+        if stat in ("min", "max"):
+            windows = np.lib.stride_tricks.sliding_window_view(self.values, window, axis=1)
+            return windows.min(axis=-1) if stat == "min" else windows.max(axis=-1)
+        raise ValueError(f"未知的统计方式: {stat}（可选: mean, min, max）")
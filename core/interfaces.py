@@ -6,9 +6,11 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Optional, List, Tuple, Dict
+from contextlib import nullcontext
+from typing import Any, Callable, Optional, List, Tuple, Dict
 from dataclasses import dataclass
 from datetime import datetime
+from .forecast import WeatherForecast
 
 
 @dataclass
@@ -19,6 +21,17 @@ class Task:
     completed: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
+
+
+@dataclass
+class TaskChange:
+    """任务变更记录"""
+    seq: int
+    op: str  # put / delete / clear
+    task_id: Optional[str]
+    task: Optional[Task] = None
 
 
 @dataclass
@@ -71,6 +84,68 @@ class IStorageEngine(ABC):
     def clear(self) -> None:
         """清空数据"""
         pass
+    
+    def upsert(self, key: str, value: Any) -> bool:
+        """插入或覆盖，返回是否新建了键（默认实现非原子）"""
+        created = self.search(key) is None
+        self.insert(key, value)
+        return created
+    
+    def insert_if_absent(self, key: str, value: Any) -> bool:
+        """键不存在时插入，返回是否插入（默认实现非原子）"""
+        if self.search(key) is not None:
+            return False
+        self.insert(key, value)
+        return True
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any]) -> Optional[Any]:
+        """以 fn(旧值) 的结果更新，返回新值；键不存在或 fn 返回None时不写入（默认实现非原子）"""
+        value = self.search(key)
+        if value is None:
+            return None
+        value = fn(value)
+        if value is not None:
+            self.update(key, value)
+        return value
+    
+    def replace_all(self, items: List[Tuple[str, Any]]) -> None:
+        """以按键有序的键值对替换全部数据（默认实现逐个插入）"""
+        with self.batch():
+            self.clear()
+            for key, value in items:
+                self.insert(key, value)
+    
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查询数据及其版本号"""
+        raise NotImplementedError("该存储引擎不支持版本号")
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any) -> bool:
+        """版本号匹配时写入；expected_version 为0表示要求键不存在"""
+        raise NotImplementedError("该存储引擎不支持版本号")
+    
+    def batch(self):
+        """批量写入上下文，支持的引擎在结束时统一持久化"""
+        return nullcontext(self)
+    
+    def last_sequence(self) -> Optional[int]:
+        """最近一次写操作的序列号，不支持变更流时返回None"""
+        return None
+    
+    def changes_since(self, seq: int) -> Optional[List[Any]]:
+        """获取序列号之后的变更，历史不可用时返回None"""
+        return None
+    
+    def store_id(self) -> Optional[str]:
+        """存储ID：数据文件创建时生成并随数据持久化，相同ID下序列号单调递增；不支持变更流时返回None"""
+        return None
+    
+    def subscribe(self, since: Optional[int] = None):
+        """订阅变更（异步迭代器）"""
+        raise NotImplementedError("该存储引擎不支持变更订阅")
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """内存占用估算（字节），至少包含 nodes / keys / values / total"""
+        raise NotImplementedError("该存储引擎不支持内存统计")
 
 
 class ITaskRepository(ABC):
@@ -100,6 +175,18 @@ class ITaskRepository(ABC):
     def update_task(self, task: Task) -> bool:
         """更新任务"""
         pass
+    
+    def update_task_with(self, task_id: str, fn: Callable[[Task], Any]) -> Optional[Task]:
+        """读取任务并以 fn(task) 原地修改后保存，返回修改后的任务（默认实现非原子）"""
+        task = self.get_task(task_id)
+        if task is None:
+            return None
+        fn(task)
+        return task if self.update_task(task) else None
+    
+    def batch(self):
+        """批量写入上下文"""
+        return nullcontext(self)
 
 
 class IWeatherService(ABC):
@@ -114,6 +201,11 @@ class IWeatherService(ABC):
     async def get_location(self) -> Tuple[float, float]:
         """获取当前位置"""
         pass
+    
+    async def get_forecast(self, locations: List[str], hours: int = 48,
+                           start: Optional[datetime] = None) -> 'WeatherForecast':
+        """获取多个地点的逐小时预报（见 core/forecast.py）"""
+        raise NotImplementedError("该天气服务不支持预报")
 
 
 class ITodoService(ABC):
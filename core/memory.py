@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存统计
+按对象图估算内存索引中结构（节点）、键和值各自占用的字节数，提供基于 tracemalloc 的分配诊断，
+以及超出内存预算时告警或把冷数据溢出到磁盘所需的预算记录和溢出文件。
+
+统计值是 sys.getsizeof 沿引用累加的估算：被多处引用的对象只计一次，类型、函数和模块不计入，
+不包含分配器的碎片和空闲块，通常比进程常驻内存（RSS）的增量略小。
+"""
+
+import os
+import pickle
+import re
+import sys
+import threading
+import tracemalloc
+import types
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 不再向下遍历的对象：大小已包含全部内容
+_ATOMIC = (str, bytes, bytearray, int, float, complex, bool, type(None), range, memoryview)
+
+# 全局共享的对象，不计入任何数据结构
+_SHARED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType, types.CodeType)
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+               "G": 1024 ** 3, "GB": 1024 ** 3}
+
+_slots_cache: Dict[type, Tuple[str, ...]] = {}
+
+
+def _slots(cls: type) -> Tuple[str, ...]:
+    """类及其基类声明的全部 __slots__"""
+    names = _slots_cache.get(cls)
+    if names is None:
+        found = []
+        for klass in cls.__mro__:
+            slots = klass.__dict__.get("__slots__", ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            found.extend(name for name in slots if name not in ("__dict__", "__weakref__"))
+        names = _slots_cache[cls] = tuple(found)
+    return names
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """对象及其引用的全部对象的字节数；seen 记录已计入的对象ID，可在多次调用间共享以去重"""
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, _ATOMIC):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            attrs = getattr(obj, "__dict__", None)
+            if attrs is not None:
+                stack.append(attrs)
+            for name in _slots(type(obj)):
+                value = getattr(obj, name, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+
+def tree_memory(tree: Any, items: Optional[List[Tuple[str, Any]]] = None) -> Dict[str, int]:
+    """内存索引的占用估算：keys / values 为键和值对象，nodes 为其余的索引结构（节点、数组、指针等）
+    
+    items 为 tree.get_all() 的结果，调用方已取得时可传入以免重复遍历。
+    """
+    if items is None:
+        items = tree.get_all()
+    seen: Set[int] = set()
+    keys = sum(deep_sizeof(key, seen) for key, _ in items)
+    values = sum(deep_sizeof(value, seen) for _, value in items)
+    # 键和值已在 seen 中，遍历索引本身只会累加结构
+    nodes = deep_sizeof(tree, seen)
+    return {"items": len(items), "nodes": nodes, "keys": keys, "values": values,
+            "total": nodes + keys + values}
+
+
+def parse_size(text: str) -> int:
+    """解析字节数，如 "512MB"、"1.5G"、"65536"（单位按1024进位）"""
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([A-Za-z]*)\s*", str(text))
+    unit = match.group(2).upper() if match else None
+    if unit not in _SIZE_UNITS:
+        raise ValueError(f"无法识别的大小: {text}（如 512MB、1.5G）")
+    size = int(float(match.group(1)) * _SIZE_UNITS[unit])
+    if size <= 0:
+        raise ValueError(f"大小必须为正数: {text}")
+    return size
+
+
+def format_size(size: float) -> str:
+    """字节数的可读形式"""
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.2f}GB"
+
+
+# ---- tracemalloc 诊断 ----
+
+def start_tracing(frames: int = 1) -> None:
+    """开始记录内存分配（frames 为每次分配保存的调用栈深度，越大开销越高）"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracing() -> None:
+    """停止记录并释放记录占用的内存"""
+    tracemalloc.stop()
+
+
+def tracing_enabled() -> bool:
+    """是否正在记录内存分配"""
+    return tracemalloc.is_tracing()
+
+
+def top_allocations(limit: int = 10, group_by: str = "lineno") -> List[Tuple[str, int, int]]:
+    """当前仍存活的分配按代码位置汇总，返回(位置, 字节数, 块数)，从大到小；未开始记录时为空"""
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    return [(str(stat.traceback), stat.size, stat.count)
+            for stat in snapshot.statistics(group_by)[:limit]]
+
+
+def allocation_report(limit: int = 10) -> str:
+    """内存分配报告：当前/峰值总量和占用最多的代码位置"""
+    if not tracemalloc.is_tracing():
+        return "未开启内存分配记录"
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"已分配 {format_size(current)}，峰值 {format_size(peak)}"]
+    for where, size, count in top_allocations(limit):
+        lines.append(f"{format_size(size):>10}{count:>10} 块  {where}")
+    return "\n".join(lines)
+
+
+# ---- 内存预算 ----
+
+BUDGET_POLICIES = ("warn", "spill")
+
+MIN_CHECK_INTERVAL = 1000
+
+
+class MemoryBudget:
+    """内存预算
+    
+    完整统计需要遍历整个索引（每项约数微秒），因此每 check_interval 次写入才统计一次（默认为
+    数据量的一半，至少1000次），两次统计之间超出的部分要到下一次统计才会发现。
+    policy="warn" 时超出后告警一次，回到预算内再超出时再次告警；policy="spill" 时把冷数据
+    溢出到磁盘，直到占用降到 limit * low_water 以下。
+    """
+    
+    def __init__(self, limit: int, policy: str = "warn", check_interval: int = 0,
+                 low_water: float = 0.8):
+        if policy not in BUDGET_POLICIES:
+            raise ValueError(f"未知的内存预算策略: {policy}（可选: {', '.join(BUDGET_POLICIES)}）")
+        if limit <= 0:
+            raise ValueError(f"内存预算必须为正数: {limit}")
+        self.limit = limit
+        self.policy = policy
+        self.check_interval = check_interval
+        self.low_water = low_water
+        self.used = 0  # 最近一次统计的字节数
+        self.exceeded = False
+        self._writes = 0
+    
+    @property
+    def target(self) -> int:
+        """溢出后的目标占用"""
+        return int(self.limit * self.low_water)
+    
+    def tick(self, items: int) -> bool:
+        """记录一次写入，返回是否应重新统计"""
+        self._writes += 1
+        if self._writes < (self.check_interval or max(MIN_CHECK_INTERVAL, items // 2)):
+            return False
+        self._writes = 0
+        return True
+    
+    def record(self, used: int) -> bool:
+        """记录统计结果，返回是否刚刚超出预算（此前在预算内）"""
+        was_exceeded = self.exceeded
+        self.used = used
+        self.exceeded = used > self.limit
+        return self.exceeded and not was_exceeded
+
+
+# ---- 溢出文件 ----
+
+class SpilledValue:
+    """溢出到磁盘的值在内存中的占位：只保存文件中的位置"""
+    
+    __slots__ = ("store", "offset", "length")
+    
+    def __init__(self, store: 'SpillFile', offset: int, length: int):
+        self.store = store
+        self.offset = offset
+        self.length = length
+    
+    def load(self) -> Any:
+        """从溢出文件读回值（每次返回新的对象）"""
+        return pickle.loads(self.store.read(self.offset, self.length))
+    
+    def __repr__(self) -> str:
+        return f"SpilledValue(offset={self.offset}, length={self.length})"
+
+
+def resolve(value: Any) -> Any:
+    """溢出的值读回内存，其它值原样返回"""
+    return value.load() if type(value) is SpilledValue else value
+
+
+def resolve_items(items: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+    """键值对中溢出的值读回内存；每个溢出文件整体读取一次，不逐条读取"""
+    buffers: Dict[int, memoryview] = {}
+    resolved = []
+    for key, value in items:
+        if type(value) is SpilledValue:
+            buffer = buffers.get(id(value.store))
+            if buffer is None:
+                buffer = buffers[id(value.store)] = memoryview(value.store.contents())
+            value = pickle.loads(buffer[value.offset:value.offset + value.length])
+        resolved.append((key, value))
+    return resolved
+
+
+def iter_resolved(items: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """逐项读回溢出的值，同一时刻只有一个读回的值在内存中（用于流式写出快照）"""
+    for key, value in items:
+        yield key, resolve(value)
+
+
+class SpillFile:
+    """只追加的溢出文件
+    
+    打开时清空已有内容：溢出的值只在本进程内有效，持久化仍以快照为准。被覆盖或删除的值
+    留在文件中，由 rewrite() 回收。
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w+b")
+        self._lock = threading.Lock()
+        self.size = 0
+        self.records = 0
+    
+    def append(self, data: bytes) -> SpilledValue:
+        """追加一条序列化后的记录"""
+        with self._lock:
+            offset = self.size
+            self._file.seek(offset)
+            self._file.write(data)
+            self.size += len(data)
+            self.records += 1
+        return SpilledValue(self, offset, len(data))
+    
+    def dump(self, value: Any) -> SpilledValue:
+        """序列化并追加一个值"""
+        return self.append(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    
+    def read(self, offset: int, length: int) -> bytes:
+        """读取一条记录"""
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+    
+    def contents(self) -> bytes:
+        """整个文件的内容"""
+        with self._lock:
+            self._file.flush()
+            self._file.seek(0)
+            return self._file.read(self.size)
+    
+    def rewrite(self, refs: Iterable[SpilledValue]) -> Tuple['SpillFile', List[SpilledValue]]:
+        """把仍被引用的记录复制到新文件并替换当前文件，返回(新文件, 新占位)
+        
+        旧文件被替换后仍保持打开，持有旧占位的读取方在其释放前都能正常读取。
+        """
+        new = SpillFile(f"{self.path}.tmp")
+        moved = [new.append(ref.store.read(ref.offset, ref.length)) for ref in refs]
+        new.flush()
+        os.replace(new.path, self.path)
+        new.path = self.path
+        return new, moved
+    
+    def flush(self) -> None:
+        """把缓冲写入操作系统"""
+        with self._lock:
+            self._file.flush()
+    
+    def discard(self) -> None:
+        """删除文件；已打开的句柄在最后一个占位释放时关闭"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标采集
+轻量级指标注册表：计数器、仪表、HDR风格延迟直方图，支持Prometheus文本格式导出
+"""
+
+import math
+import os
+import threading
+import time
+import types
+import weakref
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# 直方图每个2的幂区间内的子桶数量（2^4=16，相对误差约6%）
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    """格式化Prometheus标签"""
+    pairs = list(labels)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    """格式化数值"""
+    if isinstance(value, float) and value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+    
+    kind = "counter"
+    
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str, labels: Labels):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0
+    
+    def inc(self, amount: float = 1) -> None:
+        """增加计数"""
+        if self._registry.enabled:
+            self.value += amount
+    
+    def reset(self) -> None:
+        """重置"""
+        self.value = 0
+    
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        """导出样本"""
+        return [(self.name, self.labels, self.value)]
+
+
+class Gauge:
+    """可增可减的仪表，也可绑定取值函数"""
+    
+    kind = "gauge"
+    
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str, labels: Labels):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._value = 0
+        self._function: Optional[Callable[[], Optional[Callable[[], float]]]] = None
+    
+    def set(self, value: float) -> None:
+        """设置当前值"""
+        if self._registry.enabled:
+            self._value = value
+    
+    def inc(self, amount: float = 1) -> None:
+        """增加"""
+        if self._registry.enabled:
+            self._value += amount
+    
+    def dec(self, amount: float = 1) -> None:
+        """减少"""
+        if self._registry.enabled:
+            self._value -= amount
+    
+    def set_function(self, function: Callable[[], float]) -> None:
+        """绑定取值函数，导出时才计算
+        
+        绑定方法只保存弱引用：注册表是全局的，不能让按文件或租户创建的对象因为仪表而无法释放。
+        对象释放后仪表不再导出样本。
+        """
+        if isinstance(function, types.MethodType):
+            self._function = weakref.WeakMethod(function)
+        else:
+            self._function = lambda: function
+    
+    @property
+    def released(self) -> bool:
+        """绑定的方法所属对象是否已释放"""
+        return self._function is not None and self._function() is None
+    
+    @property
+    def value(self) -> float:
+        """当前值"""
+        if self._function is not None:
+            function = self._function()
+            if function is None:
+                return 0
+            try:
+                return function()
+            except Exception:
+                return 0
+        return self._value
+    
+    def reset(self) -> None:
+        """重置"""
+        self._value = 0
+    
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        """导出样本"""
+        if self.released:
+            return []
+        return [(self.name, self.labels, self.value)]
+
+
+class _Timer:
+    """直方图计时上下文"""
+    
+    __slots__ = ("_histogram", "_start")
+    
+    def __init__(self, histogram: 'Histogram'):
+        self._histogram = histogram
+        self._start = 0.0
+    
+    def __enter__(self) -> '_Timer':
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram:
+    """HDR风格对数线性直方图
+    
+    观测值按 scale 换算为整数后落入桶中：小于16的值精确记录，
+    之后每个2的幂区间再等分为16个子桶，内存只与出现过的桶数相关。
+    """
+    
+    kind = "histogram"
+    
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str,
+                 labels: Labels, scale: float = 1.0):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.scale = scale
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+    
+    @staticmethod
+    def _bucket_index(value: int) -> int:
+        """计算桶下标"""
+        if value < SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return shift * SUB_BUCKET_COUNT + (value >> shift)
+    
+    @staticmethod
+    def _bucket_upper(index: int) -> int:
+        """桶内最大整数值"""
+        if index < SUB_BUCKET_COUNT:
+            return index
+        shift = index // SUB_BUCKET_COUNT - 1
+        mantissa = index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+        return ((mantissa + 1) << shift) - 1
+    
+    def observe(self, value: float) -> None:
+        """记录观测值（原始单位）"""
+        if not self._registry.enabled:
+            return
+        scaled = int(value * self.scale)
+        if scaled < 0:
+            scaled = 0
+        index = self._bucket_index(scaled)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += scaled
+        if self.min is None or scaled < self.min:
+            self.min = scaled
+        if self.max is None or scaled > self.max:
+            self.max = scaled
+    
+    def time(self):
+        """计时上下文，未启用时为空操作"""
+        if not self._registry.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self)
+    
+    def percentile(self, q: float) -> float:
+        """估算分位数（0-100），返回原始单位"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._bucket_upper(index), self.max) / self.scale
+        return self.max / self.scale
+    
+    @property
+    def mean(self) -> float:
+        """平均值（原始单位）"""
+        return self.total / self.count / self.scale if self.count else 0.0
+    
+    def reset(self) -> None:
+        """重置"""
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+    
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        """导出累积桶样本"""
+        result = []
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            upper = self._bucket_upper(index) / self.scale
+            result.append((self.name + "_bucket", self.labels + (("le", _format_value(float(upper))),), cumulative))
+        result.append((self.name + "_bucket", self.labels + (("le", "+Inf"),), self.count))
+        result.append((self.name + "_sum", self.labels, self.total / self.scale))
+        result.append((self.name + "_count", self.labels, self.count))
+        return result
+
+
+class MetricsRegistry:
+    """指标注册表"""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[Tuple[str, Labels], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, cls, name: str, help_text: str, labels: Dict[str, Any], **kwargs):
+        """获取或创建指标"""
+        label_tuple: Labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        key = (name, label_tuple)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(self, name, help_text, label_tuple, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+    
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        """获取计数器"""
+        return self._get_or_create(Counter, name, help_text, labels)
+    
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        """获取仪表"""
+        return self._get_or_create(Gauge, name, help_text, labels)
+    
+    def histogram(self, name: str, help_text: str = "", scale: float = 1e6, **labels) -> Histogram:
+        """获取直方图，默认以微秒精度记录秒"""
+        return self._get_or_create(Histogram, name, help_text, labels, scale=scale)
+    
+    def enable(self) -> None:
+        """启用采集"""
+        self.enabled = True
+    
+    def disable(self) -> None:
+        """停用采集"""
+        self.enabled = False
+    
+    def reset(self) -> None:
+        """清零所有指标"""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+    
+    def get(self, name: str, **labels) -> Optional[Any]:
+        """按名称和标签查找指标"""
+        label_tuple = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        return self._metrics.get((name, label_tuple))
+    
+    def render_prometheus(self) -> str:
+        """导出Prometheus文本格式"""
+        by_name: Dict[str, List[Any]] = {}
+        for (name, _), metric in sorted(self._metrics.items()):
+            by_name.setdefault(name, []).append(metric)
+        
+        lines = []
+        for name, group in by_name.items():
+            first = group[0]
+            if first.help:
+                lines.append(f"# HELP {name} {first.help}")
+            lines.append(f"# TYPE {name} {first.kind}")
+            for metric in group:
+                for sample_name, labels, value in metric.samples():
+                    lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n" if lines else ""
+    
+    def dump(self, path: str) -> None:
+        """写出Prometheus文本文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+
+
+class OperationMetrics:
+    """按操作名统计次数、错误和延迟"""
+    
+    def __init__(self, subsystem: str, registry: Optional[MetricsRegistry] = None, **labels):
+        self.subsystem = subsystem
+        self.registry = registry or metrics
+        self.labels = labels
+        self._instruments: Dict[str, Tuple[Counter, Counter, Histogram]] = {}
+    
+    def _instruments_for(self, op: str) -> Tuple[Counter, Counter, Histogram]:
+        """获取操作对应的指标"""
+        instruments = self._instruments.get(op)
+        if instruments is None:
+            instruments = (
+                self.registry.counter(f"{self.subsystem}_operations_total",
+                                      f"{self.subsystem} 操作次数", op=op, **self.labels),
+                self.registry.counter(f"{self.subsystem}_operation_errors_total",
+                                      f"{self.subsystem} 操作失败次数", op=op, **self.labels),
+                self.registry.histogram(f"{self.subsystem}_operation_duration_seconds",
+                                        f"{self.subsystem} 操作耗时", op=op, **self.labels),
+            )
+            self._instruments[op] = instruments
+        return instruments
+    
+    def track(self, op: str):
+        """统计一次操作，未启用时为空操作"""
+        if not self.registry.enabled:
+            return _NULL_CONTEXT
+        return _OperationTimer(*self._instruments_for(op))
+    
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        """子系统下的附加计数器"""
+        return self.registry.counter(f"{self.subsystem}_{name}", help_text, **self.labels, **labels)
+    
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        """子系统下的附加仪表"""
+        return self.registry.gauge(f"{self.subsystem}_{name}", help_text, **self.labels, **labels)
+    
+    def histogram(self, name: str, help_text: str = "", scale: float = 1e6, **labels) -> Histogram:
+        """子系统下的附加直方图"""
+        return self.registry.histogram(f"{self.subsystem}_{name}", help_text, scale=scale,
+                                       **self.labels, **labels)
+
+
+class _OperationTimer:
+    """操作计时上下文"""
+    
+    __slots__ = ("_ops", "_errors", "_histogram", "_start")
+    
+    def __init__(self, ops: Counter, errors: Counter, histogram: Histogram):
+        self._ops = ops
+        self._errors = errors
+        self._histogram = histogram
+        self._start = 0.0
+    
+    def __enter__(self) -> '_OperationTimer':
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+        self._ops.inc()
+        if exc_type is not None:
+            self._errors.inc()
+
+
+# 全局注册表，设置环境变量 TODO_APP_METRICS=1 默认启用
+metrics = MetricsRegistry(enabled=os.environ.get("TODO_APP_METRICS", "") == "1")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+复制日志
+主库每次保存快照后把新的变更追加到日志文件，只读副本从上次读到的位置继续读取。
+文件头为魔数、起始序列号和主库的存储ID，之后每条记录为 4 字节长度 + pickle 的
+(序列号, 操作, 键, 值, 提交时间)。
+日志过大或变更历史不可用时以新的起始序列号整体替换文件（轮换）。
+"""
+
+import os
+import pickle
+import struct
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+MAGIC = b"SBTR"
+_HEADER = struct.Struct("<4sQ32s")
+_LENGTH = struct.Struct("<I")
+
+MAX_LOG_BYTES = 16 * 1024 * 1024
+
+Record = Tuple[int, str, Optional[str], Any, float]
+
+
+class ReplicationLogWriter:
+    """主库端：追加与轮换"""
+    
+    def __init__(self, path: str, max_bytes: int = MAX_LOG_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+    
+    def size(self) -> int:
+        """当前日志大小，不存在时为0"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+    
+    def rotate(self, base_seq: int, store_id: Optional[str] = None) -> None:
+        """以 base_seq 为起点开始新日志（副本需从不早于 base_seq 的快照追起），store_id 为主库的存储ID"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, base_seq, (store_id or "").encode("ascii")))
+        os.replace(tmp_path, self.path)
+    
+    def append(self, changes: Iterable[Any]) -> None:
+        """追加变更（带 seq/op/key/value 属性），一次写入"""
+        now = time.time()
+        chunks = []
+        for change in changes:
+            payload = pickle.dumps((change.seq, change.op, change.key, change.value, now),
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            chunks.append(_LENGTH.pack(len(payload)))
+            chunks.append(payload)
+        if chunks:
+            with open(self.path, 'ab') as f:
+                f.write(b"".join(chunks))
+
+
+class ReplicationLogReader:
+    """副本端：增量读取，只返回完整写入的记录"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.base_seq: Optional[int] = None
+        self.store_id: Optional[str] = None
+        self._file = None
+        self._offset = 0
+    
+    @property
+    def is_open(self) -> bool:
+        """是否已打开日志"""
+        return self._file is not None
+    
+    def open(self) -> bool:
+        """打开日志并读取文件头，日志不存在时返回False"""
+        self.close()
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:len(MAGIC)] != MAGIC:
+            f.close()
+            return False
+        _, self.base_seq, store_id = _HEADER.unpack(header)
+        self.store_id = store_id.rstrip(b"\0").decode("ascii") or None
+        self._file = f
+        self._offset = _HEADER.size
+        return True
+    
+    def rotated(self) -> bool:
+        """日志文件是否已被替换（或删除）"""
+        if self._file is None:
+            return True
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+    
+    def _read_record(self, offset: int) -> Tuple[Optional[Record], int]:
+        """读取 offset 处的一条完整记录，返回(记录, 下一条的位置)；尚未写完时返回(None, offset)"""
+        self._file.seek(offset)
+        prefix = self._file.read(_LENGTH.size)
+        if len(prefix) < _LENGTH.size:
+            return None, offset
+        length = _LENGTH.unpack(prefix)[0]
+        payload = self._file.read(length)
+        if len(payload) < length:
+            return None, offset
+        return pickle.loads(payload), offset + _LENGTH.size + length
+    
+    def read(self) -> List[Record]:
+        """读取上次位置之后的全部完整记录"""
+        records = []
+        if self._file is None:
+            return records
+        while True:
+            record, offset = self._read_record(self._offset)
+            if record is None:
+                return records
+            records.append(record)
+            self._offset = offset
+    
+    def peek(self) -> Optional[Record]:
+        """下一条未读记录（不移动读取位置）"""
+        if self._file is None:
+            return None
+        return self._read_record(self._offset)[0]
+    
+    def pending_bytes(self) -> int:
+        """尚未读取的字节数"""
+        if self._file is None:
+            return 0
+        return max(0, os.fstat(self._file.fileno()).st_size - self._offset)
+    
+    def close(self) -> None:
+        """关闭日志"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.base_seq = None
+        self.store_id = None
+        self._offset = 0
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务时间索引
+按截止时间和提醒时间排序的 (时间戳, 任务ID) 有序表，区间查询为二分定位加顺序读取，
+与检索索引一样保存在数据文件旁并按变更流追平
+"""
+
+import bisect
+import os
+import pickle
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .task_codec import task_schedule
+
+INDEX_FORMAT = 1
+
+
+class TimeIndex:
+    """单个时间字段的有序索引，每个任务至多一项"""
+    
+    def __init__(self):
+        self._entries: List[Tuple[float, str]] = []
+        self._times: Dict[str, float] = {}
+    
+    def __len__(self) -> int:
+        return len(self._times)
+    
+    def set(self, key: str, when: Optional[float]) -> None:
+        """设置任务的时间（时间戳），None 表示移除"""
+        old = self._times.get(key)
+        if old == when:
+            return
+        if old is not None:
+            i = bisect.bisect_left(self._entries, (old, key))
+            del self._entries[i]
+            del self._times[key]
+        if when is not None:
+            bisect.insort(self._entries, (when, key))
+            self._times[key] = when
+    
+    def get(self, key: str) -> Optional[float]:
+        """任务的时间"""
+        return self._times.get(key)
+    
+    def between(self, start: float, end: float, include_start: bool = True) -> List[str]:
+        """时间在 [start, end] 内的任务ID（include_start=False 时为 (start, end]），按时间排序"""
+        entries = self._entries
+        lo = bisect.bisect_left(entries, (start,)) if include_start else \
+            bisect.bisect_right(entries, (start, "\U0010ffff"))
+        hi = bisect.bisect_right(entries, (end, "\U0010ffff"))
+        return [key for _, key in entries[lo:hi]]
+    
+    def first_after(self, start: float) -> Optional[float]:
+        """晚于 start 的最早时间"""
+        i = bisect.bisect_right(self._entries, (start, "\U0010ffff"))
+        return self._entries[i][0] if i < len(self._entries) else None
+
+
+class ScheduleIndex:
+    """截止时间与提醒时间索引"""
+    
+    def __init__(self):
+        self.due = TimeIndex()
+        self.remind = TimeIndex()
+    
+    def __len__(self) -> int:
+        return len(set(self.due._times) | set(self.remind._times))
+    
+    def add(self, key: str, data: Any) -> None:
+        """按任务记录添加或替换"""
+        due, remind = task_schedule(data)
+        self.due.set(key, due)
+        self.remind.set(key, remind)
+    
+    def remove(self, key: str) -> None:
+        """删除任务"""
+        self.due.set(key, None)
+        self.remind.set(key, None)
+    
+    def clear(self) -> None:
+        """清空索引"""
+        self.__init__()
+    
+    def save(self, path: str, seq: Optional[int] = None, store_id: Optional[str] = None) -> None:
+        """持久化，seq / store_id 为索引对应的存储序列号和存储ID"""
+        payload = pickle.dumps({
+            "format": INDEX_FORMAT,
+            "seq": seq,
+            "store_id": store_id,
+            "due": self.due._entries,
+            "remind": self.remind._entries,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(payload, 6))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str, store_id: Optional[str] = None) -> Tuple[Optional['ScheduleIndex'], Optional[int]]:
+        """加载索引，返回(索引, 保存时的序列号)，文件不存在、损坏或属于其它存储时返回(None, None)"""
+        if not os.path.exists(path):
+            return None, None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+            if data.get("format") != INDEX_FORMAT or data.get("store_id") != store_id:
+                return None, None
+        except Exception as e:
+            print(f"加载时间索引失败: {e}")
+            return None, None
+        
+        index = cls()
+        for time_index, entries in ((index.due, data["due"]), (index.remind, data["remind"])):
+            time_index._entries = list(entries)
+            time_index._times = {key: when for when, key in entries}
+        return index, data.get("seq")
+    
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, Any]]) -> 'ScheduleIndex':
+        """由(任务ID, 任务记录)批量构建"""
+        index = cls()
+        due, remind = [], []
+        for key, data in items:
+            due_at, remind_at = task_schedule(data)
+            if due_at is not None:
+                due.append((due_at, key))
+            if remind_at is not None:
+                remind.append((remind_at, key))
+        for time_index, entries in ((index.due, due), (index.remind, remind)):
+            entries.sort()
+            time_index._entries = entries
+            time_index._times = {key: when for when, key in entries}
+        return index
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文检索索引
+中日韩文字按字符二元组切分、拉丁文字按单词切分的倒排索引，BM25排序，
+倒排表以差分变长整数编码并经zlib压缩后持久化
+"""
+
+import heapq
+import math
+import os
+import pickle
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INDEX_FORMAT = 1
+
+# 中日韩统一表意文字、扩展A、兼容表意文字、日文假名、韩文音节
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_RE = re.compile(f"([{_CJK_RANGES}]+)|((?:(?![{_CJK_RANGES}])[^\\W_])+)", re.UNICODE)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """索引分词：CJK连续片段输出单字和二元组，其余按单词输出"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text.lower()):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def query_terms(text: str) -> List[str]:
+    """查询分词：CJK片段只用二元组（单字片段用单字），结果去重"""
+    terms = []
+    for cjk, word in _TOKEN_RE.findall(text.lower()):
+        if cjk:
+            if len(cjk) == 1:
+                terms.append(cjk)
+            else:
+                terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            terms.append(word)
+    return list(dict.fromkeys(terms))
+
+
+def _encode_postings(postings: Dict[int, int]) -> bytes:
+    """倒排表编码：文档号差分 + 词频，均为变长整数"""
+    out = bytearray()
+    previous = 0
+    for doc_id in sorted(postings):
+        for number in (doc_id - previous, postings[doc_id]):
+            while number >= 0x80:
+                out.append((number & 0x7f) | 0x80)
+                number >>= 7
+            out.append(number)
+        previous = doc_id
+    return bytes(out)
+
+
+def _decode_postings(data: bytes) -> Dict[int, int]:
+    """倒排表解码"""
+    numbers = []
+    number = shift = 0
+    for byte in data:
+        number |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number = shift = 0
+    postings = {}
+    doc_id = 0
+    for i in range(0, len(numbers), 2):
+        doc_id += numbers[i]
+        postings[doc_id] = numbers[i + 1]
+    return postings
+
+
+class SearchIndex:
+    """倒排索引
+    
+    更新文档时沿用原来的文档号，删除后空出的文档号由之后添加的文档复用，
+    文档号表的长度不超过同时存在过的文档数。
+    """
+    
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_ids: Dict[str, int] = {}
+        self._doc_keys: List[Optional[str]] = []
+        self._doc_terms: Dict[int, Dict[str, int]] = {}
+        self._free_ids: List[int] = []
+        self._total_length = 0
+    
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._doc_ids
+    
+    def add(self, key: str, text: str) -> None:
+        """添加或替换文档；词频不变时（如只修改了完成状态）不做任何修改"""
+        terms: Dict[str, int] = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+        
+        doc_id = self._doc_ids.get(key)
+        if doc_id is not None:
+            if self._doc_terms[doc_id] == terms:
+                return
+            self._unindex(doc_id)
+        elif self._free_ids:
+            doc_id = self._free_ids.pop()
+            self._doc_keys[doc_id] = key
+        else:
+            doc_id = len(self._doc_keys)
+            self._doc_keys.append(key)
+        self._doc_ids[key] = doc_id
+        self._doc_terms[doc_id] = terms
+        self._total_length += sum(terms.values())
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+    
+    def _unindex(self, doc_id: int) -> None:
+        """从倒排表中移除文档的词"""
+        terms = self._doc_terms.pop(doc_id)
+        self._total_length -= sum(terms.values())
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+    
+    def remove(self, key: str) -> bool:
+        """删除文档"""
+        doc_id = self._doc_ids.pop(key, None)
+        if doc_id is None:
+            return False
+        self._unindex(doc_id)
+        self._doc_keys[doc_id] = None
+        self._free_ids.append(doc_id)
+        return True
+    
+    def clear(self) -> None:
+        """清空索引"""
+        self.__init__()
+    
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """检索，返回按BM25得分降序的(文档键, 得分)；所有查询词都需命中"""
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        lists = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                return []
+            lists.append((term, postings))
+        lists.sort(key=lambda item: len(item[1]))
+        
+        # 从最短的倒排表开始求交集
+        candidates = set(lists[0][1])
+        for _, postings in lists[1:]:
+            candidates.intersection_update(postings)
+            if not candidates:
+                return []
+        
+        doc_count = len(self._doc_ids)
+        avg_length = self._total_length / doc_count if doc_count else 1.0
+        scored = []
+        for doc_id in candidates:
+            length = sum(self._doc_terms[doc_id].values())
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            score = 0.0
+            for _, postings in lists:
+                df = len(postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                tf = postings[doc_id]
+                score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            scored.append((score, self._doc_keys[doc_id]))
+        
+        best = heapq.nlargest(limit, scored, key=lambda item: (item[0], item[1]))
+        return [(key, score) for score, key in best]
+    
+    def save(self, path: str, seq: Optional[int] = None, store_id: Optional[str] = None) -> None:
+        """持久化：重新编号文档后压缩写出，seq / store_id 为索引对应的存储序列号和存储ID"""
+        keys = [key for key in self._doc_keys if key is not None]
+        renumber = {self._doc_ids[key]: i for i, key in enumerate(keys)}
+        terms = {
+            term: _encode_postings({renumber[d]: tf for d, tf in postings.items()})
+            for term, postings in self._postings.items()
+        }
+        payload = pickle.dumps({"format": INDEX_FORMAT, "seq": seq, "store_id": store_id,
+                                "keys": keys, "terms": terms}, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(payload, 6))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str, store_id: Optional[str] = None) -> Tuple[Optional['SearchIndex'], Optional[int]]:
+        """加载索引，返回(索引, 保存时的序列号)
+        
+        文件不存在、损坏或保存时的存储ID与 store_id 不同（属于已被重建的存储）时返回(None, None)。
+        """
+        if not os.path.exists(path):
+            return None, None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+            if data.get("format") != INDEX_FORMAT or data.get("store_id") != store_id:
+                return None, None
+        except Exception as e:
+            print(f"加载检索索引失败: {e}")
+            return None, None
+        
+        index = cls()
+        index._doc_keys = list(data["keys"])
+        index._doc_ids = {key: i for i, key in enumerate(index._doc_keys)}
+        index._doc_terms = {i: {} for i in range(len(index._doc_keys))}
+        for term, encoded in data["terms"].items():
+            postings = _decode_postings(encoded)
+            index._postings[term] = postings
+            for doc_id, tf in postings.items():
+                index._doc_terms[doc_id][term] = tf
+                index._total_length += tf
+        return index, data.get("seq")
+    
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]]) -> 'SearchIndex':
+        """由(文档键, 文本)批量构建"""
+        index = cls()
+        for key, text in documents:
+            index.add(key, text)
+        return index
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩快照编码
+有序键做前缀压缩，字典值按字段名组合（schema）拆成列存放，再按块用 zlib/lzma 压缩
+各块可独立解码，读取时在线程池中并行解压（zlib/lzma 解压时释放GIL），主线程按顺序解码
+"""
+
+import lzma
+import os
+import pickle
+import zlib
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"SBTC"
+FORMAT = 1
+BLOCK_SIZE = 4096
+MAX_DECODE_WORKERS = 8
+
+# 编码名 -> (压缩, 解压, 默认级别)
+CODECS = {
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress, 6),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6),
+}
+
+
+def parse_compression(spec: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析压缩设置，如 "zlib"、"zlib:9"、"lzma:3"；空值或 "none" 表示不压缩"""
+    if not spec or spec == "none":
+        return None
+    codec, _, level = spec.partition(":")
+    if codec not in CODECS:
+        raise ValueError(f"未知的压缩方式: {codec}（可选: none, {', '.join(CODECS)}）")
+    return codec, int(level) if level else CODECS[codec][2]
+
+
+def is_compressed(data: bytes) -> bool:
+    """是否为压缩快照"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def _common_prefix(a: str, b: str) -> int:
+    """公共前缀长度"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _encode_block(items: List[Tuple[str, Any]], schemas: Dict[tuple, int]) -> bytes:
+    """编码一个块：键的(前缀长度, 后缀)，每项的 schema 编号，各 schema 的列，非字典值"""
+    prefix_lens, suffixes, schema_ids = [], [], []
+    columns: Dict[int, List[list]] = {}
+    raw = []
+    prev = ""
+    for key, value in items:
+        n = _common_prefix(prev, key)
+        prefix_lens.append(n)
+        suffixes.append(key[n:])
+        prev = key
+        if type(value) is dict and value:
+            fields = tuple(value)
+            sid = schemas.get(fields)
+            if sid is None:
+                sid = schemas[fields] = len(schemas)
+            cols = columns.get(sid)
+            if cols is None:
+                cols = columns[sid] = [[] for _ in fields]
+            for col, field_value in zip(cols, value.values()):
+                col.append(field_value)
+        else:
+            sid = -1
+            raw.append(value)
+        schema_ids.append(sid)
+    return pickle.dumps((prefix_lens, suffixes, schema_ids, columns, raw),
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_block(data: bytes, schemas: List[tuple]) -> List[Tuple[str, Any]]:
+    """解码一个块"""
+    prefix_lens, suffixes, schema_ids, columns, raw = pickle.loads(data)
+    rows = {sid: zip(*cols) for sid, cols in columns.items()}
+    raw_values = iter(raw)
+    items = []
+    append = items.append
+    prev = ""
+    for n, suffix, sid in zip(prefix_lens, suffixes, schema_ids):
+        key = prev[:n] + suffix if n else suffix
+        prev = key
+        if sid < 0:
+            append((key, next(raw_values)))
+        else:
+            append((key, dict(zip(schemas[sid], next(rows[sid])))))
+    return items
+
+
+def encode_snapshot(items: Iterable[Tuple[str, Any]], seq: int, codec: str = "zlib",
+                    level: Optional[int] = None, block_size: int = BLOCK_SIZE,
+                    store_id: Optional[str] = None) -> bytes:
+    """编码有序键值对快照，store_id 为写入头部的存储ID；items 可以是迭代器，每次只取出一块"""
+    compress, _, default_level = CODECS[codec]
+    level = default_level if level is None else level
+    schemas: Dict[tuple, int] = {}
+    blocks = []
+    count = 0
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, block_size))
+        if not chunk:
+            break
+        count += len(chunk)
+        blocks.append((len(chunk), compress(_encode_block(chunk, schemas), level)))
+    header = {
+        "seq": seq,
+        "store_id": store_id,
+        "codec": codec,
+        "level": level,
+        "count": count,
+        "schemas": sorted(schemas, key=schemas.get),
+        "blocks": blocks,
+    }
+    return MAGIC + bytes([FORMAT]) + pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_header(data: bytes) -> Dict[str, Any]:
+    """读取压缩快照的头部（含各块的压缩数据）"""
+    if not is_compressed(data):
+        raise ValueError("不是压缩快照")
+    if data[len(MAGIC)] != FORMAT:
+        raise ValueError(f"不支持的压缩快照格式: {data[len(MAGIC)]}")
+    return pickle.loads(data[len(MAGIC) + 1:])
+
+
+def default_workers() -> int:
+    """默认解压线程数"""
+    return min(os.cpu_count() or 1, MAX_DECODE_WORKERS)
+
+
+def iter_blocks(header: Dict[str, Any], workers: int = 1) -> Iterator[List[Tuple[str, Any]]]:
+    """按顺序逐块解码
+    
+    workers > 1 时后续块在线程池中提前解压，与当前块的解码重叠；
+    最多提前 2*workers 块，解压后的数据不会全部积压在内存中。
+    构建字典受GIL限制只能在一个线程中进行，进程池需要把解码结果序列化传回，
+    反序列化的开销与直接解码相当，因此不使用进程池。
+    """
+    decompress = CODECS[header["codec"]][1]
+    schemas = header["schemas"]
+    blocks = [block for _, block in header["blocks"]]
+    if workers <= 1 or len(blocks) <= 1:
+        for block in blocks:
+            yield _decode_block(decompress(block), schemas)
+        return
+    
+    with ThreadPoolExecutor(workers, thread_name_prefix="snapshot-decode") as pool:
+        pending = deque()
+        next_block = 0
+        while next_block < len(blocks) or pending:
+            while next_block < len(blocks) and len(pending) < 2 * workers:
+                pending.append(pool.submit(decompress, blocks[next_block]))
+                next_block += 1
+            yield _decode_block(pending.popleft().result(), schemas)
+
+
+def decode_items(header: Dict[str, Any], workers: Optional[int] = None) -> List[Tuple[str, Any]]:
+    """解码头部中的全部块，返回有序键值对；workers 为解压线程数，默认按CPU核数"""
+    items: List[Tuple[str, Any]] = []
+    for block in iter_blocks(header, default_workers() if workers is None else workers):
+        items.extend(block)
+    return items
+
+
+def decode_snapshot(data: bytes, workers: Optional[int] = None) -> Tuple[List[Tuple[str, Any]], int]:
+    """解码压缩快照，返回(有序键值对, 序列号)；workers 为解压线程数，默认按CPU核数"""
+    header = read_header(data)
+    return decode_items(header, workers), header["seq"]
@@ -6,104 +6,539 @@
 """
 
 import json
+import os
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional
-from .interfaces import ITaskRepository, IStorageEngine, Task
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .change_feed import OP_CLEAR, OP_PUT
+from .interfaces import ITaskRepository, IStorageEngine, Task, TaskChange
+from .memory import deep_sizeof
+from .metrics import OperationMetrics
+from .schedule_index import ScheduleIndex
+from .search_index import SearchIndex
+from .task_codec import decode_task, encode_task, is_legacy, task_record_id, task_text
+from .tracing import span
+
+_MISSING = object()  # 配置缓存中表示键不存在
+
+
+class _DerivedIndex:
+    """由任务数据派生的索引：首次使用时加载或构建，之后按存储变更流追平并定期保存"""
+    
+    def __init__(self, name: str, label: str, path: Optional[str], load: Callable,
+                 save: Callable, build: Callable, put: Callable, remove: Callable):
+        self.name = name
+        self.label = label
+        self.path = path
+        self.load = load      # (path, 存储ID) -> (索引, 序列号)，文件属于其它存储时为(None, None)
+        self.save = save      # (索引, path, 序列号, 存储ID) -> None
+        self.build = build    # () -> 索引
+        self.put = put        # (索引, 任务ID, 任务记录) -> None
+        self.remove = remove  # (索引, 任务ID) -> None
+        self.index = None
+        self.seq: Optional[int] = None
+        self.dirty = 0
 
 
 class TaskStorageAdapter(ITaskRepository):
-    """任务存储适配器"""
+    """任务存储适配器
     
-    def __init__(self, storage_engine: IStorageEngine):
+    全文检索索引（.idx）和截止/提醒时间索引（.due）保存在数据文件旁，
+    各自在首次使用时加载或构建，之后随写操作按变更流维护。
+    """
+    
+    def __init__(self, storage_engine: IStorageEngine, index_file: Optional[str] = None,
+                 index_flush_interval: int = 100, schedule_file: Optional[str] = None):
         self.storage = storage_engine
+        self.read_only = getattr(storage_engine, "read_only", False)  # 只读副本不写派生索引文件
+        # 键为 "task:" + 任务ID，任务ID以 "task-" 开头，每个键重复的是10字节的 "task:task-"。
+        # str 对象约49字节头部，去掉它只能把典型的键（18字符）从67字节减到57字节，
+        # 约为每项内存（约434字节）的2%，不值得改变键格式和迁移已有数据；
+        # 派生索引直接引用记录中的任务ID，不从键中切出副本（见 task_record_id）。
         self.task_prefix = "task:"
+        self._local_version = 0  # 存储引擎不提供序列号时使用
+        self.metrics = OperationMetrics("task_repository")
+        self._decode_failures = self.metrics.counter("decode_failures_total", "反序列化失败次数")
+        
+        # 全文检索索引：首次检索时加载或构建，默认保存在数据文件旁
+        data_file = getattr(storage_engine, "data_file", None)
+        self.index_file = index_file or (f"{data_file}.idx" if data_file else None)
+        self.index_flush_interval = index_flush_interval
+        self._search = _DerivedIndex(
+            "index", "检索索引", self.index_file, SearchIndex.load, SearchIndex.save,
+            lambda: SearchIndex.build((t.id, t.text) for t in self.get_all_tasks()),
+            lambda index, task_id, data: index.add(task_id, task_text(data)),
+            lambda index, task_id: index.remove(task_id))
+        
+        # 截止/提醒时间索引
+        self.schedule_file = schedule_file or (f"{data_file}.due" if data_file else None)
+        self._schedule = _DerivedIndex(
+            "schedule_index", "时间索引", self.schedule_file, ScheduleIndex.load, ScheduleIndex.save,
+            lambda: ScheduleIndex.build(self._task_items()),
+            lambda index, task_id, data: index.add(task_id, data),
+            lambda index, task_id: index.remove(task_id))
+        self._derived = (self._search, self._schedule)
+        self._batch_depth = 0
+    
+    @property
+    def version(self) -> int:
+        """存储版本号：优先使用存储引擎的写序列号"""
+        seq = self.storage.last_sequence()
+        return self._local_version if seq is None else seq
+    
+    @property
+    def store_id(self) -> Optional[str]:
+        """存储ID：与版本号一起标识数据，存储被重建后版本号可能重复而存储ID不同"""
+        return self.storage.store_id()
     
     def _task_key(self, task_id: str) -> str:
         """生成任务存储键"""
         return f"{self.task_prefix}{task_id}"
     
-    def _serialize_task(self, task: Task) -> dict:
-        """序列化任务对象"""
-        return {
-            "id": task.id,
-            "text": task.text,
-            "completed": task.completed,
-            "created_at": task.created_at.isoformat(),
-            "updated_at": task.updated_at.isoformat() if task.updated_at else None
-        }
-    
-    def _deserialize_task(self, data: dict) -> Task:
-        """反序列化任务对象"""
-        return Task(
-            id=data["id"],
-            text=data["text"],
-            completed=data["completed"],
-            created_at=datetime.fromisoformat(data["created_at"]),
-            updated_at=datetime.fromisoformat(data["updated_at"]) if data["updated_at"] else None
-        )
+    def _serialize_task(self, task: Task) -> tuple:
+        """序列化任务对象（见 core/task_codec.py）"""
+        return encode_task(task)
+    
+    def _deserialize_task(self, data: Any) -> Task:
+        """反序列化任务对象，兼容旧版字典记录"""
+        with span("repo.deserialize_task"):
+            return decode_task(data)
     
     def save_task(self, task: Task) -> None:
         """保存任务"""
-        key = self._task_key(task.id)
-        data = self._serialize_task(task)
-        self.storage.insert(key, data)
+        with self.metrics.track("save"), span("repo.save_task"):
+            key = self._task_key(task.id)
+            data = self._serialize_task(task)
+            self.storage.insert(key, data)
+            self._local_version += 1
+            self._sync_index(task=task)
     
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
-        key = self._task_key(task_id)
-        return self.storage.delete(key)
+        with self.metrics.track("delete"), span("repo.delete_task"):
+            key = self._task_key(task_id)
+            success = self.storage.delete(key)
+            if success:
+                self._local_version += 1
+                self._sync_index(deleted_id=task_id)
+            return success
     
     def get_task(self, task_id: str) -> Optional[Task]:
         """获取任务"""
-        key = self._task_key(task_id)
-        data = self.storage.search(key)
-        if data:
-            return self._deserialize_task(data)
-        return None
+        with self.metrics.track("get"), span("repo.get_task"):
+            key = self._task_key(task_id)
+            data = self.storage.search(key)
+            if data:
+                return self._deserialize_task(data)
+            return None
     
     def get_all_tasks(self) -> List[Task]:
         """获取所有任务"""
-        all_data = self.storage.get_all()
-        tasks = []
+        with self.metrics.track("get_all"), span("repo.get_all_tasks"):
+            all_data = self.storage.get_all()
+            tasks = []
+            
+            for key, data in all_data:
+                if key.startswith(self.task_prefix):
+                    try:
+                        # 批量解码不逐条记录追踪
+                        task = decode_task(data)
+                        tasks.append(task)
+                    except Exception as e:
+                        self._decode_failures.inc()
+                        print(f"反序列化任务失败: {e}")
+            
+            # 按创建时间排序
+            tasks.sort(key=lambda t: t.created_at)
+            return tasks
+    
+    def _task_items(self) -> List[Tuple[str, Any]]:
+        """全部(任务ID, 任务记录)，任务ID与记录共用同一个字符串对象"""
+        prefix = self.task_prefix
+        return [(task_record_id(data), data) for key, data in self.storage.get_all()
+                if key.startswith(prefix)]
+    
+    def update_task(self, task: Task) -> bool:
+        """更新任务"""
+        with self.metrics.track("update"), span("repo.update_task"):
+            task.updated_at = datetime.now()
+            key = self._task_key(task.id)
+            data = self._serialize_task(task)
+            success = self.storage.update(key, data)
+            if success:
+                self._local_version += 1
+                self._sync_index(task=task)
+            return success
+    
+    def update_task_with(self, task_id: str, fn: Callable[[Task], Any]) -> Optional[Task]:
+        """在存储写锁内读取任务、以 fn(task) 原地修改并写回，并发修改不会丢失"""
+        with self.metrics.track("update"), span("repo.update_task_with"):
+            updated: List[Task] = []
+            
+            def apply(data: Any) -> tuple:
+                task = self._deserialize_task(data)
+                fn(task)
+                task.updated_at = datetime.now()
+                updated.append(task)
+                return self._serialize_task(task)
+            
+            if self.storage.update_with(self._task_key(task_id), apply) is None:
+                return None
+            self._local_version += 1
+            self._sync_index(task=updated[-1])
+            return updated[-1]
+    
+    def legacy_task_ids(self) -> List[str]:
+        """仍为旧版格式的任务ID"""
+        return [task_id for task_id, data in self._task_items() if is_legacy(data)]
+    
+    def migrate_tasks(self, task_ids: List[str]) -> int:
+        """在一个批次中把旧版记录改写为当前格式（内容不变），返回改写的条数"""
+        if self.read_only:
+            return 0
+        migrated = 0
+        
+        def apply(data: Any) -> Any:
+            nonlocal migrated
+            if not is_legacy(data):
+                return data
+            migrated += 1
+            return encode_task(decode_task(data))
+        
+        with self.metrics.track("migrate"), span("repo.migrate_tasks", tasks=len(task_ids)):
+            with self.batch():
+                for task_id in task_ids:
+                    self.storage.update_with(self._task_key(task_id), apply)
+        return migrated
+    
+    @contextmanager
+    def batch(self):
+        """批量写入：存储和检索索引都只在批次结束时持久化一次"""
+        self._batch_depth += 1
+        try:
+            with self.metrics.track("batch"), span("repo.batch"), self.storage.batch():
+                yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self.index_flush_interval \
+                    and any(d.dirty >= self.index_flush_interval for d in self._derived):
+                self.flush_index()
+    
+    def _to_task_change(self, change) -> Optional[TaskChange]:
+        """将存储变更转换为任务变更，非任务键返回None"""
+        if change.op == OP_CLEAR:
+            return TaskChange(change.seq, change.op, None)
+        if not change.key.startswith(self.task_prefix):
+            return None
+        task_id = change.key[len(self.task_prefix):]
+        task = self._deserialize_task(change.value) if change.op == OP_PUT else None
+        return TaskChange(change.seq, change.op, task_id, task)
+    
+    def changes_since(self, seq: int) -> Optional[List[TaskChange]]:
+        """获取序列号之后的任务变更，历史不可用时返回None（需全量同步）"""
+        changes = self.storage.changes_since(seq)
+        if changes is None:
+            return None
+        result = []
+        for change in changes:
+            task_change = self._to_task_change(change)
+            if task_change:
+                result.append(task_change)
+        return result
+    
+    async def subscribe(self, since: Optional[int] = None):
+        """订阅任务变更"""
+        subscription = self.storage.subscribe(since)
+        try:
+            async for change in subscription:
+                task_change = self._to_task_change(change)
+                if task_change:
+                    yield task_change
+        finally:
+            subscription.close()
+    
+    def _ensure(self, derived: _DerivedIndex):
+        """获取派生索引：优先加载持久化文件，过期则按变更流追平或重建"""
+        if derived.index is not None:
+            self._sync_derived(derived)
+            return derived.index
+        
+        seq = self.storage.last_sequence()
+        # 数据文件被重建后序列号可能与索引文件相同，存储ID不同的索引文件不能沿用
+        index, saved_seq = derived.load(derived.path, self.store_id) if derived.path else (None, None)
+        if index is not None and seq is not None and saved_seq is not None and saved_seq != seq:
+            changes = self.storage.changes_since(saved_seq)
+            if changes is None:
+                index = None
+            else:
+                for change in changes:
+                    self._apply_change(derived, index, change)
+                derived.dirty += 1
+        if index is None or seq is None or saved_seq is None:
+            with span(f"repo.rebuild_{derived.name}"):
+                index = derived.build()
+            derived.dirty += 1
+        
+        derived.index = index
+        derived.seq = seq
+        return index
+    
+    def _ensure_index(self) -> SearchIndex:
+        """获取检索索引"""
+        return self._ensure(self._search)
+    
+    def _apply_change(self, derived: _DerivedIndex, index, change) -> None:
+        """将一条存储变更应用到索引"""
+        if change.op == OP_CLEAR:
+            index.clear()
+        elif change.key.startswith(self.task_prefix):
+            if change.op == OP_PUT:
+                # 索引引用记录中的任务ID，不另存一份从键中切出的副本
+                derived.put(index, task_record_id(change.value), change.value)
+            else:
+                derived.remove(index, change.key[len(self.task_prefix):])
+    
+    def _sync_index(self, task: Optional[Task] = None, deleted_id: Optional[str] = None) -> None:
+        """写操作后维护已构建的索引"""
+        for derived in self._derived:
+            self._sync_derived(derived, task, deleted_id)
+    
+    def _sync_derived(self, derived: _DerivedIndex, task: Optional[Task] = None,
+                      deleted_id: Optional[str] = None) -> None:
+        """维护一个派生索引（尚未构建时跳过）"""
+        if derived.index is None:
+            return
         
-        for key, data in all_data:
-            if key.startswith(self.task_prefix):
-                try:
-                    task = self._deserialize_task(data)
-                    tasks.append(task)
-                except Exception as e:
-                    print(f"反序列化任务失败: {e}")
+        seq = self.storage.last_sequence()
+        if seq is None:
+            # 存储不支持变更流，按本次操作直接维护
+            if task is not None:
+                derived.put(derived.index, task.id, self._serialize_task(task))
+            elif deleted_id is not None:
+                derived.remove(derived.index, deleted_id)
+        elif seq != derived.seq:
+            changes = self.storage.changes_since(derived.seq)
+            if changes is None:
+                # 历史已被压缩，重新构建
+                derived.index = None
+                self._ensure(derived)
+                return
+            for change in changes:
+                self._apply_change(derived, derived.index, change)
+            derived.seq = seq
+        else:
+            return
+        
+        derived.dirty += 1
+        if self.index_flush_interval and derived.dirty >= self.index_flush_interval \
+                and not self._batch_depth:
+            self._flush(derived)
+    
+    def _flush(self, derived: _DerivedIndex) -> None:
+        """将派生索引写入磁盘"""
+        if derived.index is None or not derived.path or not derived.dirty or self.read_only:
+            return
+        try:
+            derived.save(derived.index, derived.path, derived.seq, self.store_id)
+            derived.dirty = 0
+        except Exception as e:
+            print(f"保存{derived.label}失败: {e}")
+    
+    def flush_index(self) -> None:
+        """将检索索引和时间索引写入磁盘"""
+        for derived in self._derived:
+            self._flush(derived)
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """内存占用估算（字节）：存储引擎的分项统计（不支持时为None）和已构建的派生索引
         
-        # 按创建时间排序
-        tasks.sort(key=lambda t: t.created_at)
+        派生索引与存储记录共用的任务ID不重复计入。
+        """
+        try:
+            storage = self.storage.memory_usage()
+        except NotImplementedError:
+            storage = None
+        usage: Dict[str, Any] = {"storage": storage}
+        items = self._task_items()  # 保持引用，统计期间对象ID不会被复用
+        seen = {id(task_id) for task_id, _ in items}
+        for derived in self._derived:
+            usage[derived.name] = deep_sizeof(derived.index, seen) if derived.index is not None else 0
+        usage["total"] = (storage["total"] if storage else 0) + sum(
+            usage[derived.name] for derived in self._derived)
+        return usage
+    
+    def drop_index(self) -> None:
+        """丢弃检索索引、时间索引及其文件"""
+        for derived in self._derived:
+            derived.index = None
+            derived.seq = None
+            derived.dirty = 0
+            if derived.path and os.path.exists(derived.path) and not self.read_only:
+                os.remove(derived.path)
+    
+    def search_tasks(self, query: str, limit: int = 20) -> List[Task]:
+        """全文检索任务，按相关度排序"""
+        with self.metrics.track("search"), span("repo.search_tasks"):
+            results = self._ensure_index().search(query, limit)
+            return self._get_tasks([task_id for task_id, _ in results])
+    
+    def _get_tasks(self, task_ids: List[str]) -> List[Task]:
+        """按ID顺序读取任务，跳过已不存在的"""
+        tasks = []
+        for task_id in task_ids:
+            task = self.get_task(task_id)
+            if task:
+                tasks.append(task)
         return tasks
     
-    def update_task(self, task: Task) -> bool:
-        """更新任务"""
-        task.updated_at = datetime.now()
-        key = self._task_key(task.id)
-        data = self._serialize_task(task)
-        return self.storage.update(key, data)
+    def tasks_due_between(self, start: datetime, end: datetime) -> List[Task]:
+        """截止时间在 [start, end] 内的任务，按截止时间排序"""
+        with self.metrics.track("due"), span("repo.tasks_due_between"):
+            index = self._ensure(self._schedule)
+            return self._get_tasks(index.due.between(start.timestamp(), end.timestamp()))
+    
+    def reminders_between(self, after: datetime, until: datetime) -> List[Task]:
+        """提醒时间在 (after, until] 内的任务，按提醒时间排序"""
+        with self.metrics.track("reminders"), span("repo.reminders_between"):
+            index = self._ensure(self._schedule)
+            return self._get_tasks(index.remind.between(after.timestamp(), until.timestamp(),
+                                                        include_start=False))
+    
+    def next_reminder_at(self, after: datetime) -> Optional[datetime]:
+        """晚于 after 的最早提醒时间"""
+        when = self._ensure(self._schedule).remind.first_after(after.timestamp())
+        return None if when is None else datetime.fromtimestamp(when)
 
 
 class ConfigStorageAdapter:
-    """配置存储适配器"""
+    """配置存储适配器
+    
+    每个配置项单独保存为 app:config:<名称>，读取经过内存缓存（含未命中缓存）。
+    缓存按存储变更流追平，其它写入方修改的配置同样会更新缓存并通知订阅者；
+    值为None表示删除该配置项。
+    """
     
     def __init__(self, storage_engine: IStorageEngine):
         self.storage = storage_engine
         self.config_key = "app:config"
+        self.key_prefix = f"{self.config_key}:"
+        self._cache: Dict[str, Any] = {}
+        self._complete = False  # 缓存是否已包含全部配置项
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.metrics = OperationMetrics("config")
+        self._cache_hits = self.metrics.counter("cache_hits_total", "配置缓存命中次数")
+        self._cache_misses = self.metrics.counter("cache_misses_total", "配置缓存未命中次数")
+        self._migrate_legacy()
+        self._seq = self.storage.last_sequence()
     
-    def save_config(self, config: dict) -> None:
-        """保存配置"""
-        self.storage.insert(self.config_key, config)
+    def _migrate_legacy(self) -> None:
+        """将旧版整体保存的配置字典拆分为单独的键"""
+        legacy = self.storage.search(self.config_key)
+        if not isinstance(legacy, dict):
+            return
+        with self.storage.batch():
+            for key, value in legacy.items():
+                if value is not None:
+                    self.storage.insert(self.key_prefix + key, value)
+            self.storage.delete(self.config_key)
+    
+    def _refresh(self) -> None:
+        """按变更流追平缓存，历史不可用时丢弃缓存"""
+        seq = self.storage.last_sequence()
+        if seq is None or seq == self._seq:
+            return
+        changes = self.storage.changes_since(self._seq) if self._seq is not None else None
+        self._seq = seq
+        if changes is None:
+            self._cache = {}
+            self._complete = False
+            return
+        
+        changed = {}
+        for change in changes:
+            if change.op == OP_CLEAR:
+                changed.update((k, None) for k, v in self._cache.items() if v is not _MISSING)
+                self._cache = {}
+                self._complete = True
+            elif change.key.startswith(self.key_prefix):
+                key = change.key[len(self.key_prefix):]
+                self._cache[key] = change.value if change.op == OP_PUT else _MISSING
+                changed[key] = change.value if change.op == OP_PUT else None
+        if changed:
+            self._notify(changed)
+    
+    def _notify(self, changed: Dict[str, Any]) -> None:
+        """通知订阅者"""
+        for listener in list(self._listeners):
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"配置变更通知失败: {e}")
+    
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """订阅配置变更，回调参数为{键: 新值}，返回取消订阅函数"""
+        self._listeners.append(listener)
+        
+        def unsubscribe() -> None:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+        return unsubscribe
+    
+    def get_config(self, key: str, default: Any = None) -> Any:
+        """读取单个配置项"""
+        self._refresh()
+        try:
+            value = self._cache[key]
+            self._cache_hits.inc()
+        except KeyError:
+            if self._complete:
+                return default
+            self._cache_misses.inc()
+            value = self.storage.search(self.key_prefix + key)
+            value = _MISSING if value is None else value
+            self._cache[key] = value
+        return default if value is _MISSING else value
     
     def load_config(self) -> dict:
         """加载配置"""
-        config = self.storage.search(self.config_key)
-        return config if config else {}
+        self._refresh()
+        if not self._complete:
+            with self.metrics.track("load"):
+                self._cache = {
+                    key[len(self.key_prefix):]: value
+                    for key, value in self.storage.get_all()
+                    if key.startswith(self.key_prefix)
+                }
+                self._complete = True
+        return {key: value for key, value in self._cache.items() if value is not _MISSING}
+    
+    def update_many(self, values: Dict[str, Any]) -> List[str]:
+        """批量更新配置项（一次持久化），只写入发生变化的键，返回变化的键"""
+        changed = {key: value for key, value in values.items()
+                   if self.get_config(key, _MISSING) != (_MISSING if value is None else value)}
+        if not changed:
+            return []
+        with self.metrics.track("update"), self.storage.batch():
+            for key, value in changed.items():
+                if value is None:
+                    self.storage.delete(self.key_prefix + key)
+                else:
+                    self.storage.insert(self.key_prefix + key, value)
+        for key, value in changed.items():
+            self._cache[key] = _MISSING if value is None else value
+        self._seq = self.storage.last_sequence()
+        self._notify(changed)
+        return list(changed)
+    
+    def save_config(self, config: dict) -> None:
+        """保存配置（整体替换）"""
+        removed = {key: None for key in self.load_config() if key not in config}
+        self.update_many({**removed, **config})
     
     def update_config(self, key: str, value: any) -> None:
         """更新配置项"""
-        config = self.load_config()
-        config[key] = value
-        self.save_config(config)
\ No newline at end of file
+        self.update_many({key: value})
+    
+    def delete_config(self, key: str) -> bool:
+        """删除配置项"""
+        return bool(self.update_many({key: None}))
\ No newline at end of file
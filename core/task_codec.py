@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务记录编码
+任务以定长元组保存：(格式版本, ID, 文本, 标志位, 创建时间, 更新时间, 截止时间, 提醒时间)，
+时间为 1970-01-01 起的微秒数（与 datetime.now() 一致的本地时间，不含时区），布尔字段合并为标志位。
+旧版字典记录（ISO 时间字符串）仍可透明读取，由 TaskMigrator 在后台逐批改写为当前格式。
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+from .interfaces import Task
+
+TASK_SCHEMA = 2  # 1 为旧版字典记录
+
+FLAG_COMPLETED = 1
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(value: Optional[datetime]) -> Optional[int]:
+    """时间转微秒数，带时区的时间先转为本地时间"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: Optional[int]) -> Optional[datetime]:
+    """微秒数转时间"""
+    return None if value is None else _EPOCH + _MICROSECOND * value
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """可选ISO字符串转时间"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def encode_task(task: Task) -> tuple:
+    """编码为当前格式的记录"""
+    return (TASK_SCHEMA, task.id, task.text, FLAG_COMPLETED if task.completed else 0,
+            to_micros(task.created_at), to_micros(task.updated_at),
+            to_micros(task.due_at), to_micros(task.remind_at))
+
+
+def decode_task(record: Any) -> Task:
+    """解码任务记录（当前格式或旧版字典）"""
+    if type(record) is not tuple:
+        return _decode_legacy(record)
+    if record[0] != TASK_SCHEMA:
+        raise ValueError(f"未知的任务记录格式: {record[0]}")
+    _, task_id, text, flags, created, updated, due, remind = record
+    # 热路径：内联 from_micros，按位置构造
+    return Task(task_id, text, bool(flags & FLAG_COMPLETED), _EPOCH + _MICROSECOND * created,
+                None if updated is None else _EPOCH + _MICROSECOND * updated,
+                None if due is None else _EPOCH + _MICROSECOND * due,
+                None if remind is None else _EPOCH + _MICROSECOND * remind)
+
+
+def _decode_legacy(data: dict) -> Task:
+    """解码旧版字典记录"""
+    return Task(
+        id=data["id"],
+        text=data["text"],
+        completed=data["completed"],
+        created_at=datetime.fromisoformat(data["created_at"]),
+        updated_at=_parse_time(data.get("updated_at")),
+        due_at=_parse_time(data.get("due_at")),
+        remind_at=_parse_time(data.get("remind_at")),
+    )
+
+
+def is_legacy(record: Any) -> bool:
+    """是否为需要迁移的旧版记录"""
+    return type(record) is dict
+
+
+def task_record_id(record: Any) -> str:
+    """记录中的任务ID（派生索引直接引用这个字符串，不从键中切出副本）"""
+    return record[1] if type(record) is tuple else record["id"]
+
+
+def task_text(record: Any) -> str:
+    """记录中的任务文本（不解码整条记录）"""
+    return record[2] if type(record) is tuple else record["text"]
+
+
+def task_schedule(record: Any) -> Tuple[Optional[float], Optional[float]]:
+    """记录中的(截止时间, 提醒时间)时间戳"""
+    if type(record) is tuple:
+        due, remind = from_micros(record[6]), from_micros(record[7])
+    else:
+        due, remind = _parse_time(record.get("due_at")), _parse_time(record.get("remind_at"))
+    return (due.timestamp() if due else None, remind.timestamp() if remind else None)
+
+
+class TaskMigrator:
+    """后台把旧版任务记录改写为当前格式
+    
+    启动时列出旧版记录，之后每次在一个存储批次中改写 batch_size 条，批次之间让出 pause 秒，
+    前台读写不需要等待迁移完成。新写入的任务本来就是当前格式，不会增加待迁移的记录。
+    """
+    
+    def __init__(self, repository, batch_size: int = 500, pause: float = 0.01):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.pause = pause
+        self.migrated = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def run(self) -> int:
+        """同步迁移全部旧版记录，返回改写的条数"""
+        pending: List[str] = self.repository.legacy_task_ids()
+        for i in range(0, len(pending), self.batch_size):
+            if self._stop.is_set():
+                break
+            try:
+                self.migrated += self.repository.migrate_tasks(pending[i:i + self.batch_size])
+            except Exception as e:
+                print(f"迁移任务记录失败: {e}")
+                break
+            if self._stop.wait(self.pause):
+                break
+        return self.migrated
+    
+    def start(self) -> 'TaskMigrator':
+        """在后台线程中迁移"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="task-migrator", daemon=True)
+            self._thread.start()
+        return self
+    
+    @property
+    def done(self) -> bool:
+        """后台迁移是否已结束"""
+        return self._thread is not None and not self._thread.is_alive()
+    
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待后台迁移结束"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+    
+    def stop(self) -> None:
+        """停止迁移（当前批次完成后）"""
+        self._stop.set()
+        self.join()
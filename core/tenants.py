@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多租户任务仓库
+每个租户（用户）使用独立的存储引擎和数据文件，按需加载，空闲时从内存中移出
+"""
+
+import glob
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from .interfaces import IStorageEngine
+from .metrics import OperationMetrics
+from .storage_adapter import TaskStorageAdapter
+from .tracing import span
+
+_TENANT_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class _Tenant:
+    """已加载的租户"""
+    
+    __slots__ = ("engine", "repository", "last_used", "pins")
+    
+    def __init__(self, engine: IStorageEngine, repository: TaskStorageAdapter):
+        self.engine = engine
+        self.repository = repository
+        self.last_used = time.monotonic()
+        self.pins = 0  # use() 中的使用者数量，大于0时不会被移出
+
+
+class TenantRepositories:
+    """按租户分区的任务仓库
+    
+    每个租户的数据保存在 data_dir/<租户>.dat（检索索引等附属文件在其旁边），
+    由 engine_factory(数据文件路径) 创建存储引擎。租户之间不共享键空间，
+    列出、统计和删除一个租户的任务只涉及该租户自己的数据。
+    
+    首次访问时加载租户；已加载的租户超过 max_loaded 个时移出最久未使用的，
+    evict_idle() 移出空闲超过指定时间的租户。移出前保存检索索引并关闭引擎，
+    数据已在每次写入时持久化，再次访问时重新加载。
+    
+    repository() 返回的仓库只应在当前请求内使用：租户被移出后再次加载的是新的引擎实例，
+    继续使用旧仓库写入会与之冲突。需要较长时间使用时用 use()，期间租户不会被移出。
+    """
+    
+    def __init__(self, data_dir: str, engine_factory: Callable[[str], IStorageEngine],
+                 max_loaded: int = 64):
+        self.data_dir = data_dir
+        self.engine_factory = engine_factory
+        self.max_loaded = max_loaded
+        self._loaded: 'OrderedDict[str, _Tenant]' = OrderedDict()  # 按最近使用排序
+        self._lock = threading.RLock()
+        
+        self.metrics = OperationMetrics("tenants")
+        self._loads = self.metrics.counter("loads_total", "租户加载次数")
+        self._evictions = self.metrics.counter("evictions_total", "租户移出内存次数")
+        self.metrics.gauge("loaded", "内存中的租户数量").set_function(self.loaded_count)
+    
+    def data_file(self, tenant_id: str) -> str:
+        """租户的数据文件路径"""
+        if not _TENANT_RE.match(tenant_id):
+            raise ValueError(f"无效的租户标识: {tenant_id!r}")
+        return os.path.join(self.data_dir, f"{tenant_id}.dat")
+    
+    def _get(self, tenant_id: str) -> _Tenant:
+        """获取已加载的租户，未加载时加载（需持有锁）"""
+        tenant = self._loaded.get(tenant_id)
+        if tenant is None:
+            data_file = self.data_file(tenant_id)
+            with span("tenants.load", tenant=tenant_id):
+                os.makedirs(self.data_dir, exist_ok=True)
+                engine = self.engine_factory(data_file)
+                tenant = _Tenant(engine, TaskStorageAdapter(engine))
+            self._loads.inc()
+            self._loaded[tenant_id] = tenant
+            # 超出上限时从最久未使用的开始移出，跳过使用中的租户
+            overflow = len(self._loaded) - self.max_loaded
+            for candidate in list(self._loaded):
+                if overflow <= 0:
+                    break
+                if candidate != tenant_id and self._loaded[candidate].pins == 0:
+                    self._evict(candidate)
+                    overflow -= 1
+        else:
+            self._loaded.move_to_end(tenant_id)
+        tenant.last_used = time.monotonic()
+        return tenant
+    
+    def repository(self, tenant_id: str) -> TaskStorageAdapter:
+        """租户的任务仓库"""
+        with self._lock:
+            return self._get(tenant_id).repository
+    
+    @contextmanager
+    def use(self, tenant_id: str):
+        """在上下文中使用租户的任务仓库，期间不会被移出"""
+        with self._lock:
+            tenant = self._get(tenant_id)
+            tenant.pins += 1
+        try:
+            yield tenant.repository
+        finally:
+            with self._lock:
+                tenant.pins -= 1
+                tenant.last_used = time.monotonic()
+    
+    def tenants(self) -> List[str]:
+        """全部租户（含未加载的）"""
+        with self._lock:
+            names = set(self._loaded)
+        for path in glob.glob(os.path.join(glob.escape(self.data_dir), "*.dat")):
+            names.add(os.path.basename(path)[:-len(".dat")])
+        return sorted(names)
+    
+    def loaded_count(self) -> int:
+        """内存中的租户数量"""
+        return len(self._loaded)
+    
+    def loaded_tenants(self) -> List[str]:
+        """内存中的租户（从最久未使用到最近使用）"""
+        with self._lock:
+            return list(self._loaded)
+    
+    def stats(self, tenant_id: str) -> Dict[str, Any]:
+        """租户统计：任务数、已完成数、数据文件大小"""
+        with self._lock:
+            tasks = self._get(tenant_id).repository.get_all_tasks()
+        files = glob.glob(glob.escape(self.data_file(tenant_id)) + "*")
+        return {
+            "tenant": tenant_id,
+            "tasks": len(tasks),
+            "completed": sum(1 for t in tasks if t.completed),
+            "bytes": sum(os.path.getsize(path) for path in files if os.path.isfile(path)),
+        }
+    
+    def _close(self, tenant: _Tenant) -> None:
+        """保存索引并关闭引擎"""
+        tenant.repository.flush_index()
+        close = getattr(tenant.engine, "close", None)
+        if close is not None:
+            close()
+    
+    def _evict(self, tenant_id: str) -> bool:
+        """移出内存（需持有锁），使用中的租户不移出"""
+        tenant = self._loaded.get(tenant_id)
+        if tenant is None or tenant.pins:
+            return False
+        del self._loaded[tenant_id]
+        with span("tenants.evict", tenant=tenant_id):
+            self._close(tenant)
+        self._evictions.inc()
+        return True
+    
+    def evict(self, tenant_id: str) -> bool:
+        """将租户移出内存，返回是否移出"""
+        with self._lock:
+            return self._evict(tenant_id)
+    
+    def evict_idle(self, idle_seconds: float) -> List[str]:
+        """移出空闲超过 idle_seconds 的租户，返回被移出的租户"""
+        deadline = time.monotonic() - idle_seconds
+        with self._lock:
+            idle = [tid for tid, tenant in self._loaded.items() if tenant.last_used <= deadline]
+            return [tenant_id for tenant_id in idle if self._evict(tenant_id)]
+    
+    def delete_tenant(self, tenant_id: str) -> bool:
+        """删除租户的全部数据，返回租户是否存在"""
+        data_file = self.data_file(tenant_id)
+        with self._lock:
+            tenant = self._loaded.pop(tenant_id, None)
+            if tenant is not None:
+                tenant.engine.clear()
+                tenant.repository.drop_index()
+                self._close(tenant)
+            files = glob.glob(glob.escape(data_file) + "*")
+            for path in files:
+                os.remove(path)
+        return tenant is not None or bool(files)
+    
+    def close(self) -> None:
+        """移出全部未在使用中的租户"""
+        with self._lock:
+            for tenant_id in list(self._loaded):
+                self._evict(tenant_id)
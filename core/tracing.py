@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+链路追踪
+提供span上下文管理器/装饰器、按请求采样、cProfile性能剖析和Chrome Trace导出
+"""
+
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Span:
+    """一次计时区间"""
+    
+    __slots__ = ("name", "attrs", "parent", "children", "start_ns", "end_ns", "thread_id")
+    
+    def __init__(self, name: str, parent: Optional['Span'], attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List['Span'] = []
+        self.start_ns = 0
+        self.end_ns = 0
+        self.thread_id = threading.get_ident()
+    
+    def set(self, key: str, value: Any) -> None:
+        """设置附加属性"""
+        self.attrs[key] = value
+    
+    @property
+    def duration(self) -> float:
+        """耗时（秒）"""
+        return (self.end_ns - self.start_ns) / 1e9
+    
+    def walk(self):
+        """先序遍历自身及所有子span"""
+        stack = [self]
+        while stack:
+            span = stack.pop()
+            yield span
+            stack.extend(reversed(span.children))
+
+
+class _NullSpan:
+    """未采样时的空span"""
+    
+    __slots__ = ()
+    
+    def __enter__(self) -> '_NullSpan':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+    
+    def set(self, key: str, value: Any) -> None:
+        """忽略属性"""
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+# 当前所在span；_UNSAMPLED 表示根请求未被采样，子span一律跳过
+_UNSAMPLED = object()
+_current_span: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+class _ActiveSpan:
+    """记录中的span上下文"""
+    
+    __slots__ = ("_tracer", "_span", "_token", "_profiler")
+    
+    def __init__(self, tracer: 'Tracer', span: Span):
+        self._tracer = tracer
+        self._span = span
+        self._token = None
+        self._profiler: Optional[cProfile.Profile] = None
+    
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self._span)
+        if self._span.parent is None and self._tracer.profile:
+            self._profiler = self._tracer._start_profiler()
+        self._span.start_ns = time.perf_counter_ns()
+        return self._span
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        span = self._span
+        span.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            span.attrs["error"] = exc_type.__name__
+        _current_span.reset(self._token)
+        if span.parent is None:
+            if self._profiler is not None:
+                self._tracer._stop_profiler(self._profiler)
+            self._tracer._finish(span)
+        else:
+            span.parent.children.append(span)
+
+
+class _UnsampledSpan:
+    """未被采样的根请求，屏蔽其下所有子span"""
+    
+    __slots__ = ("_token",)
+    
+    def __enter__(self) -> _NullSpan:
+        self._token = _current_span.set(_UNSAMPLED)
+        return _NULL_SPAN
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+
+
+class Tracer:
+    """追踪器
+    
+    sample_rate 为根请求的采样概率（0关闭，1全量）；profile 为真时，
+    被采样的根请求同时在 cProfile 下运行。
+    """
+    
+    def __init__(self, sample_rate: float = 0.0, profile: bool = False, max_traces: int = 1000):
+        self.sample_rate = sample_rate
+        self.profile = profile
+        self.traces: deque = deque(maxlen=max_traces)
+        self._profile_stats: Optional[pstats.Stats] = None
+        self._profile_lock = threading.Lock()
+        self._random = random.Random()
+    
+    @property
+    def enabled(self) -> bool:
+        """是否开启采样"""
+        return self.sample_rate > 0
+    
+    def configure(self, sample_rate: Optional[float] = None, profile: Optional[bool] = None) -> None:
+        """调整采样率和剖析开关"""
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+        if profile is not None:
+            self.profile = profile
+    
+    def span(self, name: str, **attrs):
+        """创建span上下文"""
+        parent = _current_span.get()
+        if parent is None:
+            if self.sample_rate <= 0:
+                return _NULL_SPAN
+            if self.sample_rate < 1 and self._random.random() >= self.sample_rate:
+                return _UnsampledSpan()
+            return _ActiveSpan(self, Span(name, None, attrs))
+        if parent is _UNSAMPLED:
+            return _NULL_SPAN
+        return _ActiveSpan(self, Span(name, parent, attrs))
+    
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """装饰器：将函数调用记录为span"""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+            
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def current_span(self) -> Optional[Span]:
+        """获取当前span"""
+        span = _current_span.get()
+        return span if isinstance(span, Span) else None
+    
+    def _finish(self, root: Span) -> None:
+        """保存已完成的根span"""
+        self.traces.append(root)
+    
+    def _start_profiler(self) -> Optional[cProfile.Profile]:
+        """启动剖析器"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 已有其它剖析器在运行
+            return None
+        return profiler
+    
+    def _stop_profiler(self, profiler: cProfile.Profile) -> None:
+        """停止剖析器并合并统计"""
+        profiler.disable()
+        with self._profile_lock:
+            if self._profile_stats is None:
+                self._profile_stats = pstats.Stats(profiler)
+            else:
+                self._profile_stats.add(profiler)
+    
+    def clear(self) -> None:
+        """清空已收集的数据"""
+        self.traces.clear()
+        self._profile_stats = None
+    
+    def format_tree(self, root: Span) -> str:
+        """格式化span计时树"""
+        lines = []
+        
+        def visit(span: Span, depth: int) -> None:
+            extra = "".join(f" {k}={v}" for k, v in span.attrs.items())
+            lines.append(f"{'  ' * depth}{span.name} {span.duration * 1000:.3f}ms{extra}")
+            for child in span.children:
+                visit(child, depth + 1)
+        
+        visit(root, 0)
+        return "\n".join(lines)
+    
+    def to_chrome_events(self) -> List[Dict[str, Any]]:
+        """转换为Chrome Trace事件列表"""
+        pid = os.getpid()
+        events = []
+        for root in list(self.traces):
+            for span in root.walk():
+                events.append({
+                    "name": span.name,
+                    "cat": span.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": span.start_ns / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": {k: str(v) for k, v in span.attrs.items()},
+                })
+        return events
+    
+    def export_chrome_trace(self, path: str) -> int:
+        """导出Chrome Trace格式JSON（chrome://tracing 或 Perfetto 可直接打开）"""
+        events = self.to_chrome_events()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return len(events)
+    
+    def export_profile(self, path: str) -> bool:
+        """导出合并后的cProfile统计（可用 pstats/snakeviz 查看）"""
+        with self._profile_lock:
+            if self._profile_stats is None:
+                return False
+            self._profile_stats.dump_stats(path)
+            return True
+
+
+def _env_float(name: str, default: float) -> float:
+    """读取浮点型环境变量"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# 全局追踪器：TODO_APP_TRACE_SAMPLE 设置采样率，TODO_APP_PROFILE=1 开启剖析
+tracer = Tracer(
+    sample_rate=_env_float("TODO_APP_TRACE_SAMPLE", 0.0),
+    profile=os.environ.get("TODO_APP_PROFILE", "") == "1",
+)
+
+
+def span(name: str, **attrs):
+    """在全局追踪器上创建span"""
+    return tracer.span(name, **attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """全局追踪器的装饰器"""
+    return tracer.traced(name)
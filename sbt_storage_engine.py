@@ -5,14 +5,31 @@
 支持基础的增删改查操作和磁盘持久化
 """
 
+import bisect
+import glob
 import json
 import os
 import pickle
-from typing import Any, Optional, List, Tuple
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Optional, List, Tuple
+
+from core.change_feed import ChangeFeed, OP_PUT, OP_DELETE, OP_CLEAR
+from core.memory import (MemoryBudget, SpillFile, SpilledValue, deep_sizeof, format_size,
+                         iter_resolved, resolve, resolve_items, tree_memory)
+from core.metrics import metrics
+from core.replication_log import ReplicationLogWriter
+from core.snapshot_codec import decode_items, encode_snapshot, is_compressed, parse_compression, read_header
+from core.tracing import span
 
 
 class SBTNode:
-    """SBT树节点"""
+    """SBT树节点（__slots__ 省去每个实例的 __dict__）"""
+    
+    __slots__ = ("key", "value", "left", "right", "size", "version")
     
     def __init__(self, key: str, value: Any):
         self.key = key
@@ -20,6 +37,7 @@ class SBTNode:
         self.left: Optional['SBTNode'] = None
         self.right: Optional['SBTNode'] = None
         self.size = 1  # 子树大小
+        self.version = 0  # 最近一次写入的序列号，0表示加载后未修改
 
 
 class SBTTree:
@@ -27,6 +45,8 @@ class SBTTree:
     
     def __init__(self):
         self.root: Optional[SBTNode] = None
+        self.rotations = 0  # 累计旋转次数，供追踪统计
+        self.base_version = 0  # 从快照加载的节点的版本号
     
     def _get_size(self, node: Optional[SBTNode]) -> int:
         """获取节点子树大小"""
@@ -38,6 +58,7 @@ class SBTTree:
     
     def _left_rotate(self, node: SBTNode) -> SBTNode:
         """左旋转"""
+        self.rotations += 1
         right_child = node.right
         node.right = right_child.left
         right_child.left = node
@@ -49,6 +70,7 @@ class SBTTree:
     
     def _right_rotate(self, node: SBTNode) -> SBTNode:
         """右旋转"""
+        self.rotations += 1
         left_child = node.left
         node.left = left_child.right
         left_child.right = node
@@ -82,171 +104,948 @@ class SBTTree:
         
         return node
     
-    def _insert(self, node: Optional[SBTNode], key: str, value: Any) -> SBTNode:
-        """插入节点"""
-        if not node:
-            return SBTNode(key, value)
+    def _rebalance_path(self, path: List[SBTNode], delta: int) -> None:
+        """插入/删除后自底向上调整路径上的子树大小，只在违反SBT性质的节点上调用 _maintain"""
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            node.size += delta
+            left, right = node.left, node.right
+            left_size = left.size if left else 0
+            right_size = right.size if right else 0
+            if (left and ((left.left.size if left.left else 0) > right_size
+                          or (left.right.size if left.right else 0) > right_size)) \
+                    or (right and ((right.right.size if right.right else 0) > left_size
+                                   or (right.left.size if right.left else 0) > left_size)):
+                subtree = self._maintain(node)
+                if i == 0:
+                    self.root = subtree
+                elif path[i - 1].left is node:
+                    path[i - 1].left = subtree
+                else:
+                    path[i - 1].right = subtree
+    
+    def _put(self, key: str, value: Any, version: int, overwrite: bool) -> bool:
+        """单次下降插入，键已存在时按 overwrite 决定是否覆盖，返回是否新建了键"""
+        path = []
+        node = self.root
+        while node:
+            if key == node.key:
+                if overwrite:
+                    node.value = value
+                    node.version = version
+                return False
+            path.append(node)
+            node = node.left if key < node.key else node.right
         
-        if key < node.key:
-            node.left = self._insert(node.left, key, value)
-        elif key > node.key:
-            node.right = self._insert(node.right, key, value)
+        node = SBTNode(key, value)
+        node.version = version
+        if not path:
+            self.root = node
+        elif key < path[-1].key:
+            path[-1].left = node
         else:
-            # 更新已存在的键
-            node.value = value
-            return node
+            path[-1].right = node
+        self._rebalance_path(path, 1)
+        return True
+    
+    def _find(self, key: str) -> Optional[SBTNode]:
+        """查找节点"""
+        node = self.root
+        while node:
+            if key == node.key:
+                return node
+            node = node.left if key < node.key else node.right
+        return None
+    
+    def _version(self, node: SBTNode) -> int:
+        """节点版本号，加载后未修改过的节点使用 base_version"""
+        return node.version or self.base_version
+    
+    def insert(self, key: str, value: Any, version: int = 0) -> None:
+        """插入键值对"""
+        self.upsert(key, value, version)
+    
+    def upsert(self, key: str, value: Any, version: int = 0) -> bool:
+        """插入或覆盖，返回是否新建了键"""
+        return self._put(key, value, version, True)
+    
+    def insert_if_absent(self, key: str, value: Any, version: int = 0) -> bool:
+        """键不存在时插入，返回是否插入"""
+        return self._put(key, value, version, False)
+    
+    def delete(self, key: str) -> bool:
+        """删除键值对"""
+        path = []
+        node = self.root
+        while node and key != node.key:
+            path.append(node)
+            node = node.left if key < node.key else node.right
+        if node is None:
+            return False
         
-        self._update_size(node)
-        return self._maintain(node)
+        if node.left and node.right:
+            # 有两个子节点：用右子树的最小节点替换，转为删除该最小节点
+            target = node
+            path.append(node)
+            node = node.right
+            while node.left:
+                path.append(node)
+                node = node.left
+            target.key = node.key
+            target.value = node.value
+            target.version = node.version
+        
+        child = node.left or node.right
+        if not path:
+            self.root = child
+        elif path[-1].left is node:
+            path[-1].left = child
+        else:
+            path[-1].right = child
+        self._rebalance_path(path, -1)
+        return True
     
-    def _find_min(self, node: SBTNode) -> SBTNode:
-        """找到最小节点"""
-        while node.left:
-            node = node.left
-        return node
+    def search(self, key: str) -> Optional[Any]:
+        """搜索键值对"""
+        node = self._find(key)
+        return node.value if node else None
     
-    def _delete(self, node: Optional[SBTNode], key: str) -> Optional[SBTNode]:
-        """删除节点"""
-        if not node:
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """搜索键值对及其版本号"""
+        node = self._find(key)
+        return (node.value, self._version(node)) if node else None
+    
+    def update(self, key: str, value: Any, version: int = 0) -> bool:
+        """更新键值对"""
+        node = self._find(key)
+        if node is None:
+            return False
+        node.value = value
+        node.version = version
+        return True
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any], version: int = 0) -> Optional[Any]:
+        """以 fn(旧值) 的结果更新，返回新值；键不存在或 fn 返回None时不修改并返回None"""
+        node = self._find(key)
+        if node is None:
             return None
+        value = fn(node.value)
+        if value is not None:
+            node.value = value
+            node.version = version
+        return value
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any, version: int = 0) -> bool:
+        """版本号匹配时写入；expected_version 为0表示要求键不存在"""
+        if expected_version == 0:
+            return self.insert_if_absent(key, value, version)
+        node = self._find(key)
+        if node is None or self._version(node) != expected_version:
+            return False
+        node.value = value
+        node.version = version
+        return True
+    
+    def get_all(self) -> List[Tuple[str, Any]]:
+        """获取所有键值对（显式栈中序遍历）"""
+        result = []
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            result.append((node.key, node.value))
+            node = node.right
+        return result
+    
+    def size(self) -> int:
+        """获取树的大小"""
+        return self._get_size(self.root)
+    
+    def build_from_sorted(self, items: List[Tuple[str, Any]]) -> None:
+        """由按键严格递增的键值对线性构建平衡树，替换现有内容"""
+        def build(lo: int, hi: int) -> Optional[SBTNode]:
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            key, value = items[mid]
+            node = SBTNode(key, value)
+            node.left = build(lo, mid)
+            node.right = build(mid + 1, hi)
+            node.size = hi - lo
+            return node
         
-        if key < node.key:
-            node.left = self._delete(node.left, key)
-        elif key > node.key:
-            node.right = self._delete(node.right, key)
-        else:
-            # 找到要删除的节点
-            if not node.left:
-                return node.right
-            elif not node.right:
-                return node.left
-            else:
-                # 有两个子节点，找到右子树的最小节点替换
-                min_node = self._find_min(node.right)
-                node.key = min_node.key
-                node.value = min_node.value
-                node.right = self._delete(node.right, min_node.key)
+        self.root = build(0, len(items))
+    
+    def load(self, items: List[Tuple[str, Any]]) -> None:
+        """批量载入键值对：空树且输入有序时线性构建，否则逐个插入"""
+        if self.root is None and _is_strictly_sorted(items):
+            self.build_from_sorted(items)
+            return
+        for key, value in items:
+            self.insert(key, value)
+
+
+class ArenaSBTTree:
+    """数组存储的SBT，接口与 SBTTree 相同
+    
+    节点用整数编号表示，键、值、左右孩子、子树大小和版本号分别存放在并行数组中，
+    0号节点是空节点哨兵（大小为0），删除的编号进入空闲列表复用。
+    不为每个节点创建Python对象，每项的结构开销约为 SBTTree 的一半。
+    """
+    
+    def __init__(self):
+        self.keys: List[Optional[str]] = [None]
+        self.values: List[Any] = [None]
+        self.left = array('i', [0])
+        self.right = array('i', [0])
+        self.sizes = array('i', [0])
+        self.versions = array('q', [0])
+        self.free: List[int] = []
+        self.root = 0
+        self.rotations = 0
+        self.base_version = 0
+    
+    def _new_node(self, key: str, value: Any, version: int) -> int:
+        """分配节点，优先复用空闲编号"""
+        if self.free:
+            node = self.free.pop()
+            self.keys[node] = key
+            self.values[node] = value
+            self.left[node] = 0
+            self.right[node] = 0
+            self.sizes[node] = 1
+            self.versions[node] = version
+            return node
+        self.keys.append(key)
+        self.values.append(value)
+        self.left.append(0)
+        self.right.append(0)
+        self.sizes.append(1)
+        self.versions.append(version)
+        return len(self.keys) - 1
+    
+    def _free_node(self, node: int) -> None:
+        """回收节点编号并释放键值引用"""
+        self.keys[node] = None
+        self.values[node] = None
+        self.free.append(node)
+    
+    def _left_rotate(self, node: int) -> int:
+        """左旋转"""
+        self.rotations += 1
+        left, right, sizes = self.left, self.right, self.sizes
+        child = right[node]
+        right[node] = left[child]
+        left[child] = node
+        sizes[child] = sizes[node]
+        sizes[node] = sizes[left[node]] + sizes[right[node]] + 1
+        return child
+    
+    def _right_rotate(self, node: int) -> int:
+        """右旋转"""
+        self.rotations += 1
+        left, right, sizes = self.left, self.right, self.sizes
+        child = left[node]
+        left[node] = right[child]
+        right[child] = node
+        sizes[child] = sizes[node]
+        sizes[node] = sizes[left[node]] + sizes[right[node]] + 1
+        return child
+    
+    def _maintain(self, node: int) -> int:
+        """维护SBT性质（与 SBTTree._maintain 相同的规则）"""
+        left, right, sizes = self.left, self.right, self.sizes
+        left_size = sizes[left[node]]
+        right_size = sizes[right[node]]
         
-        self._update_size(node)
-        return self._maintain(node)
+        if left[node] and sizes[left[left[node]]] > right_size:
+            node = self._right_rotate(node)
+        elif left[node] and sizes[right[left[node]]] > right_size:
+            left[node] = self._left_rotate(left[node])
+            node = self._right_rotate(node)
+        elif right[node] and sizes[right[right[node]]] > left_size:
+            node = self._left_rotate(node)
+        elif right[node] and sizes[left[right[node]]] > left_size:
+            right[node] = self._right_rotate(right[node])
+            node = self._left_rotate(node)
+        return node
     
-    def _search(self, node: Optional[SBTNode], key: str) -> Optional[Any]:
-        """搜索节点"""
-        if not node:
-            return None
+    def _rebalance_path(self, path: List[int], delta: int) -> None:
+        """自底向上调整路径上的子树大小，只在违反SBT性质的节点上调用 _maintain"""
+        left, right, sizes = self.left, self.right, self.sizes
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            sizes[node] += delta
+            left_child, right_child = left[node], right[node]
+            left_size, right_size = sizes[left_child], sizes[right_child]
+            # 0号哨兵的孩子和大小都为0，不需要判空
+            if sizes[left[left_child]] > right_size or sizes[right[left_child]] > right_size \
+                    or sizes[right[right_child]] > left_size or sizes[left[right_child]] > left_size:
+                subtree = self._maintain(node)
+                if i == 0:
+                    self.root = subtree
+                elif left[path[i - 1]] == node:
+                    left[path[i - 1]] = subtree
+                else:
+                    right[path[i - 1]] = subtree
+    
+    def _put(self, key: str, value: Any, version: int, overwrite: bool) -> bool:
+        """单次下降插入，键已存在时按 overwrite 决定是否覆盖，返回是否新建了键"""
+        keys, left, right = self.keys, self.left, self.right
+        path = []
+        node = self.root
+        while node:
+            node_key = keys[node]
+            if key == node_key:
+                if overwrite:
+                    self.values[node] = value
+                    self.versions[node] = version
+                return False
+            path.append(node)
+            node = left[node] if key < node_key else right[node]
         
-        if key == node.key:
-            return node.value
-        elif key < node.key:
-            return self._search(node.left, key)
+        node = self._new_node(key, value, version)
+        if not path:
+            self.root = node
+        elif key < keys[path[-1]]:
+            left[path[-1]] = node
         else:
-            return self._search(node.right, key)
+            right[path[-1]] = node
+        self._rebalance_path(path, 1)
+        return True
     
-    def _inorder(self, node: Optional[SBTNode], result: List[Tuple[str, Any]]) -> None:
-        """中序遍历"""
-        if node:
-            self._inorder(node.left, result)
-            result.append((node.key, node.value))
-            self._inorder(node.right, result)
+    def _find(self, key: str) -> int:
+        """查找节点编号，不存在返回0"""
+        keys, left, right = self.keys, self.left, self.right
+        node = self.root
+        while node:
+            node_key = keys[node]
+            if key == node_key:
+                return node
+            node = left[node] if key < node_key else right[node]
+        return 0
     
-    def insert(self, key: str, value: Any) -> None:
+    def insert(self, key: str, value: Any, version: int = 0) -> None:
         """插入键值对"""
-        self.root = self._insert(self.root, key, value)
+        self.upsert(key, value, version)
+    
+    def upsert(self, key: str, value: Any, version: int = 0) -> bool:
+        """插入或覆盖，返回是否新建了键"""
+        return self._put(key, value, version, True)
+    
+    def insert_if_absent(self, key: str, value: Any, version: int = 0) -> bool:
+        """键不存在时插入，返回是否插入"""
+        return self._put(key, value, version, False)
     
     def delete(self, key: str) -> bool:
         """删除键值对"""
-        old_root = self.root
-        self.root = self._delete(self.root, key)
-        return old_root != self.root or (old_root and self._search(old_root, key) is not None)
+        keys, left, right = self.keys, self.left, self.right
+        path = []
+        node = self.root
+        while node and key != keys[node]:
+            path.append(node)
+            node = left[node] if key < keys[node] else right[node]
+        if not node:
+            return False
+        
+        if left[node] and right[node]:
+            # 有两个子节点：用右子树的最小节点替换，转为删除该最小节点
+            target = node
+            path.append(node)
+            node = right[node]
+            while left[node]:
+                path.append(node)
+                node = left[node]
+            keys[target] = keys[node]
+            self.values[target] = self.values[node]
+            self.versions[target] = self.versions[node]
+        
+        child = left[node] or right[node]
+        if not path:
+            self.root = child
+        elif left[path[-1]] == node:
+            left[path[-1]] = child
+        else:
+            right[path[-1]] = child
+        self._free_node(node)
+        self._rebalance_path(path, -1)
+        return True
     
     def search(self, key: str) -> Optional[Any]:
         """搜索键值对"""
-        return self._search(self.root, key)
+        node = self._find(key)
+        return self.values[node] if node else None
     
-    def update(self, key: str, value: Any) -> bool:
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """搜索键值对及其版本号"""
+        node = self._find(key)
+        if not node:
+            return None
+        return self.values[node], self.versions[node] or self.base_version
+    
+    def update(self, key: str, value: Any, version: int = 0) -> bool:
         """更新键值对"""
-        if self.search(key) is not None:
-            self.insert(key, value)
-            return True
-        return False
+        node = self._find(key)
+        if not node:
+            return False
+        self.values[node] = value
+        self.versions[node] = version
+        return True
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any], version: int = 0) -> Optional[Any]:
+        """以 fn(旧值) 的结果更新，返回新值；键不存在或 fn 返回None时不修改并返回None"""
+        node = self._find(key)
+        if not node:
+            return None
+        value = fn(self.values[node])
+        if value is not None:
+            self.values[node] = value
+            self.versions[node] = version
+        return value
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any, version: int = 0) -> bool:
+        """版本号匹配时写入；expected_version 为0表示要求键不存在"""
+        if expected_version == 0:
+            return self.insert_if_absent(key, value, version)
+        node = self._find(key)
+        if not node or (self.versions[node] or self.base_version) != expected_version:
+            return False
+        self.values[node] = value
+        self.versions[node] = version
+        return True
     
     def get_all(self) -> List[Tuple[str, Any]]:
-        """获取所有键值对"""
+        """获取所有键值对（显式栈中序遍历）"""
+        keys, values, left, right = self.keys, self.values, self.left, self.right
         result = []
-        self._inorder(self.root, result)
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = left[node]
+            node = stack.pop()
+            result.append((keys[node], values[node]))
+            node = right[node]
         return result
     
     def size(self) -> int:
         """获取树的大小"""
-        return self._get_size(self.root)
+        return self.sizes[self.root]
+    
+    def build_from_sorted(self, items: List[Tuple[str, Any]]) -> None:
+        """由按键严格递增的键值对线性构建平衡树，替换现有内容；第i项的节点编号为i+1"""
+        self.__init__()
+        count = len(items)
+        self.keys = [None] + [key for key, _ in items]
+        self.values = [None] + [value for _, value in items]
+        left = self.left = array('i', [0]) * (count + 1)
+        right = self.right = array('i', [0]) * (count + 1)
+        sizes = self.sizes = array('i', [0]) * (count + 1)
+        self.versions = array('q', [0]) * (count + 1)
+        
+        def build(lo: int, hi: int) -> int:
+            if lo >= hi:
+                return 0
+            mid = (lo + hi) // 2
+            node = mid + 1
+            left[node] = build(lo, mid)
+            right[node] = build(mid + 1, hi)
+            sizes[node] = hi - lo
+            return node
+        
+        self.root = build(0, count)
+    
+    def load(self, items: List[Tuple[str, Any]]) -> None:
+        """批量载入键值对：空树且输入有序时线性构建，否则逐个插入"""
+        if not self.root and _is_strictly_sorted(items):
+            self.build_from_sorted(items)
+            return
+        for key, value in items:
+            self.insert(key, value)
+
+def _is_strictly_sorted(items: List[Tuple[str, Any]]) -> bool:
+    """检查键是否严格递增"""
+    return all(items[i][0] < items[i + 1][0] for i in range(len(items) - 1))
+
+
+class _StreamedList:
+    """序列化为列表的迭代器：按顺序逐项写出，反序列化后是普通列表"""
+    
+    def __init__(self, items: Iterable[Any]):
+        self.items = items
+    
+    def __reduce__(self):
+        return list, (), None, iter(self.items)
+
+
+def read_snapshot(data_file: str) -> Tuple[List[Tuple[str, Any]], int, Optional[str]]:
+    """读取磁盘快照，返回(有序键值对, 序列号, 存储ID)；文件不存在时为空，旧格式没有存储ID"""
+    if not os.path.exists(data_file):
+        return [], 0, None
+    with open(data_file, 'rb') as f:
+        raw = f.read()
+    if is_compressed(raw):
+        header = read_header(raw)
+        return decode_items(header), header["seq"], header.get("store_id")
+    data = pickle.loads(raw)
+    # 兼容旧格式：直接保存的键值对列表
+    if isinstance(data, list):
+        return data, 0, None
+    return data["items"], data.get("seq", 0), data.get("store_id")
 
 
 class SBTStorageEngine:
-    """基于SBT的存储引擎"""
+    """基于SBT的存储引擎
+    
+    lazy=True 时构造函数立即返回，由后台线程读取快照并构建树：
+    快照读入后点查询直接在有序快照上二分查找，写操作等待加载完成。
     
-    def __init__(self, data_file: str = "sbt_storage.dat"):
+    每次写操作分配单调递增的序列号并记录到 feed，序列号随快照持久化。
+    
+    batch() 内的写操作只修改内存中的树，在最外层批次结束时统一保存一次。
+    
+    每个键的版本号是最近一次写入它的序列号（从快照加载的键为快照序列号），
+    compare_and_swap / update_with 在写锁内完成一次查找和写入。
+    
+    内存索引默认为SBT，tree_factory 可替换为接口相同的其它有序结构
+    （见 storage/engines.py），持久化格式不变。
+    
+    compression 为 "zlib"、"lzma:9" 等时以压缩格式保存快照（见 core/snapshot_codec.py），
+    读取时按文件内容自动识别，两种格式可以互相切换；压缩快照按块在多个线程中并行解压。
+    
+    快照先写临时文件再替换，其它进程读到的总是完整快照。replication_log=True 时每次保存后
+    把新的变更追加到 <数据文件>.log，供只读副本增量追赶（见 storage/replica.py）。
+    
+    memory_budget 为字节数时每隔一批写入统计一次内存（见 core/memory.py 的 MemoryBudget）：
+    budget_policy="warn" 时超出预算打印告警；"spill" 时按版本号把最久未写入的值移到
+    <数据文件>.spill，内存中只留占位，读取时透明地从文件读回（不回填内存）。
+    """
+    
+    SNAPSHOT_FORMAT = 2
+    
+    def __init__(self, data_file: str = "sbt_storage.dat", lazy: bool = False,
+                 tree_factory: Callable[[], Any] = SBTTree, compression: Optional[str] = None,
+                 replication_log: bool = False, memory_budget: Optional[int] = None,
+                 budget_policy: str = "warn"):
         self.data_file = data_file
-        self.tree = SBTTree()
-        self.load_from_disk()
+        self.tree_factory = tree_factory
+        self.compression = parse_compression(compression)
+        self.tree = tree_factory()
+        self.feed = ChangeFeed()
+        # 存储ID：新建的存储生成新ID，加载快照时替换为快照中保存的ID
+        self._store_id = uuid.uuid4().hex
+        self._save_bytes = metrics.histogram("sbt_save_bytes", "每次保存写入的字节数", scale=1)
+        self._save_seconds = metrics.histogram("sbt_save_duration_seconds", "每次保存耗时")
+        self._load_seconds = metrics.histogram("sbt_load_duration_seconds", "加载数据耗时")
+        
+        # 复制日志：已写入日志的序列号，None 表示下次保存时轮换
+        self._replication = ReplicationLogWriter(f"{data_file}.log") if replication_log else None
+        self._shipped_seq: Optional[int] = None
+        
+        # 内存预算：超出时告警或把冷数据溢出到 <数据文件>.spill（首次溢出时创建）
+        self.memory_budget = MemoryBudget(memory_budget, budget_policy) if memory_budget else None
+        self._spill_file: Optional[SpillFile] = None
+        self._budget_exceeded = metrics.counter("sbt_memory_budget_exceeded_total", "内存超出预算的次数")
+        self._spilled_values = metrics.counter("sbt_spilled_values_total", "溢出到磁盘的值的数量")
+        if self.memory_budget is not None:
+            metrics.gauge("sbt_memory_bytes", "最近一次统计的内存占用",
+                          file=data_file).set_function(self._budget_used)
+        
+        # 延迟加载状态：快照可读 / 树构建完成
+        self._snapshot: Optional[List[Tuple[str, Any]]] = None
+        self._snapshot_keys: Optional[List[str]] = None
+        self._snapshot_ready = threading.Event()
+        self._loaded = threading.Event()
+        self._loader: Optional[threading.Thread] = None
+        
+        # 写锁：树修改、序列号分配和持久化作为一个整体；批次期间一直持有
+        self._lock = threading.RLock()
+        
+        # 批量写入：嵌套深度与是否有未保存的修改
+        self._batch_depth = 0
+        self._batch_dirty = False
+        
+        if lazy:
+            self._loader = threading.Thread(target=self._background_load,
+                                            name="sbt-loader", daemon=True)
+            self._loader.start()
+        else:
+            self.load_from_disk()
+            self._snapshot_ready.set()
+            self._loaded.set()
+    
+    @property
+    def loaded(self) -> bool:
+        """是否已完成加载"""
+        return self._loaded.is_set()
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """等待后台加载完成"""
+        return self._loaded.wait(timeout)
+    
+    def _background_load(self) -> None:
+        """后台加载：先发布有序快照供读取，再构建树"""
+        try:
+            with self._load_seconds.time(), span("sbt.background_load"):
+                data, seq, store_id = self._read_snapshot()
+                self.feed.reset(seq)
+                self._store_id = store_id or self._store_id
+                self._snapshot = data
+                self._snapshot_keys = [key for key, _ in data]
+                self._snapshot_ready.set()
+                
+                tree = self.tree_factory()
+                tree.load(data)
+                tree.base_version = seq
+                self.tree = tree
+                self._check_budget()
+        except Exception as e:
+            print(f"加载数据失败: {e}")
+        finally:
+            self._loaded.set()
+            self._snapshot_ready.set()
+            self._snapshot = None
+            self._snapshot_keys = None
+    
+    def _snapshot_search(self, key: str) -> Optional[Any]:
+        """在有序快照上二分查找"""
+        keys = self._snapshot_keys
+        data = self._snapshot
+        if keys is None or data is None:
+            return resolve(self.tree.search(key))
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return data[index][1]
+        return None
+    
+    def _next_version(self) -> int:
+        """下一次写入将分配的序列号（需持有写锁）"""
+        return self.feed.last_seq + 1
+    
+    def _commit(self, op: str, key: Optional[str], value: Any = None) -> None:
+        """记录变更并持久化（需持有写锁）"""
+        self.feed.append(op, key, value)
+        if self.memory_budget is not None and self.memory_budget.tick(self.tree.size()):
+            self._check_budget()
+        self._persist()
     
     def insert(self, key: str, value: Any) -> None:
         """插入数据"""
-        self.tree.insert(key, value)
-        self.save_to_disk()
+        self.upsert(key, value)
+    
+    def upsert(self, key: str, value: Any) -> bool:
+        """插入或覆盖，返回是否新建了键"""
+        self._loaded.wait()
+        with self._lock, span("sbt.tree_insert") as s:
+            rotations = self.tree.rotations
+            created = self.tree.upsert(key, value, self._next_version())
+            s.set("rotations", self.tree.rotations - rotations)
+            self._commit(OP_PUT, key, value)
+        return created
+    
+    def insert_if_absent(self, key: str, value: Any) -> bool:
+        """键不存在时插入，返回是否插入"""
+        self._loaded.wait()
+        with self._lock, span("sbt.tree_insert") as s:
+            rotations = self.tree.rotations
+            created = self.tree.insert_if_absent(key, value, self._next_version())
+            s.set("rotations", self.tree.rotations - rotations)
+            if created:
+                self._commit(OP_PUT, key, value)
+        return created
     
     def delete(self, key: str) -> bool:
         """删除数据"""
-        success = self.tree.delete(key)
-        if success:
-            self.save_to_disk()
+        self._loaded.wait()
+        with self._lock, span("sbt.tree_delete") as s:
+            rotations = self.tree.rotations
+            success = self.tree.delete(key)
+            s.set("rotations", self.tree.rotations - rotations)
+            if success:
+                self._commit(OP_DELETE, key)
         return success
     
     def search(self, key: str) -> Optional[Any]:
         """查询数据"""
-        return self.tree.search(key)
+        if not self._loaded.is_set():
+            self._snapshot_ready.wait()
+            return self._snapshot_search(key)
+        with span("sbt.tree_search"):
+            return resolve(self.tree.search(key))
+    
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查询数据及其版本号（最近一次写入的序列号）"""
+        self._loaded.wait()
+        with span("sbt.tree_search"):
+            result = self.tree.search_with_version(key)
+        if result is not None and type(result[0]) is SpilledValue:
+            return result[0].load(), result[1]
+        return result
     
     def update(self, key: str, value: Any) -> bool:
         """更新数据"""
-        success = self.tree.update(key, value)
-        if success:
-            self.save_to_disk()
+        self._loaded.wait()
+        with self._lock, span("sbt.tree_update"):
+            success = self.tree.update(key, value, self._next_version())
+            if success:
+                self._commit(OP_PUT, key, value)
+        return success
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any]) -> Optional[Any]:
+        """在写锁内以 fn(旧值) 原子地更新，返回新值；键不存在或 fn 返回None时不写入"""
+        self._loaded.wait()
+        with self._lock, span("sbt.tree_update"):
+            value = self.tree.update_with(key, lambda old: fn(resolve(old)), self._next_version())
+            if value is not None:
+                self._commit(OP_PUT, key, value)
+        return value
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any) -> bool:
+        """版本号匹配时写入；expected_version 为0表示要求键不存在"""
+        self._loaded.wait()
+        with self._lock, span("sbt.tree_update"):
+            success = self.tree.compare_and_swap(key, expected_version, value, self._next_version())
+            if success:
+                self._commit(OP_PUT, key, value)
         return success
     
     def get_all(self) -> List[Tuple[str, Any]]:
         """获取所有数据"""
-        return self.tree.get_all()
+        if not self._loaded.is_set():
+            self._snapshot_ready.wait()
+            data = self._snapshot
+            if data is not None:
+                return list(data)
+        return self._resolved_items()
+    
+    def _resolved_items(self) -> List[Tuple[str, Any]]:
+        """树中全部键值对，溢出的值读回内存"""
+        items = self.tree.get_all()
+        if self._spill_file is None:
+            return items
+        return resolve_items(items)
     
     def size(self) -> int:
         """获取数据量"""
+        if not self._loaded.is_set():
+            self._snapshot_ready.wait()
+            data = self._snapshot
+            if data is not None:
+                return len(data)
         return self.tree.size()
     
+    @contextmanager
+    def batch(self):
+        """批量写入，可嵌套；批次内不回滚，异常退出时已完成的修改同样会保存"""
+        self._loaded.wait()
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._batch_dirty:
+                    self._batch_dirty = False
+                    self.save_to_disk()
+    
+    def _persist(self) -> None:
+        """写操作后保存，批次内推迟到批次结束"""
+        if self._batch_depth:
+            self._batch_dirty = True
+        else:
+            self.save_to_disk()
+    
     def save_to_disk(self) -> None:
         """保存数据到磁盘"""
         try:
-            data = self.tree.get_all()
-            with open(self.data_file, 'wb') as f:
-                pickle.dump(data, f)
+            with self._save_seconds.time(), span("sbt.save_to_disk") as s:
+                items = self.tree.get_all()
+                streamed = self._spill_file is not None
+                if streamed:
+                    # 溢出的值边读回边写出，不把全部值同时读入内存
+                    items = iter_resolved(items)
+                tmp_path = f"{self.data_file}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    if self.compression:
+                        codec, level = self.compression
+                        f.write(encode_snapshot(items, self.feed.last_seq, codec, level,
+                                                store_id=self._store_id))
+                    else:
+                        pickler = pickle.Pickler(f)
+                        # 备忘表会引用写出过的每个对象，读回的值要到写完才能释放
+                        pickler.fast = streamed
+                        pickler.dump({
+                            "format": self.SNAPSHOT_FORMAT,
+                            "seq": self.feed.last_seq,
+                            "store_id": self._store_id,
+                            "items": _StreamedList(items) if streamed else items,
+                        })
+                    self._save_bytes.observe(f.tell())
+                    s.set("bytes", f.tell())
+                os.replace(tmp_path, self.data_file)
+            self._ship_changes()
         except Exception as e:
             print(f"保存数据失败: {e}")
     
+    def _ship_changes(self) -> None:
+        """把上次之后的变更追加到复制日志；历史不可用或日志过大时轮换（需持有写锁）"""
+        if self._replication is None:
+            return
+        changes = None if self._shipped_seq is None else self.feed.changes_since(self._shipped_seq)
+        if changes is None or self._replication.size() > self._replication.max_bytes:
+            # 快照已包含此前的全部变更，新日志从当前序列号开始
+            self._replication.rotate(self.feed.last_seq, self._store_id)
+        else:
+            self._replication.append(changes)
+        self._shipped_seq = self.feed.last_seq
+    
+    def _read_snapshot(self) -> Tuple[List[Tuple[str, Any]], int, Optional[str]]:
+        """读取磁盘快照，返回(有序键值对, 序列号, 存储ID)"""
+        return read_snapshot(self.data_file)
+    
     def load_from_disk(self) -> None:
         """从磁盘加载数据"""
         if not os.path.exists(self.data_file):
             return
         
         try:
-            with open(self.data_file, 'rb') as f:
-                data = pickle.load(f)
-                for key, value in data:
-                    self.tree.insert(key, value)
+            with self._load_seconds.time(), span("sbt.load_from_disk"):
+                # 快照按键有序保存，空树时可线性构建
+                items, seq, store_id = self._read_snapshot()
+                self.tree.load(items)
+                self.tree.base_version = seq
+                self.feed.reset(seq)
+                self._store_id = store_id or self._store_id
+            self._check_budget()
         except Exception as e:
             print(f"加载数据失败: {e}")
     
+    def replace_all(self, items: List[Tuple[str, Any]]) -> None:
+        """以按键有序的键值对替换全部数据（线性构建，不逐个插入）
+        
+        序列号继续递增并丢弃变更历史，订阅方需全量重新同步；之前读到的版本号全部失效。
+        """
+        self._loaded.wait()
+        with self._lock, span("sbt.replace_all"):
+            tree = self.tree_factory()
+            tree.load(items)
+            seq = self.feed.last_seq + 1
+            self.feed.reset(seq)
+            tree.base_version = seq
+            self.tree = tree
+            self._reset_spill()
+            self._persist()
+    
     def clear(self) -> None:
-        """清空所有数据"""
-        self.tree = SBTTree()
-        if os.path.exists(self.data_file):
-            os.remove(self.data_file)
+        """清空所有数据
+        
+        保存一个只含序列号的空快照而不是删除数据文件，重新打开后序列号继续递增，
+        此前发出的版本号、ETag 和备份点不会被新写入的数据重复使用。
+        """
+        self._loaded.wait()
+        with self._lock:
+            self.tree = self.tree_factory()
+            self._reset_spill()
+            self.feed.append(OP_CLEAR, None)
+            self._persist()
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """内存占用估算（字节）：nodes / keys / values / total，以及溢出到磁盘的值的数量和文件大小"""
+        self._loaded.wait()
+        with self._lock, span("sbt.memory_usage"):
+            return self._measure()
+    
+    def _measure(self) -> Dict[str, int]:
+        """遍历树统计内存（需持有写锁或在加载期间调用）"""
+        items = self.tree.get_all()
+        usage = tree_memory(self.tree, items)
+        spill = self._spill_file
+        usage["spilled"] = sum(1 for _, value in items if type(value) is SpilledValue) if spill else 0
+        usage["spill_file_bytes"] = spill.size if spill else 0
+        return usage
+    
+    def _check_budget(self) -> None:
+        """统计内存并按预算策略处理（需持有写锁或在加载期间调用）"""
+        budget = self.memory_budget
+        if budget is None:
+            return
+        used = self._measure()["total"]
+        newly_exceeded = budget.record(used)
+        if not budget.exceeded:
+            return
+        if budget.policy == "spill":
+            budget.record(used - self._spill(used - budget.target))
+        elif newly_exceeded:
+            self._budget_exceeded.inc()
+            print(f"内存超出预算: {format_size(used)} > {format_size(budget.limit)}（{self.data_file}）")
+    
+    def _spill(self, excess: int) -> int:
+        """把最久未写入的值溢出到磁盘，直到释放约 excess 字节，返回估算释放的字节数"""
+        with span("sbt.spill") as s:
+            tree = self.tree
+            resident, spilled = [], []
+            for key, value in tree.get_all():
+                version = tree.search_with_version(key)[1]
+                if type(value) is SpilledValue:
+                    spilled.append((key, value, version))
+                else:
+                    resident.append((version, key, value))
+            resident.sort(key=itemgetter(0))
+            
+            if self._spill_file is None:
+                self._spill_file = SpillFile(f"{self.data_file}.spill")
+            elif spilled and self._spill_file.size > 2 * sum(ref.length for _, ref, _ in spilled):
+                # 一半以上是已被覆盖或删除的旧值，只复制仍被引用的记录
+                self._spill_file, moved = self._spill_file.rewrite(ref for _, ref, _ in spilled)
+                for (key, _, version), ref in zip(spilled, moved):
+                    tree.update(key, ref, version)
+            
+            freed = count = 0
+            for version, key, value in resident:
+                if freed >= excess:
+                    break
+                ref = self._spill_file.dump(value)
+                # 保留原版本号：溢出不是写入，不影响 compare_and_swap 和变更流
+                tree.update(key, ref, version)
+                freed += deep_sizeof(value) - deep_sizeof(ref, {id(ref.store)})
+                count += 1
+            self._spill_file.flush()
+            self._spilled_values.inc(count)
+            s.set("values", count)
+        return freed
+    
+    def _budget_used(self) -> int:
+        """最近一次统计的内存占用（供仪表读取）"""
+        return self.memory_budget.used
+    
+    def _reset_spill(self) -> None:
+        """树被整体替换后丢弃溢出文件（需持有写锁）"""
+        if self._spill_file is not None:
+            self._spill_file.discard()
+            self._spill_file = None
+    
+    def last_sequence(self) -> int:
+        """最近一次写操作的序列号"""
+        return self.feed.last_seq
+    
+    def store_id(self) -> str:
+        """存储ID：随快照持久化，清空后不变，数据文件被删除后重新生成"""
+        self._snapshot_ready.wait()
+        return self._store_id
+    
+    def changes_since(self, seq: int):
+        """获取序列号之后的变更，历史不可用时返回None"""
+        self._loaded.wait()
+        return self.feed.changes_since(seq)
+    
+    def subscribe(self, since: Optional[int] = None):
+        """订阅变更（需在事件循环中调用）"""
+        self._loaded.wait()
+        return self.feed.subscribe(since)
 
 
 def main():
@@ -306,8 +1105,10 @@ def main():
     for key, value in engine2.get_all():
         print(f"{key}: {value}")
     
-    # 清理测试文件
+    # 清理测试文件：clear() 会写出空快照，数据文件及其附属文件需要单独删除
     engine.clear()
+    for path in glob.glob(f"{engine.data_file}*"):
+        os.remove(path)
     print("\n测试完成，已清理测试数据")
 
 
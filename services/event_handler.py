@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件处理实现
+界面事件先在短时间窗口内合并，再作为一个存储批次写入；天气刷新去抖
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from core.interfaces import IEventHandler, IWeatherService, Task, WeatherData
+from core.metrics import OperationMetrics
+from core.tracing import span
+from .todo_service import TodoService
+
+_TOGGLE = "toggle"
+_DELETE = "delete"
+
+
+@dataclass
+class FlushResult:
+    """一次写入的结果"""
+    created: List[Task] = field(default_factory=list)
+    toggled: List[Task] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+
+class BatchingEventHandler(IEventHandler):
+    """合并写入的事件处理器（需在事件循环中调用）
+    
+    任务事件进入待写队列，第一个事件到达 flush_delay 秒后统一写入：
+    同一任务的两次切换相互抵消，删除覆盖之前的切换，
+    新增、切换和删除在一个 repository.batch() 中完成，只持久化一次。
+    定时写入在单个工作线程中依次执行，保存数据文件期间事件循环可以继续接收事件；
+    写入结果在事件循环中通过 on_flush(FlushResult) 通知。
+    
+    天气刷新在最后一次点击 weather_debounce 秒后才请求，请求进行中的点击不再发起新请求，
+    结果通过 on_weather(WeatherData) 通知。
+    """
+    
+    def __init__(self, todo_service: TodoService, weather_service: IWeatherService,
+                 on_flush: Optional[Callable[[FlushResult], None]] = None,
+                 on_weather: Optional[Callable[[WeatherData], None]] = None,
+                 flush_delay: float = 0.05, weather_debounce: float = 0.3):
+        self.todo_service = todo_service
+        self.weather_service = weather_service
+        self.on_flush = on_flush
+        self.on_weather = on_weather
+        self.flush_delay = flush_delay
+        self.weather_debounce = weather_debounce
+        
+        # 待写队列：新增的文本，以及每个任务合并后的操作
+        self._adds: List[str] = []
+        self._ops: Dict[str, str] = {}
+        self._first_event: Optional[float] = None
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Future] = set()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="event-flush")
+        self._weather_timer: Optional[asyncio.TimerHandle] = None
+        self._weather_task: Optional[asyncio.Task] = None
+        
+        self.metrics = OperationMetrics("events")
+        self._events = self.metrics.counter("received_total", "收到的事件数")
+        self._coalesced = self.metrics.counter("coalesced_total", "合并后无需写入的事件数")
+        self._weather_requests = self.metrics.counter("weather_requests_total", "实际发起的天气请求数")
+        self._flush_latency = self.metrics.histogram(
+            "flush_latency_seconds", "从第一个待写事件到写入完成的时间")
+        self.metrics.gauge("queue_depth", "待写入的操作数").set_function(self.queue_depth)
+    
+    def queue_depth(self) -> int:
+        """待写入的操作数"""
+        return len(self._adds) + len(self._ops)
+    
+    def _enqueued(self) -> None:
+        """记录一个任务事件，必要时安排写入"""
+        self._events.inc()
+        if self._first_event is None:
+            self._first_event = time.perf_counter()
+        if self._flush_timer is None:
+            loop = asyncio.get_running_loop()
+            self._flush_timer = loop.call_later(self.flush_delay, self._flush_later)
+    
+    def on_task_add(self, text: str) -> None:
+        """处理添加任务事件"""
+        if text and text.strip():
+            self._adds.append(text)
+            self._enqueued()
+    
+    def on_task_toggle(self, task_id: str) -> None:
+        """处理切换任务事件：与未写入的切换抵消"""
+        pending = self._ops.get(task_id)
+        if pending == _TOGGLE:
+            del self._ops[task_id]
+            self._coalesced.inc(2)
+        elif pending == _DELETE:
+            self._coalesced.inc()
+        else:
+            self._ops[task_id] = _TOGGLE
+        self._enqueued()
+    
+    def on_task_delete(self, task_id: str) -> None:
+        """处理删除任务事件：覆盖未写入的切换"""
+        if task_id in self._ops:
+            self._coalesced.inc()
+        self._ops[task_id] = _DELETE
+        self._enqueued()
+    
+    def _take(self) -> Tuple[List[str], Dict[str, str], Optional[float]]:
+        """取出待写队列（在事件循环中调用）"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        taken = self._adds, self._ops, self._first_event
+        self._adds, self._ops, self._first_event = [], {}, None
+        return taken
+    
+    def _write(self, adds: List[str], ops: Dict[str, str]) -> FlushResult:
+        """在一个存储批次中写入（可在工作线程中执行）"""
+        result = FlushResult()
+        with self.metrics.track("flush"), span("events.flush", operations=len(adds) + len(ops)):
+            with self.todo_service.repository.batch():
+                result.created = self.todo_service.create_tasks(adds)
+                result.toggled = self.todo_service.toggle_tasks(
+                    task_id for task_id, op in ops.items() if op == _TOGGLE)
+                result.deleted = self.todo_service.delete_tasks(
+                    task_id for task_id, op in ops.items() if op == _DELETE)
+        return result
+    
+    def _written(self, result: FlushResult, first_event: Optional[float]) -> None:
+        """记录延迟并通知写入结果"""
+        if first_event is not None:
+            self._flush_latency.observe(time.perf_counter() - first_event)
+        if self.on_flush:
+            self.on_flush(result)
+    
+    def flush(self) -> FlushResult:
+        """在当前线程中立即写入待写队列"""
+        adds, ops, first_event = self._take()
+        if not adds and not ops:
+            return FlushResult()
+        result = self._write(adds, ops)
+        self._written(result, first_event)
+        return result
+    
+    async def flush_async(self) -> FlushResult:
+        """在工作线程中写入待写队列，写入期间不阻塞事件循环"""
+        adds, ops, first_event = self._take()
+        if not adds and not ops:
+            return FlushResult()
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, self._write, adds, ops)
+        self._written(result, first_event)
+        return result
+    
+    def _flush_later(self) -> None:
+        """合并窗口结束，开始写入"""
+        self._flush_timer = None
+        future = asyncio.ensure_future(self._scheduled_flush())
+        self._flushes.add(future)
+        future.add_done_callback(self._flushes.discard)
+    
+    async def _scheduled_flush(self) -> None:
+        """定时写入，失败时打印错误"""
+        try:
+            await self.flush_async()
+        except Exception as e:
+            print(f"写入任务事件失败: {e}")
+    
+    def on_weather_refresh(self) -> None:
+        """处理刷新天气事件：去抖，请求进行中时忽略"""
+        self._events.inc()
+        if self._weather_task is not None and not self._weather_task.done():
+            self._coalesced.inc()
+            return
+        if self._weather_timer is not None:
+            self._weather_timer.cancel()
+            self._coalesced.inc()
+        loop = asyncio.get_running_loop()
+        self._weather_timer = loop.call_later(self.weather_debounce, self._start_weather)
+    
+    def _start_weather(self) -> None:
+        """去抖结束，发起天气请求"""
+        self._weather_timer = None
+        self._weather_requests.inc()
+        self._weather_task = asyncio.ensure_future(self._refresh_weather())
+    
+    async def _refresh_weather(self) -> None:
+        """请求天气并通知"""
+        try:
+            weather = await self.weather_service.get_current_weather()
+        except Exception as e:
+            print(f"刷新天气失败: {e}")
+            return
+        if self.on_weather:
+            self.on_weather(weather)
+    
+    async def close(self) -> None:
+        """等待进行中的写入并写入待写队列，取消未开始的天气请求并等待进行中的请求"""
+        if self._flushes:
+            await asyncio.gather(*self._flushes)
+        await self.flush_async()
+        self._executor.shutdown(wait=False)
+        if self._weather_timer is not None:
+            self._weather_timer.cancel()
+            self._weather_timer = None
+        if self._weather_task is not None:
+            await self._weather_task
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP任务API服务
+基于asyncio标准库的轻量HTTP/JSON服务，使用存储版本号生成ETag并支持条件请求
+"""
+
+import asyncio
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from core.interfaces import Task, TaskChange
+from core.metrics import OperationMetrics
+from services.todo_service import TodoService
+
+MAX_HEADER_LINES = 100
+MAX_BODY_SIZE = 1024 * 1024
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class HTTPError(Exception):
+    """HTTP错误"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def task_to_dict(task: Task) -> Dict[str, Any]:
+    """任务转换为JSON对象（字段名与前端保持一致）"""
+    return {
+        "id": task.id,
+        "text": task.text,
+        "completed": task.completed,
+        "createdAt": task.created_at.isoformat(),
+        "updatedAt": task.updated_at.isoformat() if task.updated_at else None,
+    }
+
+
+def change_to_dict(change: TaskChange) -> Dict[str, Any]:
+    """任务变更转换为JSON对象"""
+    return {
+        "seq": change.seq,
+        "op": change.op,
+        "id": change.task_id,
+        "task": task_to_dict(change.task) if change.task else None,
+    }
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """判断If-None-Match是否命中（弱比较）"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((c[2:] if c.startswith("W/") else c) == bare for c in candidates)
+
+
+class TaskAPI:
+    """任务API路由与处理（与网络层解耦，便于测试）"""
+    
+    def __init__(self, todo_service: TodoService):
+        self.service = todo_service
+        self.metrics = OperationMetrics("http")
+        self._not_modified = self.metrics.counter("not_modified_total", "304响应次数")
+    
+    def _etag(self, scope: str, body: Optional[bytes] = None) -> str:
+        """根据存储ID和版本号生成ETag，不支持版本号时退回内容哈希
+        
+        存储被重建后版本号会从头开始，带上存储ID才不会与重建前发出的ETag相同。
+        """
+        version = self.service.get_version()
+        if version is not None:
+            store_id = self.service.get_store_id()
+            return f'"v{version}-{store_id}-{scope}"' if store_id else f'"v{version}-{scope}"'
+        digest = hashlib.sha1(body or b"").hexdigest()[:16]
+        return f'"{digest}"'
+    
+    def _json(self, status: int, payload: Any, etag: Optional[str] = None) -> Response:
+        """构造JSON响应"""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if etag:
+            headers["ETag"] = etag
+        return status, headers, body
+    
+    def _conditional(self, headers: Dict[str, str], scope: str, build) -> Response:
+        """带ETag的GET：版本号未变化时直接返回304，不读取存储"""
+        version = self.service.get_version()
+        if version is not None:
+            etag = self._etag(scope)
+            if_none_match = headers.get("if-none-match")
+            if _etag_matches(if_none_match, etag):
+                if if_none_match.strip() == "*":
+                    build()  # "*" 只匹配存在的资源，资源不存在时 build 抛出404
+                self._not_modified.inc()
+                return HTTPStatus.NOT_MODIFIED, {"ETag": etag}, b""
+            status, response_headers, body = self._json(HTTPStatus.OK, build())
+            response_headers["ETag"] = etag
+            return status, response_headers, body
+        
+        status, response_headers, body = self._json(HTTPStatus.OK, build())
+        etag = self._etag(scope, body)
+        if _etag_matches(headers.get("if-none-match"), etag):
+            self._not_modified.inc()
+            return HTTPStatus.NOT_MODIFIED, {"ETag": etag}, b""
+        response_headers["ETag"] = etag
+        return status, response_headers, body
+    
+    @staticmethod
+    def _parse_json(body: bytes) -> Dict[str, Any]:
+        """解析请求体"""
+        try:
+            data = json.loads(body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "请求体不是合法的JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "请求体必须是JSON对象")
+        return data
+    
+    @staticmethod
+    def _int_param(query: Dict[str, list], name: str, default: int) -> int:
+        """解析整数查询参数"""
+        values = query.get(name)
+        if not values:
+            return default
+        try:
+            return int(values[0])
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"参数 {name} 必须是整数")
+    
+    def handle(self, method: str, target: str, headers: Dict[str, str], body: bytes = b"") -> Response:
+        """处理一个请求，headers 的键为小写"""
+        with self.metrics.track(method.lower()):
+            try:
+                return self._dispatch(method.upper(), target, headers, body)
+            except HTTPError as e:
+                return self._json(e.status, {"error": e.message})
+            except Exception as e:
+                print(f"处理请求失败: {e}")
+                return self._json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "服务器内部错误"})
+    
+    def _dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        """路由分发"""
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        query = parse_qs(url.query)
+        
+        if method == "OPTIONS":
+            return HTTPStatus.NO_CONTENT, {}, b""
+        
+        if parts == ["health"] and method == "GET":
+            return self._json(HTTPStatus.OK, {"status": "ok", "version": self.service.get_version()})
+        
+        if parts == ["changes"] and method == "GET":
+            return self._list_changes(query)
+        
+        if parts == ["search"] and method == "GET":
+            return self._search_tasks(headers, query)
+        
+        if not parts or parts[0] != "tasks":
+            raise HTTPError(HTTPStatus.NOT_FOUND, "资源不存在")
+        
+        if len(parts) == 1:
+            if method == "GET":
+                return self._list_tasks(headers, query)
+            if method == "POST":
+                return self._create_task(body)
+        elif len(parts) == 2:
+            task_id = parts[1]
+            if method == "GET":
+                return self._get_task(headers, task_id)
+            if method == "PATCH":
+                return self._update_task(task_id, body)
+            if method == "DELETE":
+                return self._delete_task(task_id)
+        elif len(parts) == 3 and parts[2] == "toggle" and method == "POST":
+            return self._toggle_task(parts[1])
+        
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "不支持的请求方法")
+    
+    def _list_tasks(self, headers: Dict[str, str], query: Dict[str, list]) -> Response:
+        """分页列出任务"""
+        offset = max(0, self._int_param(query, "offset", 0))
+        limit = min(MAX_PAGE_SIZE, max(1, self._int_param(query, "limit", DEFAULT_PAGE_SIZE)))
+        
+        def build():
+            tasks, total = self.service.list_tasks(offset, limit)
+            return {
+                "tasks": [task_to_dict(t) for t in tasks],
+                "total": total,
+                "offset": offset,
+                "limit": limit,
+                "version": self.service.get_version(),
+            }
+        
+        return self._conditional(headers, f"list-{offset}-{limit}", build)
+    
+    def _search_tasks(self, headers: Dict[str, str], query: Dict[str, list]) -> Response:
+        """全文检索"""
+        text = (query.get("q") or [""])[0]
+        if not text.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "缺少检索词 q")
+        limit = min(MAX_PAGE_SIZE, max(1, self._int_param(query, "limit", 20)))
+        
+        def build():
+            tasks = self.service.search_tasks(text, limit)
+            return {"tasks": [task_to_dict(t) for t in tasks], "query": text}
+        
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        return self._conditional(headers, f"search-{digest}-{limit}", build)
+    
+    def _list_changes(self, query: Dict[str, list]) -> Response:
+        """增量同步：返回序列号之后的变更，历史不可用时返回410要求全量同步"""
+        since = self._int_param(query, "since", 0)
+        # 先取序列号：并发写入时宁可重复下发也不能遗漏
+        last_seq = self.service.get_version()
+        changes = self.service.changes_since(since)
+        if changes is None:
+            return self._json(HTTPStatus.GONE, {"error": "变更历史已压缩，请重新全量同步",
+                                                "lastSeq": last_seq})
+        return self._json(HTTPStatus.OK, {
+            "changes": [change_to_dict(c) for c in changes],
+            "lastSeq": last_seq,
+        })
+    
+    def _get_task(self, headers: Dict[str, str], task_id: str) -> Response:
+        """获取单个任务"""
+        def build():
+            task = self.service.get_task(task_id)
+            if not task:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "任务不存在")
+            return task_to_dict(task)
+        
+        return self._conditional(headers, f"task-{task_id}", build)
+    
+    def _create_task(self, body: bytes) -> Response:
+        """创建任务"""
+        text = self._parse_json(body).get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "任务内容不能为空")
+        task = self.service.create_task(text)
+        if not task:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "创建任务失败")
+        return self._json(HTTPStatus.CREATED, task_to_dict(task), self._etag(f"task-{task.id}"))
+    
+    def _toggle_task(self, task_id: str) -> Response:
+        """切换任务状态"""
+        task = self.service.toggle_task(task_id)
+        if not task:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "任务不存在")
+        return self._json(HTTPStatus.OK, task_to_dict(task), self._etag(f"task-{task.id}"))
+    
+    def _update_task(self, task_id: str, body: bytes) -> Response:
+        """更新任务文本"""
+        text = self._parse_json(body).get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "任务内容不能为空")
+        task = self.service.update_task_text(task_id, text)
+        if not task:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "任务不存在")
+        return self._json(HTTPStatus.OK, task_to_dict(task), self._etag(f"task-{task.id}"))
+    
+    def _delete_task(self, task_id: str) -> Response:
+        """删除任务"""
+        if not self.service.delete_task(task_id):
+            raise HTTPError(HTTPStatus.NOT_FOUND, "任务不存在")
+        return HTTPStatus.NO_CONTENT, {}, b""
+
+
+class TaskHTTPServer:
+    """基于asyncio的HTTP/1.1服务器，支持keep-alive
+    
+    请求处理调用同步的服务（写操作会保存数据文件），在单个工作线程中依次执行：
+    不阻塞事件循环，同时保持仓库和派生索引只被一个线程修改。
+    """
+    
+    def __init__(self, todo_service: TodoService, host: str = "127.0.0.1", port: int = 8000,
+                 allow_origin: str = "*"):
+        self.api = TaskAPI(todo_service)
+        self.host = host
+        self.port = port
+        self.allow_origin = allow_origin
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="http-api")
+    
+    async def start(self) -> None:
+        """开始监听"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # 端口为0时记录实际端口
+        self.port = self._server.sockets[0].getsockname()[1]
+    
+    async def serve_forever(self) -> None:
+        """持续服务"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+    
+    async def close(self) -> None:
+        """关闭服务"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=False)
+    
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """读取一个HTTP请求，连接关闭时返回None"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").strip().split(" ", 2)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "请求行格式错误")
+        
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过多")
+        
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length 无效")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, version, headers, body
+    
+    def _encode_response(self, status: int, headers: Dict[str, str], body: bytes,
+                         keep_alive: bool, head_only: bool = False) -> bytes:
+        """编码HTTP响应"""
+        phrase = HTTPStatus(status).phrase
+        all_headers = {
+            "Date": formatdate(usegmt=True),
+            "Server": "todo-app",
+            "Access-Control-Allow-Origin": self.allow_origin,
+            "Access-Control-Allow-Methods": "GET, POST, PATCH, DELETE, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+            "Access-Control-Expose-Headers": "ETag",
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        all_headers.update(headers)
+        if status not in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED):
+            all_headers["Content-Length"] = str(len(body))
+        else:
+            body = b""
+        head = f"HTTP/1.1 {int(status)} {phrase}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in all_headers.items())
+        return head.encode("latin-1") + b"\r\n" + (b"" if head_only else body)
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个TCP连接上的请求"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    body = json.dumps({"error": e.message}, ensure_ascii=False).encode("utf-8")
+                    writer.write(self._encode_response(e.status, {"Content-Type": "application/json; charset=utf-8"},
+                                                       body, keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                
+                method, target, version, headers, body = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+                head_only = method.upper() == "HEAD"
+                loop = asyncio.get_running_loop()
+                status, response_headers, response_body = await loop.run_in_executor(
+                    self._executor, self.api.handle, "GET" if head_only else method, target, headers, body)
+                writer.write(self._encode_response(status, response_headers, response_body,
+                                                   keep_alive, head_only))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def serve(todo_service: TodoService, host: str = "127.0.0.1", port: int = 8000) -> None:
+    """启动服务并持续运行"""
+    server = TaskHTTPServer(todo_service, host, port)
+    await server.start()
+    print(f"任务API服务已启动: http://{server.host}:{server.port}/tasks")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+负载模拟
+预置任务后由多个并发客户端（asyncio 协程或工作线程）按比例重放任务操作并穿插天气请求，
+报告吞吐、各操作的延迟分位数、数据文件大小和进程峰值内存（todo-app simulate）
+"""
+
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+from core.interfaces import IWeatherService
+from core.tracing import span
+from .todo_service import TodoService
+
+OPERATIONS = ("create", "toggle", "update", "delete", "list", "stats", "weather")
+
+DEFAULT_MIX = {"create": 15, "toggle": 25, "update": 15, "delete": 5,
+               "list": 25, "stats": 10, "weather": 5}
+
+MODES = ("asyncio", "threads")
+
+LIST_PAGE_SIZE = 50
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, float]:
+    """解析操作比例，如 "create=20,toggle=30,list=50"；空值为默认比例"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"未知的操作: {name}（可选: {', '.join(OPERATIONS)}）")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"操作比例不是数字: {part}") from None
+        if mix[name] < 0:
+            raise ValueError(f"操作比例不能为负: {part}")
+    if not any(mix.values()):
+        raise ValueError("操作比例不能全为0")
+    return mix
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """进程峰值常驻内存，平台不支持时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """有序样本的分位数（最近秩）"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+@dataclass
+class OperationStats:
+    """单个操作的统计（延迟单位为秒）"""
+    name: str
+    count: int
+    errors: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+
+@dataclass
+class SimulationReport:
+    """模拟结果"""
+    mode: str
+    clients: int
+    seeded: int
+    operations: int
+    errors: int
+    elapsed: float
+    data_file_bytes: Optional[int] = None
+    peak_rss_bytes: Optional[int] = None
+    stats: List[OperationStats] = field(default_factory=list)
+    
+    @property
+    def throughput(self) -> float:
+        """每秒完成的操作数"""
+        return self.operations / self.elapsed if self.elapsed else 0.0
+    
+    def as_dict(self) -> dict:
+        """转换为可 JSON 序列化的字典"""
+        data = asdict(self)
+        data["throughput"] = self.throughput
+        return data
+    
+    def format(self) -> str:
+        """文本报告"""
+        lines = [
+            f"模式: {self.mode}，客户端: {self.clients}，预置任务: {self.seeded}",
+            f"操作: {self.operations}（失败 {self.errors}），耗时 {self.elapsed:.2f}s，"
+            f"吞吐 {self.throughput:,.0f} ops/s",
+        ]
+        if self.data_file_bytes is not None:
+            lines.append(f"数据文件: {self.data_file_bytes / 1024:,.0f}KB")
+        if self.peak_rss_bytes is not None:
+            lines.append(f"峰值内存: {self.peak_rss_bytes / 1024 / 1024:,.1f}MB")
+        lines.append("")
+        lines.append(f"{'操作':<10}{'次数':>8}{'失败':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for s in self.stats:
+            lines.append(f"{s.name:<10}{s.count:>8}{s.errors:>6}" + "".join(
+                f"{value * 1000:>8.2f}ms" for value in (s.p50, s.p95, s.p99, s.max)))
+        return "\n".join(lines)
+
+
+class LoadSimulator:
+    """负载模拟器
+    
+    mode="asyncio" 时客户端是同一事件循环中的协程，任务操作同步执行、操作之间让出事件循环，
+    与 HTTP 服务的运行方式一致；mode="threads" 时每个客户端是一个线程，各自带一个事件循环发起天气请求。
+    随机数按 seed 和客户端编号生成，同样的参数重放同样的操作序列（线程交错除外）。
+    """
+    
+    def __init__(self, todo_service: TodoService, weather_service: Optional[IWeatherService] = None,
+                 mix: Optional[Dict[str, float]] = None, clients: int = 4, mode: str = "asyncio",
+                 seed: Optional[int] = None, data_file: Optional[str] = None):
+        if mode not in MODES:
+            raise ValueError(f"未知的模式: {mode}（可选: {', '.join(MODES)}）")
+        if clients < 1:
+            raise ValueError(f"客户端数量至少为1: {clients}")
+        self.todo_service = todo_service
+        self.weather_service = weather_service
+        self.mix = dict(mix or DEFAULT_MIX)
+        if weather_service is None:
+            self.mix.pop("weather", None)
+        self.clients = clients
+        self.mode = mode
+        self.seed = seed
+        self.data_file = data_file
+        self.seeded = 0
+        
+        self._names = [name for name in OPERATIONS if self.mix.get(name)]
+        self._weights = [self.mix[name] for name in self._names]
+        if not self._names:
+            raise ValueError("没有可执行的操作")
+        # 已知任务ID：列表便于随机选取，删除时与末尾交换
+        self._ids: List[str] = [task.id for task in todo_service.get_all_tasks()]
+        self._ids_lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._record_lock = threading.Lock()
+    
+    def seed_tasks(self, count: int, batch_size: int = 1000) -> int:
+        """预置 count 个任务，返回创建的数量"""
+        created = 0
+        with span("simulate.seed", tasks=count):
+            for start in range(0, count, batch_size):
+                texts = [f"预置任务 {i}" for i in range(start, min(count, start + batch_size))]
+                tasks = self.todo_service.create_tasks(texts)
+                with self._ids_lock:
+                    self._ids.extend(task.id for task in tasks)
+                created += len(tasks)
+        self.seeded += created
+        return created
+    
+    def _pick_id(self, rng: random.Random, remove: bool = False) -> Optional[str]:
+        """随机选取一个已知任务ID"""
+        with self._ids_lock:
+            if not self._ids:
+                return None
+            i = rng.randrange(len(self._ids))
+            if not remove:
+                return self._ids[i]
+            self._ids[i], self._ids[-1] = self._ids[-1], self._ids[i]
+            return self._ids.pop()
+    
+    def _execute(self, name: str, rng: random.Random) -> bool:
+        """执行一个任务操作，返回是否成功"""
+        service = self.todo_service
+        if name in ("toggle", "update", "delete"):
+            task_id = self._pick_id(rng, remove=name == "delete")
+            if task_id is None:
+                name = "create"
+            elif name == "toggle":
+                return service.toggle_task(task_id) is not None
+            elif name == "update":
+                return service.update_task_text(task_id, f"更新任务 {rng.randrange(10 ** 6)}") is not None
+            else:
+                return service.delete_task(task_id)
+        if name == "create":
+            task = service.create_task(f"模拟任务 {rng.randrange(10 ** 6)}")
+            if task is None:
+                return False
+            with self._ids_lock:
+                self._ids.append(task.id)
+            return True
+        if name == "list":
+            with self._ids_lock:
+                total = len(self._ids)
+            service.list_tasks(rng.randrange(max(1, total)), LIST_PAGE_SIZE)
+            return True
+        if name == "stats":
+            service.get_task_stats()
+            return True
+        raise ValueError(f"未知的操作: {name}")
+    
+    def _record(self, name: str, seconds: float, ok: bool) -> None:
+        """记录一次操作"""
+        with self._record_lock:
+            self._latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+    
+    def _run_sync(self, name: str, rng: random.Random) -> None:
+        """计时执行一个任务操作"""
+        start = time.perf_counter()
+        try:
+            ok = self._execute(name, rng)
+        except Exception as e:
+            print(f"模拟操作 {name} 失败: {e}")
+            ok = False
+        self._record(name, time.perf_counter() - start, ok)
+    
+    async def _run_weather(self) -> None:
+        """计时请求一次天气"""
+        start = time.perf_counter()
+        try:
+            await self.weather_service.get_current_weather()
+            ok = True
+        except Exception as e:
+            print(f"模拟天气请求失败: {e}")
+            ok = False
+        self._record("weather", time.perf_counter() - start, ok)
+    
+    def _schedule(self, client: int, operations: int) -> Tuple[List[str], random.Random]:
+        """客户端的操作序列和随机数生成器"""
+        seed = None if self.seed is None else self.seed * 1000 + client
+        rng = random.Random(seed)
+        return rng.choices(self._names, self._weights, k=operations), rng
+    
+    async def _async_client(self, client: int, operations: int) -> None:
+        """协程客户端"""
+        names, rng = self._schedule(client, operations)
+        for name in names:
+            if name == "weather":
+                await self._run_weather()
+            else:
+                self._run_sync(name, rng)
+                await asyncio.sleep(0)
+    
+    def _thread_client(self, client: int, operations: int) -> None:
+        """线程客户端"""
+        names, rng = self._schedule(client, operations)
+        loop = asyncio.new_event_loop()
+        try:
+            for name in names:
+                if name == "weather":
+                    loop.run_until_complete(self._run_weather())
+                else:
+                    self._run_sync(name, rng)
+        finally:
+            loop.close()
+    
+    async def _run_async(self, shares: List[int]) -> None:
+        """并发运行全部协程客户端"""
+        await asyncio.gather(*(self._async_client(i, n) for i, n in enumerate(shares)))
+    
+    def run(self, operations: int) -> SimulationReport:
+        """由各客户端共执行 operations 个操作，返回报告（不能在事件循环中调用）"""
+        shares = [operations // self.clients + (1 if i < operations % self.clients else 0)
+                  for i in range(self.clients)]
+        self._latencies = {}
+        self._errors = {}
+        
+        start = time.perf_counter()
+        with span("simulate.run", mode=self.mode, clients=self.clients, operations=operations):
+            if self.mode == "asyncio":
+                asyncio.run(self._run_async(shares))
+            else:
+                threads = [threading.Thread(target=self._thread_client, args=(i, n),
+                                            name=f"simulate-{i}") for i, n in enumerate(shares)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        elapsed = time.perf_counter() - start
+        return self._report(elapsed)
+    
+    def _report(self, elapsed: float) -> SimulationReport:
+        """汇总报告"""
+        stats = []
+        for name in OPERATIONS:
+            samples = sorted(self._latencies.get(name, ()))
+            if not samples:
+                continue
+            stats.append(OperationStats(
+                name, len(samples), self._errors.get(name, 0),
+                _percentile(samples, 50), _percentile(samples, 95), _percentile(samples, 99), samples[-1]))
+        data_file_bytes = None
+        if self.data_file and os.path.exists(self.data_file):
+            data_file_bytes = os.path.getsize(self.data_file)
+        return SimulationReport(
+            mode=self.mode,
+            clients=self.clients,
+            seeded=self.seeded,
+            operations=sum(s.count for s in stats),
+            errors=sum(s.errors for s in stats),
+            elapsed=elapsed,
+            data_file_bytes=data_file_bytes,
+            peak_rss_bytes=peak_rss_bytes(),
+            stats=stats,
+        )
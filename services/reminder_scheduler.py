@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提醒调度
+按时间索引等待下一个提醒时间，到期时回调；任务变更时重新计算等待时间
+"""
+
+import asyncio
+import inspect
+from datetime import datetime
+from typing import Any, Callable, Optional
+from core.interfaces import Task
+from core.metrics import OperationMetrics
+from core.tracing import span
+
+
+class ReminderScheduler:
+    """提醒调度器
+    
+    repository 需提供 reminders_between / next_reminder_at（见 TaskStorageAdapter），
+    到期的未完成任务依次调用 callback(task)，callback 可以是协程函数。
+    
+    调度器只睡眠到下一个提醒时间，并订阅任务变更以便新设置的提醒能提前唤醒，
+    不轮询全部任务；存储不支持变更订阅时最多睡眠 max_sleep 秒后重新查询索引。
+    只触发调度器运行期间（since 之后）到期的提醒。
+    """
+    
+    def __init__(self, repository: Any, callback: Callable[[Task], Any], max_sleep: float = 3600.0):
+        self.repository = repository
+        self.callback = callback
+        self.max_sleep = max_sleep
+        self.metrics = OperationMetrics("reminders")
+        self._fired = self.metrics.counter("fired_total", "已触发的提醒数")
+        self._wake = asyncio.Event()
+        self.last_checked: Optional[datetime] = None
+    
+    async def _watch(self) -> None:
+        """任务变更时唤醒调度循环"""
+        try:
+            async for _ in self.repository.subscribe():
+                self._wake.set()
+        except NotImplementedError:
+            pass
+    
+    async def _fire(self, task: Task) -> None:
+        """触发一个提醒"""
+        try:
+            with span("reminders.fire", task=task.id):
+                result = self.callback(task)
+                if inspect.isawaitable(result):
+                    await result
+            self._fired.inc()
+        except Exception as e:
+            print(f"提醒回调失败: {e}")
+    
+    async def run(self, since: Optional[datetime] = None) -> None:
+        """运行调度循环，取消任务即停止"""
+        self.last_checked = since or datetime.now()
+        watcher = asyncio.ensure_future(self._watch())
+        try:
+            while True:
+                # 先清除唤醒标记再查询，查询之后的变更会让下面的等待立即返回
+                self._wake.clear()
+                now = datetime.now()
+                for task in self.repository.reminders_between(self.last_checked, now):
+                    if not task.completed:
+                        await self._fire(task)
+                self.last_checked = now
+                
+                next_at = self.repository.next_reminder_at(now)
+                delay = self.max_sleep
+                if next_at is not None:
+                    delay = min(delay, max(0.0, (next_at - now).total_seconds()))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watcher.cancel()
@@ -5,10 +5,18 @@ Todo服务实现
 实现Todo业务逻辑
 """
 
+import json
 import uuid
-from datetime import datetime
-from typing import List, Optional
-from core.interfaces import ITodoService, ITaskRepository, Task
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, TextIO, Tuple
+from core.interfaces import ITodoService, ITaskRepository, Task, TaskChange
+from core.metrics import OperationMetrics
+from core.tracing import traced
+
+
+def _toggle(task: Task) -> None:
+    """切换完成状态"""
+    task.completed = not task.completed
 
 
 class TodoService(ITodoService):
@@ -16,77 +24,286 @@ class TodoService(ITodoService):
     
     def __init__(self, task_repository: ITaskRepository):
         self.repository = task_repository
+        self.metrics = OperationMetrics("todo_service")
+        self._failures = self.metrics.counter("failures_total", "业务操作失败次数")
     
-    def create_task(self, text: str) -> Optional[Task]:
-        """创建任务"""
-        if not text or not text.strip():
-            return None
-        
-        task = Task(
+    def _new_task(self, text: str) -> Task:
+        """生成新任务对象"""
+        return Task(
             id=f"task-{uuid.uuid4().hex[:8]}",
             text=text.strip(),
             completed=False,
             created_at=datetime.now()
         )
+    
+    @traced("todo.create_task")
+    def create_task(self, text: str) -> Optional[Task]:
+        """创建任务"""
+        if not text or not text.strip():
+            return None
+        
+        task = self._new_task(text)
         
         try:
-            self.repository.save_task(task)
+            with self.metrics.track("create_task"):
+                self.repository.save_task(task)
             return task
         except Exception as e:
+            self._failures.inc()
             print(f"创建任务失败: {e}")
             return None
     
+    @traced("todo.toggle_task")
     def toggle_task(self, task_id: str) -> Optional[Task]:
         """切换任务状态"""
-        task = self.repository.get_task(task_id)
-        if not task:
-            return None
-        
-        task.completed = not task.completed
-        task.updated_at = datetime.now()
-        
         try:
-            success = self.repository.update_task(task)
-            return task if success else None
+            with self.metrics.track("toggle_task"):
+                return self.repository.update_task_with(task_id, _toggle)
         except Exception as e:
+            self._failures.inc()
             print(f"切换任务状态失败: {e}")
             return None
     
+    @traced("todo.delete_task")
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
         try:
-            return self.repository.delete_task(task_id)
+            with self.metrics.track("delete_task"):
+                return self.repository.delete_task(task_id)
         except Exception as e:
+            self._failures.inc()
             print(f"删除任务失败: {e}")
             return False
     
+    @traced("todo.get_all_tasks")
     def get_all_tasks(self) -> List[Task]:
         """获取所有任务"""
         try:
-            return self.repository.get_all_tasks()
+            with self.metrics.track("get_all_tasks"):
+                return self.repository.get_all_tasks()
         except Exception as e:
+            self._failures.inc()
             print(f"获取任务列表失败: {e}")
             return []
     
+    @traced("todo.update_task_text")
     def update_task_text(self, task_id: str, text: str) -> Optional[Task]:
         """更新任务文本"""
         if not text or not text.strip():
             return None
         
-        task = self.repository.get_task(task_id)
-        if not task:
+        def apply(task: Task) -> None:
+            task.text = text.strip()
+        
+        try:
+            with self.metrics.track("update_task_text"):
+                return self.repository.update_task_with(task_id, apply)
+        except Exception as e:
+            self._failures.inc()
+            print(f"更新任务文本失败: {e}")
             return None
+    
+    @traced("todo.create_tasks")
+    def create_tasks(self, texts: Iterable[str]) -> List[Task]:
+        """批量创建任务（一次持久化），空文本跳过"""
+        created = []
+        try:
+            with self.metrics.track("create_tasks"), self.repository.batch():
+                for text in texts:
+                    if not text or not text.strip():
+                        continue
+                    task = self._new_task(text)
+                    self.repository.save_task(task)
+                    created.append(task)
+        except Exception as e:
+            self._failures.inc()
+            print(f"批量创建任务失败: {e}")
+        return created
+    
+    @traced("todo.toggle_tasks")
+    def toggle_tasks(self, task_ids: Iterable[str]) -> List[Task]:
+        """批量切换任务状态（一次持久化），不存在的任务跳过"""
+        toggled = []
+        try:
+            with self.metrics.track("toggle_tasks"), self.repository.batch():
+                for task_id in task_ids:
+                    task = self.repository.update_task_with(task_id, _toggle)
+                    if task:
+                        toggled.append(task)
+        except Exception as e:
+            self._failures.inc()
+            print(f"批量切换任务状态失败: {e}")
+        return toggled
+    
+    @traced("todo.delete_tasks")
+    def delete_tasks(self, task_ids: Iterable[str]) -> List[str]:
+        """批量删除任务（一次持久化），返回实际删除的任务ID"""
+        deleted = []
+        try:
+            with self.metrics.track("delete_tasks"), self.repository.batch():
+                for task_id in task_ids:
+                    if self.repository.delete_task(task_id):
+                        deleted.append(task_id)
+        except Exception as e:
+            self._failures.inc()
+            print(f"批量删除任务失败: {e}")
+        return deleted
+    
+    @traced("todo.delete_completed")
+    def delete_completed(self) -> int:
+        """删除所有已完成任务（一次持久化），返回删除数量"""
+        deleted = 0
+        try:
+            with self.metrics.track("delete_completed"), self.repository.batch():
+                for task in self.repository.get_all_tasks():
+                    if task.completed and self.repository.delete_task(task.id):
+                        deleted += 1
+        except Exception as e:
+            self._failures.inc()
+            print(f"删除已完成任务失败: {e}")
+        return deleted
+    
+    @traced("todo.export_tasks")
+    def export_tasks(self, stream: TextIO) -> int:
+        """以JSON Lines格式逐行导出任务，返回导出数量"""
+        count = 0
+        for task in self.get_all_tasks():
+            record = {
+                "id": task.id,
+                "text": task.text,
+                "completed": task.completed,
+                "created_at": task.created_at.isoformat(),
+                "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+                "due_at": task.due_at.isoformat() if task.due_at else None,
+                "remind_at": task.remind_at.isoformat() if task.remind_at else None,
+            }
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+    
+    @traced("todo.import_tasks")
+    def import_tasks(self, lines: Iterable[str]) -> int:
+        """逐行导入JSON Lines任务（一次持久化），同ID任务被覆盖，返回导入数量
         
-        task.text = text.strip()
-        task.updated_at = datetime.now()
+        缺少 id / created_at 的记录自动补全，无法解析的行打印后跳过。
+        """
+        imported = 0
+        try:
+            with self.metrics.track("import_tasks"), self.repository.batch():
+                for line_no, line in enumerate(lines, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        if not str(record.get("text", "")).strip():
+                            raise ValueError("任务文本为空")
+                        task = self._new_task(str(record["text"]))
+                        task.id = record.get("id") or task.id
+                        task.completed = bool(record.get("completed", False))
+                        if record.get("created_at"):
+                            task.created_at = datetime.fromisoformat(record["created_at"])
+                        if record.get("updated_at"):
+                            task.updated_at = datetime.fromisoformat(record["updated_at"])
+                        if record.get("due_at"):
+                            task.due_at = datetime.fromisoformat(record["due_at"])
+                        if record.get("remind_at"):
+                            task.remind_at = datetime.fromisoformat(record["remind_at"])
+                    except (ValueError, TypeError, AttributeError) as e:
+                        print(f"跳过第{line_no}行: {e}")
+                        continue
+                    self.repository.save_task(task)
+                    imported += 1
+        except Exception as e:
+            self._failures.inc()
+            print(f"导入任务失败: {e}")
+        return imported
+    
+    def get_task(self, task_id: str) -> Optional[Task]:
+        """获取单个任务"""
+        try:
+            return self.repository.get_task(task_id)
+        except Exception as e:
+            print(f"获取任务失败: {e}")
+            return None
+    
+    def list_tasks(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Task], int]:
+        """分页获取任务，返回(当前页任务, 任务总数)"""
+        all_tasks = self.get_all_tasks()
+        offset = max(0, offset)
+        end = None if limit is None else offset + max(0, limit)
+        return all_tasks[offset:end], len(all_tasks)
+    
+    def get_version(self) -> Optional[int]:
+        """获取存储版本号，存储不支持时返回None"""
+        return getattr(self.repository, "version", None)
+    
+    def get_store_id(self) -> Optional[str]:
+        """获取存储ID，存储不支持时返回None"""
+        return getattr(self.repository, "store_id", None)
+    
+    @traced("todo.search_tasks")
+    def search_tasks(self, query: str, limit: int = 20) -> List[Task]:
+        """按文本检索任务，结果按相关度排序"""
+        if not query or not query.strip():
+            return []
+        try:
+            with self.metrics.track("search_tasks"):
+                if hasattr(self.repository, "search_tasks"):
+                    return self.repository.search_tasks(query, limit)
+                # 仓库不支持索引时退化为子串匹配
+                needle = query.strip().lower()
+                return [t for t in self.get_all_tasks() if needle in t.text.lower()][:limit]
+        except Exception as e:
+            self._failures.inc()
+            print(f"检索任务失败: {e}")
+            return []
+    
+    @traced("todo.set_due")
+    def set_due(self, task_id: str, due_at: Optional[datetime],
+                remind_at: Optional[datetime] = None) -> Optional[Task]:
+        """设置任务的截止时间和提醒时间，None 表示取消"""
+        def apply(task: Task) -> None:
+            task.due_at = due_at
+            task.remind_at = remind_at
         
         try:
-            success = self.repository.update_task(task)
-            return task if success else None
+            with self.metrics.track("set_due"):
+                return self.repository.update_task_with(task_id, apply)
         except Exception as e:
-            print(f"更新任务文本失败: {e}")
+            self._failures.inc()
+            print(f"设置截止时间失败: {e}")
             return None
     
+    @traced("todo.get_due_tasks")
+    def get_due_tasks(self, window: timedelta, now: Optional[datetime] = None) -> List[Task]:
+        """未来 window 内到期的未完成任务，按截止时间排序"""
+        now = now or datetime.now()
+        end = now + window
+        try:
+            with self.metrics.track("get_due_tasks"):
+                if hasattr(self.repository, "tasks_due_between"):
+                    tasks = self.repository.tasks_due_between(now, end)
+                else:
+                    # 仓库不支持时间索引时退化为全量扫描
+                    tasks = sorted((t for t in self.get_all_tasks()
+                                    if t.due_at and now <= t.due_at <= end),
+                                   key=lambda t: t.due_at)
+                return [t for t in tasks if not t.completed]
+        except Exception as e:
+            self._failures.inc()
+            print(f"获取到期任务失败: {e}")
+            return []
+    
+    def changes_since(self, seq: int) -> Optional[List[TaskChange]]:
+        """获取序列号之后的任务变更，返回None时需全量同步"""
+        if not hasattr(self.repository, "changes_since"):
+            return None
+        return self.repository.changes_since(seq)
+    
+    def subscribe(self, since: Optional[int] = None):
+        """订阅任务变更（异步迭代器）"""
+        return self.repository.subscribe(since)
+    
     def get_completed_tasks(self) -> List[Task]:
         """获取已完成任务"""
         all_tasks = self.get_all_tasks()
@@ -97,6 +314,7 @@ class TodoService(ITodoService):
         all_tasks = self.get_all_tasks()
         return [task for task in all_tasks if not task.completed]
     
+    @traced("todo.get_task_stats")
     def get_task_stats(self) -> dict:
         """获取任务统计"""
         all_tasks = self.get_all_tasks()
@@ -7,15 +7,19 @@
 
 import asyncio
 import random
+import zlib
 from datetime import datetime
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
+from core.forecast import METRICS, WeatherForecast, require_numpy
 from core.interfaces import IWeatherService, WeatherData
+from core.metrics import OperationMetrics
 
 
 class MockWeatherService(IWeatherService):
-    """模拟天气服务"""
+    """模拟天气服务（latency 为模拟的请求延迟秒数，定位和预报按比例缩短）"""
     
-    def __init__(self):
+    def __init__(self, latency: float = 1.0):
+        self.latency = latency
         self.cities = [
             {"name": "北京", "temp": 22, "desc": "晴朗", "icon": "☀️", "humidity": 45, "wind": 12, "pressure": 1013},
             {"name": "上海", "temp": 26, "desc": "多云", "icon": "⛅", "humidity": 68, "wind": 8, "pressure": 1015},
@@ -24,45 +28,90 @@ class MockWeatherService(IWeatherService):
             {"name": "杭州", "temp": 24, "desc": "晴朗", "icon": "☀️", "humidity": 55, "wind": 6, "pressure": 1016},
             {"name": "成都", "temp": 20, "desc": "雾", "icon": "🌫️", "humidity": 85, "wind": 4, "pressure": 1010}
         ]
+        self.metrics = OperationMetrics("weather", service="mock")
     
     async def get_location(self) -> Tuple[float, float]:
         """模拟获取位置"""
-        # 模拟网络延迟
-        await asyncio.sleep(0.5)
-        
-        # 返回随机位置（中国范围内）
-        lat = random.uniform(18.0, 53.0)  # 中国纬度范围
-        lon = random.uniform(73.0, 135.0)  # 中国经度范围
-        
-        return lat, lon
+        with self.metrics.track("get_location"):
+            # 模拟网络延迟
+            await asyncio.sleep(self.latency * 0.5)
+            
+            # 返回随机位置（中国范围内）
+            lat = random.uniform(18.0, 53.0)  # 中国纬度范围
+            lon = random.uniform(73.0, 135.0)  # 中国经度范围
+            
+            return lat, lon
     
     async def get_current_weather(self, lat: float = None, lon: float = None) -> WeatherData:
         """获取当前天气"""
-        # 模拟网络延迟
-        await asyncio.sleep(1.0)
-        
-        # 如果没有提供坐标，先获取位置
-        if lat is None or lon is None:
-            lat, lon = await self.get_location()
-        
-        # 根据位置选择城市（简化处理）
-        city_data = random.choice(self.cities)
-        
-        # 添加一些随机变化
-        temp_variation = random.uniform(-3, 3)
-        humidity_variation = random.randint(-10, 10)
-        wind_variation = random.uniform(-2, 2)
+        with self.metrics.track("get_current_weather"):
+            # 模拟网络延迟
+            await asyncio.sleep(self.latency)
+            
+            # 如果没有提供坐标，先获取位置
+            if lat is None or lon is None:
+                lat, lon = await self.get_location()
+            
+            # 根据位置选择城市（简化处理）
+            city_data = random.choice(self.cities)
+            
+            # 添加一些随机变化
+            temp_variation = random.uniform(-3, 3)
+            humidity_variation = random.randint(-10, 10)
+            wind_variation = random.uniform(-2, 2)
+            
+            return WeatherData(
+                location=city_data["name"],
+                temperature=round(city_data["temp"] + temp_variation, 1),
+                description=city_data["desc"],
+                icon=city_data["icon"],
+                humidity=max(0, min(100, city_data["humidity"] + humidity_variation)),
+                wind_speed=max(0, round(city_data["wind"] + wind_variation, 1)),
+                pressure=city_data["pressure"],
+                timestamp=datetime.now()
+            )
+    
+    def _city_base(self, name: str) -> list:
+        """地点的基准指标，未知地点按名称哈希生成"""
+        for city in self.cities:
+            if city["name"] == name:
+                return [city["temp"], city["humidity"], city["wind"], city["pressure"]]
+        h = zlib.crc32(name.encode("utf-8"))
+        return [10 + h % 20, 40 + (h >> 5) % 50, 3 + (h >> 11) % 15, 1005 + (h >> 17) % 15]
+    
+    async def get_forecast(self, locations: List[str], hours: int = 48,
+                           start: Optional[datetime] = None) -> WeatherForecast:
+        """生成确定性的逐小时模拟预报
         
-        return WeatherData(
-            location=city_data["name"],
-            temperature=round(city_data["temp"] + temp_variation, 1),
-            description=city_data["desc"],
-            icon=city_data["icon"],
-            humidity=max(0, min(100, city_data["humidity"] + humidity_variation)),
-            wind_speed=max(0, round(city_data["wind"] + wind_variation, 1)),
-            pressure=city_data["pressure"],
-            timestamp=datetime.now()
-        )
+        同一地点同一小时的取值只取决于地点和绝对小时数，重叠的查询结果一致。
+        所有地点和小时一次向量化生成。
+        """
+        np = require_numpy()
+        with self.metrics.track("get_forecast"):
+            # 模拟网络延迟
+            await asyncio.sleep(self.latency * 0.2)
+            
+            start = (start or datetime.now()).replace(minute=0, second=0, microsecond=0)
+            epoch_hour = int(start.timestamp() // 3600)
+            hour = np.arange(epoch_hour, epoch_hour + hours, dtype=np.float64)[None, :]
+            local_hour = (start.hour + np.arange(hours))[None, :] % 24
+            seeds = np.array([zlib.crc32(name.encode("utf-8")) % 1000 for name in locations],
+                             dtype=np.float64)[:, None]
+            base = np.array([self._city_base(name) for name in locations], dtype=np.float64)
+            
+            def noise(salt: float):
+                """[-1, 1) 的确定性伪随机数"""
+                x = np.sin(hour * 12.9898 + seeds * 78.233 + salt) * 43758.5453
+                return (x - np.floor(x)) * 2 - 1
+            
+            # 气温在14点前后最高，湿度与之相反
+            diurnal = np.sin((local_hour - 8) * (2 * np.pi / 24))
+            values = np.empty((len(locations), hours, len(METRICS)), dtype=np.float32)
+            values[:, :, 0] = base[:, 0:1] + 5 * diurnal + 1.5 * noise(1.0)
+            values[:, :, 1] = np.clip(base[:, 1:2] - 12 * diurnal + 5 * noise(2.0), 0, 100)
+            values[:, :, 2] = np.maximum(0, base[:, 2:3] + 3 * noise(3.0))
+            values[:, :, 3] = base[:, 3:4] + 4 * np.sin(hour * (2 * np.pi / 96) + seeds) + noise(4.0)
+            return WeatherForecast(list(locations), start, values)
 
 
 class RealWeatherService(IWeatherService):
@@ -71,6 +120,7 @@ class RealWeatherService(IWeatherService):
     def __init__(self, api_key: str, base_url: str = "https://api.openweathermap.org/data/2.5"):
         self.api_key = api_key
         self.base_url = base_url
+        self.metrics = OperationMetrics("weather", service="openweathermap")
     
     async def get_location(self) -> Tuple[float, float]:
         """获取当前位置（需要实现地理定位API）"""
@@ -94,13 +144,14 @@ class RealWeatherService(IWeatherService):
             "lang": "zh_cn"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return self._parse_weather_data(data)
-                else:
-                    raise Exception(f"天气API请求失败: {response.status}")
+        with self.metrics.track("get_current_weather"):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        return self._parse_weather_data(data)
+                    else:
+                        raise Exception(f"天气API请求失败: {response.status}")
     
     def _parse_weather_data(self, data: dict) -> WeatherData:
         """解析天气API响应"""
@@ -41,6 +41,9 @@ setup(
         "weather": [
             "aiohttp>=3.8.0",
         ],
+        "forecast": [
+            "numpy>=1.20.0",
+        ],
     },
     entry_points={
         "console_scripts": [
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量备份
+备份目录中保存全量快照和按序列号衔接的增量变更，清单记录每个备份点，支持恢复到指定序列号
+"""
+
+import json
+import os
+import pickle
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.change_feed import OP_CLEAR, OP_DELETE
+from core.interfaces import IStorageEngine
+from core.tracing import span
+
+
+class BackupSet:
+    """备份目录
+    
+    manifest.json 按时间顺序记录备份点：
+    - full：全量快照（与 SBTStorageEngine 的数据文件格式相同），seq 为快照序列号
+    - incremental：from_seq 之后到 seq 为止的变更 (序列号, 操作, 键, 值)，from_seq 等于上一个备份点
+    
+    引擎的变更流保留了上一个备份点之后的全部历史时做增量备份，否则（首次备份、引擎重启、
+    从备份恢复后或变更历史被截断）做全量备份；连续 max_chain 次增量后也做一次全量备份，
+    限制恢复时需要重放的文件数。每个备份点记录引擎的存储ID，存储ID与上一个备份点不同
+    （数据文件被删除后重建、备份目录换了存储）或序列号比上一个备份点小时，变更流与
+    备份链不属于同一段历史，同样做全量备份。
+    
+    变更流超出上限时会按键去重，被合并的中间状态无法恢复：
+    增量备份记录 exact_until，只能恢复到它之前的任意序列号或该增量的备份点。
+    
+    备份点按序列号定位，不支持序列号（last_sequence() 为 None）的引擎不能备份。
+    """
+    
+    MANIFEST = "manifest.json"
+    
+    def __init__(self, directory: str, max_chain: int = 24):
+        self.directory = directory
+        self.max_chain = max_chain
+        self.manifest_path = os.path.join(directory, self.MANIFEST)
+    
+    def entries(self) -> List[Dict[str, Any]]:
+        """全部备份点（按时间顺序）"""
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)["backups"]
+    
+    def _write_manifest(self, entries: List[Dict[str, Any]]) -> None:
+        """原子地写入清单"""
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"format": 1, "backups": entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+    
+    def _chain_length(self, entries: List[Dict[str, Any]]) -> int:
+        """最后一个全量备份之后的增量备份数"""
+        count = 0
+        for entry in reversed(entries):
+            if entry["kind"] == "full":
+                break
+            count += 1
+        return count
+    
+    def backup(self, storage: IStorageEngine, full: bool = False) -> Dict[str, Any]:
+        """备份，返回新的备份点（没有新的写入时返回上一个备份点）"""
+        if storage.last_sequence() is None:
+            raise ValueError("该存储引擎不支持序列号，无法备份")
+        os.makedirs(self.directory, exist_ok=True)
+        entries = self.entries()
+        start = time.perf_counter()
+        with span("backup.create") as s:
+            # 批次持有引擎写锁，快照/变更与序列号一致
+            with storage.batch():
+                seq = storage.last_sequence()
+                store_id = storage.store_id()
+                changes = None
+                if (entries and not full and self._chain_length(entries) < self.max_chain
+                        and entries[-1].get("store_id") == store_id and seq >= entries[-1]["seq"]):
+                    changes = storage.changes_since(entries[-1]["seq"])
+                if changes is None:
+                    payload = {"format": 2, "seq": seq, "items": storage.get_all()}
+                elif not changes:
+                    # 上次备份之后没有写入
+                    return entries[-1]
+                else:
+                    payload = [(c.seq, c.op, c.key, c.value) for c in changes]
+            
+            if changes is None:
+                entry = {"kind": "full", "file": f"full-{seq:012d}.bak", "seq": seq,
+                         "count": len(payload["items"])}
+            else:
+                base = entries[-1]["seq"]
+                exact_until = base
+                for change in payload:
+                    if change[0] != exact_until + 1:
+                        break
+                    exact_until += 1
+                entry = {"kind": "incremental", "file": f"incr-{base:012d}-{seq:012d}.bak",
+                         "from_seq": base, "seq": seq, "exact_until": exact_until,
+                         "count": len(payload)}
+            
+            with open(os.path.join(self.directory, entry["file"]), 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                entry["bytes"] = f.tell()
+            entry["store_id"] = store_id
+            entry["created_at"] = datetime.now().isoformat()
+            entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            s.set("kind", entry["kind"])
+            s.set("bytes", entry["bytes"])
+            
+            entries.append(entry)
+            self._write_manifest(entries)
+        return entry
+    
+    def _load(self, entry: Dict[str, Any]) -> Any:
+        """读取备份文件"""
+        with open(os.path.join(self.directory, entry["file"]), 'rb') as f:
+            return pickle.load(f)
+    
+    def _plan(self, seq: Optional[int]) -> List[Dict[str, Any]]:
+        """选择恢复到 seq 需要的备份点：最近的全量备份及其后衔接的增量备份"""
+        entries = self.entries()
+        if not entries:
+            raise ValueError("没有可用的备份")
+        if seq is None:
+            seq = entries[-1]["seq"]
+        
+        # 从最后一个备份点往前找到覆盖 seq 的链
+        for i in range(len(entries) - 1, -1, -1):
+            if entries[i]["kind"] != "full" or entries[i]["seq"] > seq:
+                continue
+            plan = [entries[i]]
+            for entry in entries[i + 1:]:
+                if entry["kind"] == "full":
+                    break
+                if entry["from_seq"] != plan[-1]["seq"] or entry["from_seq"] >= seq:
+                    break
+                if seq < entry["seq"] and seq > entry["exact_until"]:
+                    raise ValueError(f"序列号 {seq} 处的变更已被合并，可恢复到 "
+                                     f"{entry['exact_until']} 或 {entry['seq']}")
+                plan.append(entry)
+            if seq <= plan[-1]["seq"]:
+                return plan
+            raise ValueError(f"序列号 {seq} 超出备份范围（最新 {plan[-1]['seq']}）")
+        raise ValueError(f"序列号 {seq} 之前没有全量备份")
+    
+    def materialize(self, seq: Optional[int] = None) -> Tuple[List[Tuple[str, Any]], int]:
+        """重建备份中序列号 seq（默认最新）时的数据，返回(有序键值对, 序列号)"""
+        plan = self._plan(seq)
+        snapshot = self._load(plan[0])
+        data = dict(snapshot["items"])
+        target = plan[-1]["seq"] if seq is None else seq
+        for entry in plan[1:]:
+            for change_seq, op, key, value in self._load(entry):
+                if change_seq > target:
+                    break
+                if op == OP_CLEAR:
+                    data.clear()
+                elif op == OP_DELETE:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+        return sorted(data.items()), target
+    
+    def restore(self, storage: IStorageEngine, seq: Optional[int] = None) -> int:
+        """将存储恢复到备份中序列号 seq（默认最新）时的数据，返回恢复到的序列号"""
+        with span("backup.restore"):
+            items, target = self.materialize(seq)
+            storage.replace_all(items)
+        return target
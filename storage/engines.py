@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可选存储引擎
+与SBT接口相同的内存有序索引（数组存储的SBT、有序数组、跳表、哈希+惰性有序键），
+复用 SBTStorageEngine 的持久化、变更流和批量写入；以及LSM分层引擎（见 storage/lsm_engine.py），
+均可通过名称选择
+"""
+
+import bisect
+import random
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from sbt_storage_engine import ArenaSBTTree, SBTTree, _is_strictly_sorted
+from storage.sbt_engine import SBTEngineAdapter
+from storage.lsm_engine import LSMEngineAdapter
+
+
+class OrderedIndex:
+    """有序索引基类
+    
+    每个键对应一个条目 [值, 版本号]，子类只需实现条目的查找、添加、删除和有序遍历；
+    版本号语义与 SBTTree 相同：0 表示加载后未修改，取 base_version。
+    """
+    
+    def __init__(self):
+        self.rotations = 0  # 与SBTTree接口保持一致，这里始终为0
+        self.base_version = 0
+    
+    def _get(self, key: str) -> Optional[list]:
+        """查找条目"""
+        raise NotImplementedError
+    
+    def _add(self, key: str, entry: list) -> None:
+        """添加条目（键一定不存在）"""
+        raise NotImplementedError
+    
+    def _remove(self, key: str) -> bool:
+        """删除条目"""
+        raise NotImplementedError
+    
+    def _items(self) -> Iterator[Tuple[str, list]]:
+        """按键有序遍历条目"""
+        raise NotImplementedError
+    
+    def size(self) -> int:
+        """数据量"""
+        raise NotImplementedError
+    
+    def build_from_sorted(self, items: List[Tuple[str, Any]]) -> None:
+        """由按键严格递增的键值对构建，替换现有内容"""
+        self.__init__()
+        for key, value in items:
+            self._add(key, [value, 0])
+    
+    def load(self, items: List[Tuple[str, Any]]) -> None:
+        """批量载入键值对"""
+        if self.size() == 0 and _is_strictly_sorted(items):
+            self.build_from_sorted(items)
+            return
+        for key, value in items:
+            self.insert(key, value)
+    
+    def insert(self, key: str, value: Any, version: int = 0) -> None:
+        """插入键值对"""
+        self.upsert(key, value, version)
+    
+    def upsert(self, key: str, value: Any, version: int = 0) -> bool:
+        """插入或覆盖，返回是否新建了键"""
+        entry = self._get(key)
+        if entry is not None:
+            entry[0] = value
+            entry[1] = version
+            return False
+        self._add(key, [value, version])
+        return True
+    
+    def insert_if_absent(self, key: str, value: Any, version: int = 0) -> bool:
+        """键不存在时插入"""
+        if self._get(key) is not None:
+            return False
+        self._add(key, [value, version])
+        return True
+    
+    def delete(self, key: str) -> bool:
+        """删除键值对"""
+        return self._remove(key)
+    
+    def search(self, key: str) -> Optional[Any]:
+        """查询"""
+        entry = self._get(key)
+        return entry[0] if entry is not None else None
+    
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查询值及版本号"""
+        entry = self._get(key)
+        return (entry[0], entry[1] or self.base_version) if entry is not None else None
+    
+    def update(self, key: str, value: Any, version: int = 0) -> bool:
+        """更新已存在的键"""
+        entry = self._get(key)
+        if entry is None:
+            return False
+        entry[0] = value
+        entry[1] = version
+        return True
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any], version: int = 0) -> Optional[Any]:
+        """以 fn(旧值) 的结果更新，返回新值；键不存在或 fn 返回None时不修改"""
+        entry = self._get(key)
+        if entry is None:
+            return None
+        value = fn(entry[0])
+        if value is not None:
+            entry[0] = value
+            entry[1] = version
+        return value
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any, version: int = 0) -> bool:
+        """版本号匹配时写入；expected_version 为0表示要求键不存在"""
+        if expected_version == 0:
+            return self.insert_if_absent(key, value, version)
+        entry = self._get(key)
+        if entry is None or (entry[1] or self.base_version) != expected_version:
+            return False
+        entry[0] = value
+        entry[1] = version
+        return True
+    
+    def get_all(self) -> List[Tuple[str, Any]]:
+        """按键有序获取全部键值对"""
+        return [(key, entry[0]) for key, entry in self._items()]
+
+
+class SortedArrayIndex(OrderedIndex):
+    """有序数组：键和条目分别存放在两个列表中，bisect 二分查找"""
+    
+    def __init__(self):
+        super().__init__()
+        self._keys: List[str] = []
+        self._entries: List[list] = []
+    
+    def _get(self, key: str) -> Optional[list]:
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._entries[i]
+        return None
+    
+    def _add(self, key: str, entry: list) -> None:
+        i = bisect.bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._entries.insert(i, entry)
+    
+    def _remove(self, key: str) -> bool:
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+            del self._entries[i]
+            return True
+        return False
+    
+    def _items(self) -> Iterator[Tuple[str, list]]:
+        return zip(self._keys, self._entries)
+    
+    def size(self) -> int:
+        return len(self._keys)
+    
+    def build_from_sorted(self, items: List[Tuple[str, Any]]) -> None:
+        self.__init__()
+        self._keys = [key for key, _ in items]
+        self._entries = [[value, 0] for _, value in items]
+
+
+class _SkipNode:
+    """跳表节点"""
+    
+    __slots__ = ("key", "entry", "forward")
+    
+    def __init__(self, key: Optional[str], entry: Optional[list], level: int):
+        self.key = key
+        self.entry = entry
+        self.forward: List[Optional['_SkipNode']] = [None] * level
+
+
+class SkipListIndex(OrderedIndex):
+    """跳表：期望 O(log n) 的查找和插入，插入删除不需要移动元素"""
+    
+    MAX_LEVEL = 32
+    P = 0.25
+    
+    def __init__(self):
+        super().__init__()
+        self._head = _SkipNode(None, None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random()
+    
+    def _random_level(self) -> int:
+        """随机层数"""
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < self.P:
+            level += 1
+        return level
+    
+    def _get(self, key: str) -> Optional[list]:
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            nxt = node.forward[i]
+            while nxt is not None and nxt.key < key:
+                node = nxt
+                nxt = node.forward[i]
+        node = node.forward[0]
+        if node is not None and node.key == key:
+            return node.entry
+        return None
+    
+    def _add(self, key: str, entry: list) -> None:
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            nxt = node.forward[i]
+            while nxt is not None and nxt.key < key:
+                node = nxt
+                nxt = node.forward[i]
+            update[i] = node
+        
+        level = self._random_level()
+        if level > self._level:
+            self._level = level
+        new = _SkipNode(key, entry, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+        self._size += 1
+    
+    def _remove(self, key: str) -> bool:
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            nxt = node.forward[i]
+            while nxt is not None and nxt.key < key:
+                node = nxt
+                nxt = node.forward[i]
+            update[i] = node
+        
+        target = node.forward[0]
+        if target is None or target.key != key:
+            return False
+        for i in range(len(target.forward)):
+            update[i].forward[i] = target.forward[i]
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+    
+    def _items(self) -> Iterator[Tuple[str, list]]:
+        node = self._head.forward[0]
+        while node is not None:
+            yield node.key, node.entry
+            node = node.forward[0]
+    
+    def size(self) -> int:
+        return self._size
+    
+    def build_from_sorted(self, items: List[Tuple[str, Any]]) -> None:
+        """有序输入逐个追加到各层尾部，线性构建"""
+        self.__init__()
+        tails = [self._head] * self.MAX_LEVEL
+        for key, value in items:
+            level = self._random_level()
+            node = _SkipNode(key, [value, 0], level)
+            for i in range(level):
+                tails[i].forward[i] = node
+                tails[i] = node
+            self._level = max(self._level, level)
+        self._size = len(items)
+
+
+class HashIndex(OrderedIndex):
+    """哈希+惰性有序键：点查询为字典查找，有序遍历时才合并新增的键"""
+    
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[str, list] = {}
+        self._sorted_keys: List[str] = []
+        self._added: set = set()  # 尚未并入 _sorted_keys 的键
+        self._stale = False  # _sorted_keys 中是否含已删除的键
+    
+    def _get(self, key: str) -> Optional[list]:
+        return self._entries.get(key)
+    
+    def _add(self, key: str, entry: list) -> None:
+        self._entries[key] = entry
+        self._added.add(key)
+    
+    def _remove(self, key: str) -> bool:
+        if self._entries.pop(key, None) is None:
+            return False
+        if key in self._added:
+            self._added.discard(key)
+        else:
+            self._stale = True
+        return True
+    
+    def _ordered_keys(self) -> List[str]:
+        """合并待排序的键：已有部分有序，Timsort 按两段有序数据线性合并"""
+        if self._added or self._stale:
+            keys = self._sorted_keys
+            if self._stale:
+                entries, added = self._entries, self._added
+                keys = [k for k in keys if k in entries and k not in added]
+            if self._added:
+                keys = sorted(keys + sorted(self._added))
+            self._sorted_keys = keys
+            self._added = set()
+            self._stale = False
+        return self._sorted_keys
+    
+    def _items(self) -> Iterator[Tuple[str, list]]:
+        entries = self._entries
+        return ((key, entries[key]) for key in self._ordered_keys())
+    
+    def size(self) -> int:
+        return len(self._entries)
+    
+    def build_from_sorted(self, items: List[Tuple[str, Any]]) -> None:
+        self.__init__()
+        self._entries = {key: [value, 0] for key, value in items}
+        self._sorted_keys = [key for key, _ in items]
+
+
+class ArenaSBTEngineAdapter(SBTEngineAdapter):
+    """数组存储的SBT引擎（内存占用更小）"""
+    engine_name = "sbt_arena"
+    tree_factory = ArenaSBTTree
+
+
+class SortedArrayEngineAdapter(SBTEngineAdapter):
+    """有序数组存储引擎"""
+    engine_name = "sorted_array"
+    tree_factory = SortedArrayIndex
+
+
+class SkipListEngineAdapter(SBTEngineAdapter):
+    """跳表存储引擎"""
+    engine_name = "skiplist"
+    tree_factory = SkipListIndex
+
+
+class HashEngineAdapter(SBTEngineAdapter):
+    """哈希+有序键存储引擎"""
+    engine_name = "hash"
+    tree_factory = HashIndex
+
+
+ENGINES = {
+    "sbt": SBTEngineAdapter,
+    "sbt_arena": ArenaSBTEngineAdapter,
+    "sorted_array": SortedArrayEngineAdapter,
+    "skiplist": SkipListEngineAdapter,
+    "hash": HashEngineAdapter,
+    "lsm": LSMEngineAdapter,
+}
+
+INDEXES = {
+    "sbt": SBTTree,
+    "sbt_arena": ArenaSBTTree,
+    "sorted_array": SortedArrayIndex,
+    "skiplist": SkipListIndex,
+    "hash": HashIndex,
+}
+
+
+def create_storage_engine(name: str, data_file: str, lazy: bool = False,
+                          compression: Optional[str] = None, replication_log: bool = False,
+                          follower: bool = False, memory_budget: Optional[int] = None,
+                          budget_policy: str = "warn") -> SBTEngineAdapter:
+    """按名称创建存储引擎（follower=True 时为只读副本）"""
+    if name not in ENGINES:
+        raise ValueError(f"未知的存储引擎: {name}（可选: {', '.join(ENGINES)}）")
+    return ENGINES[name](data_file, lazy=lazy, compression=compression,
+                         replication_log=replication_log, follower=follower,
+                         memory_budget=memory_budget, budget_policy=budget_policy)
@@ -0,0 +1,730 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LSM分层存储引擎
+写入先追加到预写日志并进入内存SBT（memtable），memtable 达到阈值后写成不可变的有序文件（run）；
+读取依次查 memtable 和各 run（布隆过滤器跳过不含该键的 run），后台线程合并 run
+"""
+
+import bisect
+import hashlib
+import heapq
+import os
+import pickle
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sbt_storage_engine import SBTTree
+from core.change_feed import ChangeFeed, OP_PUT, OP_DELETE, OP_CLEAR
+from core.memory import deep_sizeof, tree_memory
+from core.metrics import metrics
+from core.snapshot_codec import CODECS, decode_snapshot, is_compressed, parse_compression
+from core.tracing import span
+from storage.sbt_engine import SBTEngineAdapter
+
+
+# 删除标记：遮蔽更早的 run 中同一个键，完全合并时丢弃
+TOMBSTONE = object()
+
+
+class BloomFilter:
+    """布隆过滤器：每键约10位、7个哈希时误判率约1%"""
+    
+    def __init__(self, capacity: int, bits_per_key: int = 10):
+        self.num_bits = max(64, capacity * bits_per_key)
+        self.num_hashes = max(1, round(bits_per_key * 0.69))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+    
+    def to_state(self) -> tuple:
+        """序列化为基本类型"""
+        return self.num_bits, self.num_hashes, bytes(self.bits)
+    
+    @classmethod
+    def from_state(cls, state: tuple) -> 'BloomFilter':
+        """由 to_state() 的结果还原"""
+        bloom = cls.__new__(cls)
+        bloom.num_bits, bloom.num_hashes, bits = state
+        bloom.bits = bytearray(bits)
+        return bloom
+    
+    def _positions(self, key: str) -> Iterator[int]:
+        """双重哈希生成各位置"""
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        m = self.num_bits
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % m
+    
+    def add(self, key: str) -> None:
+        """加入键"""
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def might_contain(self, key: str) -> bool:
+        """可能包含该键；返回False时一定不包含"""
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SortedRun:
+    """不可变的有序文件
+    
+    文件由若干数据块和末尾的索引组成：每块为 (键列表, 值列表, 版本号列表, 删除标记下标) 的 pickle，
+    索引记录各块首键、偏移和长度以及布隆过滤器，文件最后8字节为索引偏移。
+    指定 compression 时每个数据块单独压缩，索引中记录压缩方式。
+    打开时只读取索引，查询时按首键二分定位数据块，最近读取的块保留在缓存中。
+    """
+    
+    FORMAT = 1
+    BLOCK_SIZE = 128
+    CACHE_BLOCKS = 64
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._io_lock = threading.Lock()
+        self._cache: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._file.seek(-8, os.SEEK_END)
+        (footer_offset,) = struct.unpack("<Q", self._file.read(8))
+        self._file.seek(footer_offset)
+        footer = pickle.load(self._file)
+        self.count = footer["count"]
+        self._first_keys: List[str] = footer["first_keys"]
+        self._offsets: List[int] = footer["offsets"]
+        self._lengths: List[int] = footer["lengths"]
+        self.bloom = BloomFilter.from_state(footer["bloom"])
+        codec = footer.get("codec")
+        self._decompress = CODECS[codec][1] if codec else None
+    
+    @classmethod
+    def write(cls, path: str, entries: List[Tuple[str, Any, int]],
+              compression: Optional[Tuple[str, int]] = None) -> 'SortedRun':
+        """将按键有序的 (键, 值, 版本号) 写成文件，compression 为 (压缩方式, 级别)"""
+        bloom = BloomFilter(len(entries))
+        first_keys, offsets, lengths = [], [], []
+        with open(path, 'wb') as f:
+            for start in range(0, len(entries), cls.BLOCK_SIZE):
+                chunk = entries[start:start + cls.BLOCK_SIZE]
+                keys = [e[0] for e in chunk]
+                for key in keys:
+                    bloom.add(key)
+                deleted = [i for i, e in enumerate(chunk) if e[1] is TOMBSTONE]
+                values = [None if e[1] is TOMBSTONE else e[1] for e in chunk]
+                data = pickle.dumps((keys, values, [e[2] for e in chunk], deleted),
+                                    protocol=pickle.HIGHEST_PROTOCOL)
+                if compression:
+                    data = CODECS[compression[0]][0](data, compression[1])
+                first_keys.append(keys[0])
+                offsets.append(f.tell())
+                lengths.append(len(data))
+                f.write(data)
+            footer_offset = f.tell()
+            pickle.dump({
+                "format": cls.FORMAT,
+                "count": len(entries),
+                "first_keys": first_keys,
+                "offsets": offsets,
+                "lengths": lengths,
+                "bloom": bloom.to_state(),
+                "codec": compression[0] if compression else None,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(struct.pack("<Q", footer_offset))
+        return cls(path)
+    
+    def _decode(self, data: bytes) -> tuple:
+        """解码数据块"""
+        if self._decompress is not None:
+            data = self._decompress(data)
+        return pickle.loads(data)
+    
+    def _block(self, index: int) -> tuple:
+        """读取数据块（带缓存）"""
+        with self._io_lock:
+            block = self._cache.get(index)
+            if block is not None:
+                self._cache.move_to_end(index)
+                return block
+            self._file.seek(self._offsets[index])
+            block = self._decode(self._file.read(self._lengths[index]))
+            self._cache[index] = block
+            if len(self._cache) > self.CACHE_BLOCKS:
+                self._cache.popitem(last=False)
+            return block
+    
+    def get(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查找键，返回(值, 版本号)；值可能是 TOMBSTONE"""
+        index = bisect.bisect_right(self._first_keys, key) - 1
+        if index < 0:
+            return None
+        keys, values, versions, deleted = self._block(index)
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return (TOMBSTONE if i in deleted else values[i]), versions[i]
+        return None
+    
+    def entries(self) -> Iterator[Tuple[str, Any, int]]:
+        """按键顺序遍历，不经过块缓存"""
+        for offset, length in zip(self._offsets, self._lengths):
+            with self._io_lock:
+                self._file.seek(offset)
+                data = self._file.read(length)
+            keys, values, versions, deleted = self._decode(data)
+            for i in deleted:
+                values[i] = TOMBSTONE
+            yield from zip(keys, values, versions)
+    
+    def close(self) -> None:
+        """关闭文件"""
+        self._file.close()
+    
+    def __del__(self):
+        # 合并后被替换的 run 可能仍有读取方持有，最后一个引用释放时再关闭
+        try:
+            self._file.close()
+        except Exception:
+            pass
+
+
+def _merge(sources: List[Iterator[Tuple[str, Any, int]]]) -> Iterator[Tuple[str, Any, int]]:
+    """合并多个有序来源，sources 从新到旧排列，同一个键只保留最新的条目"""
+    tagged = [((key, rank, value, version) for key, value, version in source)
+              for rank, source in enumerate(sources)]
+    last_key = None
+    for key, _, value, version in heapq.merge(*tagged, key=lambda e: (e[0], e[1])):
+        if key != last_key:
+            last_key = key
+            yield key, value, version
+
+
+class LSMStorageEngine:
+    """LSM分层存储引擎
+    
+    data_file 为清单文件，记录各 run 的编号（从新到旧）、已落盘的序列号和键数量；
+    run 文件为 data_file.run-<编号>，预写日志为 data_file.wal。
+    
+    写操作追加一条日志记录后修改 memtable，不重写已有文件；memtable 的值为 (值, 版本号)，
+    删除写入 TOMBSTONE。memtable 达到 memtable_limit 个键时写成新 run 并清空日志，
+    run 数量达到 compaction_trigger 时由后台线程将全部 run 合并为一个并丢弃删除标记。
+    
+    每次写入都要判断键是否已存在（upsert/delete 的返回值和 size() 依赖它），
+    新键的查找由布隆过滤器跳过各 run，因此写入新键的代价与 run 数量基本无关。
+    
+    版本号语义与 SBTStorageEngine 相同：打开前写入的键，版本号均为打开时的序列号。
+    
+    打开 SBTStorageEngine 的快照文件时会将其导入为第一个 run。
+    
+    compression 为 "zlib"、"lzma:9" 等时新写成的 run 按块压缩，已有的 run 不受影响。
+    """
+    
+    MANIFEST_FORMAT = "lsm-1"
+    
+    def __init__(self, data_file: str = "lsm_storage.dat", lazy: bool = False,
+                 memtable_limit: int = 4096, compaction_trigger: int = 4,
+                 background_compaction: bool = True, compression: Optional[str] = None):
+        self.data_file = data_file
+        self.compression = parse_compression(compression)
+        self.memtable_limit = memtable_limit
+        self.compaction_trigger = compaction_trigger
+        self.background_compaction = background_compaction
+        
+        self.memtable = SBTTree()
+        self.runs: List[SortedRun] = []  # 从新到旧
+        self.feed = ChangeFeed()
+        self.base_version = 0
+        self._store_id = uuid.uuid4().hex  # 新建的存储生成新ID，打开已有清单时替换
+        self._count = 0
+        self._flushed_count = 0  # 已写入 run 的键数量：清单只记录它，memtable 中的键由日志重放计入
+        self._flushed_seq = 0
+        self._next_run_id = 1
+        self._generation = 0  # clear/恢复时递增，使进行中的合并作废
+        
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compact_wanted = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        self._closed = False
+        
+        self._wal = None
+        self._wal_buffer: List[bytes] = []
+        self._batch_depth = 0
+        
+        self._flush_seconds = metrics.histogram("lsm_flush_duration_seconds", "memtable 写成 run 的耗时")
+        self._compact_seconds = metrics.histogram("lsm_compaction_duration_seconds", "合并 run 的耗时")
+        self._bloom_skips = metrics.counter("lsm_bloom_skips_total", "布隆过滤器跳过的 run 查找次数")
+        
+        # 打开很快（只读清单、run 索引和日志），lazy 仅为与 SBTStorageEngine 接口一致
+        self._loaded = threading.Event()
+        self.load_from_disk()
+        self._loaded.set()
+    
+    @property
+    def loaded(self) -> bool:
+        """是否已完成加载"""
+        return self._loaded.is_set()
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """等待加载完成"""
+        return self._loaded.wait(timeout)
+    
+    @property
+    def wal_file(self) -> str:
+        """预写日志路径"""
+        return self.data_file + ".wal"
+    
+    def _run_path(self, run_id: int) -> str:
+        """run 文件路径"""
+        return f"{self.data_file}.run-{run_id:06d}"
+    
+    # ---- 读取 ----
+    
+    def _lookup(self, key: str) -> Optional[Tuple[Any, int]]:
+        """依次查 memtable 和各 run，返回(值, 版本号)；已删除时值为 TOMBSTONE
+        
+        先取 memtable 再取 run 列表：memtable 写成 run 时先发布新的 run 列表再替换 memtable，
+        不加锁的读取方不会漏掉正在落盘的数据。
+        """
+        entry = self.memtable.search(key)
+        if entry is not None:
+            return entry
+        for run in self.runs:
+            if not run.bloom.might_contain(key):
+                self._bloom_skips.inc()
+                continue
+            entry = run.get(key)
+            if entry is not None:
+                return entry
+        return None
+    
+    def _live(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查找未删除的键，返回(值, 对外的版本号)"""
+        entry = self._lookup(key)
+        if entry is None or entry[0] is TOMBSTONE:
+            return None
+        return entry[0], max(entry[1], self.base_version)
+    
+    def search(self, key: str) -> Optional[Any]:
+        """查询数据"""
+        with span("lsm.search"):
+            entry = self._live(key)
+        return entry[0] if entry is not None else None
+    
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查询数据及其版本号（最近一次写入的序列号）"""
+        with span("lsm.search"):
+            return self._live(key)
+    
+    def get_all(self) -> List[Tuple[str, Any]]:
+        """按键有序合并 memtable 和各 run"""
+        with self._lock:
+            memtable = [(key, value, version) for key, (value, version) in self.memtable.get_all()]
+            runs = list(self.runs)
+        return [(key, value) for key, value, _ in _merge([iter(memtable)] + [r.entries() for r in runs])
+                if value is not TOMBSTONE]
+    
+    def size(self) -> int:
+        """获取数据量"""
+        return self._count
+    
+    # ---- 写入 ----
+    
+    def _next_version(self) -> int:
+        """下一次写入将分配的序列号（需持有写锁）"""
+        return self.feed.last_seq + 1
+    
+    def _write(self, op: str, key: str, value: Any, existed: bool) -> None:
+        """记录日志、修改 memtable 并分配序列号（需持有写锁）"""
+        seq = self._next_version()
+        self._log((seq, op, key, value))
+        if op == OP_DELETE:
+            self.memtable.upsert(key, (TOMBSTONE, seq))
+            self._count -= 1
+        else:
+            self.memtable.upsert(key, (value, seq))
+            self._count += not existed
+        self.feed.append(op, key, value)
+        if self.memtable.size() >= self.memtable_limit:
+            self.flush()
+    
+    def insert(self, key: str, value: Any) -> None:
+        """插入数据"""
+        self.upsert(key, value)
+    
+    def upsert(self, key: str, value: Any) -> bool:
+        """插入或覆盖，返回是否新建了键"""
+        with self._lock, span("lsm.put"):
+            existed = self._live(key) is not None
+            self._write(OP_PUT, key, value, existed)
+        return not existed
+    
+    def insert_if_absent(self, key: str, value: Any) -> bool:
+        """键不存在时插入，返回是否插入"""
+        with self._lock, span("lsm.put"):
+            if self._live(key) is not None:
+                return False
+            self._write(OP_PUT, key, value, False)
+        return True
+    
+    def delete(self, key: str) -> bool:
+        """删除数据"""
+        with self._lock, span("lsm.delete"):
+            if self._live(key) is None:
+                return False
+            self._write(OP_DELETE, key, None, True)
+        return True
+    
+    def update(self, key: str, value: Any) -> bool:
+        """更新已存在的键"""
+        with self._lock, span("lsm.put"):
+            if self._live(key) is None:
+                return False
+            self._write(OP_PUT, key, value, True)
+        return True
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any]) -> Optional[Any]:
+        """在写锁内以 fn(旧值) 原子地更新，返回新值；键不存在或 fn 返回None时不写入"""
+        with self._lock, span("lsm.put"):
+            entry = self._live(key)
+            if entry is None:
+                return None
+            value = fn(entry[0])
+            if value is not None:
+                self._write(OP_PUT, key, value, True)
+        return value
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any) -> bool:
+        """版本号匹配时写入；expected_version 为0表示要求键不存在"""
+        with self._lock, span("lsm.put"):
+            entry = self._live(key)
+            if expected_version == 0:
+                if entry is not None:
+                    return False
+            elif entry is None or entry[1] != expected_version:
+                return False
+            self._write(OP_PUT, key, value, entry is not None)
+        return True
+    
+    @contextmanager
+    def batch(self):
+        """批量写入，可嵌套；批次内的日志记录在最外层批次结束时一次写出"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._flush_wal()
+    
+    # ---- 预写日志 ----
+    
+    def _log(self, record: tuple) -> None:
+        """追加日志记录，批次内先缓存（需持有写锁）"""
+        self._wal_buffer.append(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+        if not self._batch_depth:
+            self._flush_wal()
+    
+    def _flush_wal(self) -> None:
+        """写出缓存的日志记录（需持有写锁）"""
+        if not self._wal_buffer:
+            return
+        try:
+            if self._wal is None:
+                self._wal = open(self.wal_file, 'ab')
+            self._wal.write(b"".join(self._wal_buffer))
+            self._wal.flush()
+        except Exception as e:
+            print(f"写入日志失败: {e}")
+        self._wal_buffer = []
+    
+    def _reset_wal(self) -> None:
+        """丢弃日志（内容已写入 run 或已清空，需持有写锁）"""
+        self._wal_buffer = []
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        if os.path.exists(self.wal_file):
+            os.remove(self.wal_file)
+    
+    def _replay_wal(self) -> None:
+        """重放清单序列号之后的日志记录，末尾不完整的记录忽略"""
+        if not os.path.exists(self.wal_file):
+            return
+        with open(self.wal_file, 'rb') as f:
+            while True:
+                try:
+                    seq, op, key, value = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+                if seq <= self._flushed_seq:
+                    continue
+                existed = self._live(key) is not None
+                if op == OP_DELETE:
+                    self.memtable.upsert(key, (TOMBSTONE, seq))
+                    self._count -= existed
+                else:
+                    self.memtable.upsert(key, (value, seq))
+                    self._count += not existed
+                self.feed.reset(seq)
+    
+    # ---- 落盘与合并 ----
+    
+    def _write_manifest(self) -> None:
+        """原子地写入清单（需持有写锁）"""
+        tmp = self.data_file + ".tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump({
+                "format": self.MANIFEST_FORMAT,
+                "seq": self._flushed_seq,
+                "store_id": self._store_id,
+                "count": self._flushed_count,
+                "runs": [int(run.path.rsplit("-", 1)[1]) for run in self.runs],
+                "next_run": self._next_run_id,
+            }, f)
+        os.replace(tmp, self.data_file)
+    
+    def _new_run(self, entries: List[Tuple[str, Any, int]]) -> SortedRun:
+        """分配编号并写出 run（需持有写锁）"""
+        path = self._run_path(self._next_run_id)
+        self._next_run_id += 1
+        return SortedRun.write(path, entries, self.compression)
+    
+    def flush(self) -> None:
+        """将 memtable 写成新的 run"""
+        with self._lock:
+            if self.memtable.size() == 0:
+                return
+            try:
+                with self._flush_seconds.time(), span("lsm.flush") as s:
+                    entries = [(key, value, version)
+                               for key, (value, version) in self.memtable.get_all()]
+                    s.set("keys", len(entries))
+                    run = self._new_run(entries)
+                    self.runs = [run] + self.runs
+                    self.memtable = SBTTree()
+                    self._flushed_seq = self.feed.last_seq
+                    self._flushed_count = self._count
+                    self._write_manifest()
+                    self._reset_wal()
+            except Exception as e:
+                print(f"写入run失败: {e}")
+                return
+            if len(self.runs) >= self.compaction_trigger:
+                self._request_compaction()
+    
+    def _request_compaction(self) -> None:
+        """触发合并（需持有写锁）"""
+        if not self.background_compaction:
+            self.compact()
+            return
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compaction_loop,
+                                               name="lsm-compactor", daemon=True)
+            self._compactor.start()
+        self._compact_wanted.set()
+    
+    def _compaction_loop(self) -> None:
+        """后台合并线程"""
+        while True:
+            self._compact_wanted.wait()
+            self._compact_wanted.clear()
+            if self._closed:
+                return
+            self.compact()
+    
+    def compact(self) -> bool:
+        """将当前全部 run 合并为一个，返回是否进行了合并
+        
+        合并在写锁外进行，期间新写成的 run 排在合并结果之前；
+        合并的是全部 run，因此删除标记可以直接丢弃。
+        """
+        with self._compact_lock:
+            with self._lock:
+                runs = list(self.runs)
+                generation = self._generation
+                if len(runs) < 2:
+                    return False
+                path = self._run_path(self._next_run_id)
+                self._next_run_id += 1
+            try:
+                with self._compact_seconds.time(), span("lsm.compact") as s:
+                    entries = [e for e in _merge([r.entries() for r in runs]) if e[1] is not TOMBSTONE]
+                    s.set("runs", len(runs))
+                    s.set("keys", len(entries))
+                    merged = SortedRun.write(path, entries, self.compression) if entries else None
+            except Exception as e:
+                print(f"合并run失败: {e}")
+                if os.path.exists(path):
+                    os.remove(path)
+                return False
+            
+            with self._lock:
+                if generation != self._generation:
+                    # 合并期间数据已被清空或恢复
+                    if merged is not None:
+                        merged.close()
+                        os.remove(path)
+                    return False
+                newer = self.runs[:len(self.runs) - len(runs)]
+                self.runs = newer + ([merged] if merged is not None else [])
+                self._write_manifest()
+            for run in runs:
+                try:
+                    os.remove(run.path)
+                except OSError as e:
+                    print(f"删除run失败: {e}")
+            return True
+    
+    def close(self) -> None:
+        """停止后台合并并关闭日志"""
+        self._closed = True
+        self._compact_wanted.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._flush_wal()
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+    
+    # ---- 加载、清空与快照 ----
+    
+    def load_from_disk(self) -> None:
+        """读取清单和各 run 的索引，重放日志"""
+        try:
+            with span("lsm.load_from_disk"):
+                if os.path.exists(self.data_file):
+                    with open(self.data_file, 'rb') as f:
+                        raw = f.read()
+                    manifest = decode_snapshot(raw) if is_compressed(raw) else pickle.loads(raw)
+                    if isinstance(manifest, dict) and manifest.get("format") == self.MANIFEST_FORMAT:
+                        self.runs = [SortedRun(self._run_path(i)) for i in manifest["runs"]]
+                        self._flushed_seq = manifest["seq"]
+                        self._store_id = manifest.get("store_id") or self._store_id
+                        self._count = self._flushed_count = manifest["count"]
+                        self._next_run_id = manifest["next_run"]
+                    else:
+                        self._import_snapshot(manifest)
+                self.feed.reset(self._flushed_seq)
+                self._replay_wal()
+                self.base_version = self.feed.last_seq
+        except Exception as e:
+            print(f"加载数据失败: {e}")
+    
+    def _import_snapshot(self, data: Any) -> None:
+        """将 SBTStorageEngine 的快照导入为一个 run"""
+        if isinstance(data, tuple):
+            items, seq = data  # 压缩快照
+        elif isinstance(data, list):
+            items, seq = data, 0
+        else:
+            items, seq = data["items"], data.get("seq", 0)
+            self._store_id = data.get("store_id") or self._store_id
+        self._load_items(items, seq)
+    
+    def _load_items(self, items: List[Tuple[str, Any]], seq: int) -> None:
+        """以有序键值对替换全部数据（需持有写锁或在构造时调用）"""
+        self._drop_files()
+        self.memtable = SBTTree()
+        self.runs = [self._new_run([(key, value, seq) for key, value in items])] if items else []
+        self._count = self._flushed_count = len(items)
+        self._flushed_seq = seq
+        self._write_manifest()
+    
+    def _drop_files(self) -> None:
+        """删除全部 run 和日志（需持有写锁）
+        
+        与合并一样只替换 run 列表并删除文件，不关闭句柄：无锁的读取方可能仍持有旧列表，
+        句柄在最后一个引用释放时关闭。
+        """
+        self._generation += 1
+        self._reset_wal()
+        for run in self.runs:
+            if os.path.exists(run.path):
+                os.remove(run.path)
+        self.runs = []
+    
+    def clear(self) -> None:
+        """清空所有数据
+        
+        清单保留清空操作的序列号，重新打开后序列号继续递增。
+        """
+        with self._lock:
+            self._drop_files()
+            self.memtable = SBTTree()
+            self._count = self._flushed_count = 0
+            self.feed.append(OP_CLEAR, None)
+            self._flushed_seq = self.feed.last_seq
+            self._write_manifest()
+    
+    def replace_all(self, items: List[Tuple[str, Any]]) -> None:
+        """以按键有序的键值对替换全部数据：直接写成一个 run，序列号继续递增，之前的版本号全部失效"""
+        with self._lock:
+            seq = self.feed.last_seq + 1
+            self._load_items(items, seq)
+            self.feed.reset(seq)
+            self.base_version = seq
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """内存占用估算（字节）：memtable 的键值，nodes 另含各 run 常驻内存的索引、布隆过滤器和块缓存"""
+        with self._lock:
+            usage = tree_memory(self.memtable)
+            seen = set()
+            runs = sum(deep_sizeof(part, seen) for run in self.runs
+                       for part in (run._first_keys, run._offsets, run._lengths, run.bloom, run._cache))
+        usage["nodes"] += runs
+        usage["total"] += runs
+        return usage
+    
+    # ---- 变更流 ----
+    
+    def last_sequence(self) -> int:
+        """最近一次写操作的序列号"""
+        return self.feed.last_seq
+    
+    def store_id(self) -> str:
+        """存储ID：随清单持久化，清空后不变"""
+        return self._store_id
+    
+    def changes_since(self, seq: int):
+        """获取序列号之后的变更，历史不可用时返回None"""
+        return self.feed.changes_since(seq)
+    
+    def subscribe(self, since: Optional[int] = None):
+        """订阅变更（需在事件循环中调用）"""
+        return self.feed.subscribe(since)
+
+
+class LSMEngineAdapter(SBTEngineAdapter):
+    """LSM分层存储引擎（写入多的负载）"""
+    
+    engine_name = "lsm"
+    
+    def _create_engine(self, data_file: str, lazy: bool) -> LSMStorageEngine:
+        if self.follower or self.replication_log:
+            raise ValueError("LSM引擎不支持复制日志和只读副本")
+        if self.memory_budget:
+            raise ValueError("LSM引擎的内存由 memtable_limit 限制，不支持内存预算")
+        return LSMStorageEngine(data_file, lazy=lazy, compression=self.compression)
+    
+    def flush(self) -> None:
+        """将 memtable 写成 run"""
+        self.engine.flush()
+    
+    def compact(self) -> bool:
+        """合并全部 run"""
+        return self.engine.compact()
+    
+    def close(self) -> None:
+        """停止后台合并"""
+        self.engine.close()
+
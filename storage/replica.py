@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+只读副本
+打开主库的数据文件，读取快照后追赶主库的复制日志，使本进程的树保持最新
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sbt_storage_engine import SBTTree, read_snapshot
+from core.change_feed import ChangeFeed, OP_CLEAR, OP_DELETE, OP_PUT
+from core.memory import tree_memory
+from core.metrics import metrics
+from core.replication_log import ReplicationLogReader
+from core.tracing import span
+
+
+class ReadOnlyReplicaError(RuntimeError):
+    """在只读副本上写入"""
+
+
+class SBTReplica:
+    """SBT引擎的只读副本
+    
+    主库以 replication_log=True 打开时，副本先加载快照，再按日志逐条应用其后的变更；
+    日志被轮换后，新日志的起点晚于已应用的序列号（漏掉了变更）、早于已应用的序列号
+    （主库回到了更早的状态）或存储ID变化（主库的数据文件被重建）时重新加载快照。
+    主库没有复制日志时退化为快照文件变化后整体重新加载。
+    
+    poll_interval 大于0时由后台线程定期追赶，为0时需手动调用 refresh()。
+    序列号与主库一致，changes_since / subscribe 可以像主库一样使用。
+    """
+    
+    read_only = True
+    
+    def __init__(self, data_file: str, tree_factory: Callable[[], Any] = SBTTree,
+                 poll_interval: float = 0.1):
+        self.data_file = data_file
+        self.tree_factory = tree_factory
+        self.tree = tree_factory()
+        self.feed = ChangeFeed()
+        self.applied_seq = 0
+        self.snapshot_loads = 0
+        self._store_id: Optional[str] = None
+        
+        self._reader = ReplicationLogReader(f"{data_file}.log")
+        self._snapshot_stat: Optional[Tuple[int, int, int]] = None
+        self._loaded = False
+        self._lock = threading.RLock()  # 串行化追赶，读操作不加锁
+        self._apply_lag = metrics.histogram("replica_apply_lag_seconds", "主库提交到副本应用的延迟")
+        
+        self.refresh()
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        if poll_interval > 0:
+            self._poller = threading.Thread(target=self._poll, args=(poll_interval,),
+                                            name="sbt-replica", daemon=True)
+            self._poller.start()
+    
+    def _poll(self, interval: float) -> None:
+        """后台定期追赶"""
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"副本同步失败: {e}")
+    
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        """快照文件的标识（inode, 大小, 修改时间），不存在时为None"""
+        try:
+            st = os.stat(self.data_file)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+    
+    def _load_snapshot(self, min_seq: int = 0) -> None:
+        """重新加载快照（需持有锁）"""
+        with span("replica.load_snapshot"):
+            # 先取文件标识再读取，读取期间的替换会在下次检查时发现
+            self._snapshot_stat = self._stat()
+            items, seq, self._store_id = read_snapshot(self.data_file)
+            seq = max(seq, min_seq)
+            tree = self.tree_factory()
+            tree.load(items)
+            tree.base_version = seq
+            self.tree = tree
+            self.feed.reset(seq)
+            self.applied_seq = seq
+            self._loaded = True
+            self.snapshot_loads += 1
+    
+    def _apply(self, records: List[tuple]) -> int:
+        """按顺序应用日志记录（需持有锁），返回应用的条数"""
+        applied = 0
+        now = time.time()
+        for seq, op, key, value, committed_at in records:
+            if seq <= self.applied_seq:
+                continue
+            if op == OP_PUT:
+                self.tree.upsert(key, value, seq)
+            elif op == OP_DELETE:
+                self.tree.delete(key)
+            elif op == OP_CLEAR:
+                self.tree = self.tree_factory()
+            self.feed.append(op, key, value, seq=seq)
+            self.applied_seq = seq
+            self._apply_lag.observe(max(0.0, now - committed_at))
+            applied += 1
+        return applied
+    
+    def refresh(self) -> int:
+        """追赶主库，返回应用的变更数（重新加载快照时为-1）"""
+        with self._lock, span("replica.refresh"):
+            reopened = self._reader.rotated() and self._reader.open()
+            if self._reader.is_open:
+                base_seq = self._reader.base_seq
+                if (not self._loaded or base_seq > self.applied_seq
+                        or reopened and (base_seq < self.applied_seq
+                                         or self._reader.store_id != self._store_id)):
+                    self._load_snapshot(base_seq)
+                    self._apply(self._reader.read())
+                    return -1
+                return self._apply(self._reader.read())
+            
+            # 主库未开启复制日志：快照文件变化时整体重新加载
+            if not self._loaded or self._stat() != self._snapshot_stat:
+                self._load_snapshot()
+                return -1
+            return 0
+    
+    def replication_lag(self) -> Dict[str, Any]:
+        """复制延迟：已应用的序列号、未读取的日志字节数、最早未应用变更的提交时间距今秒数"""
+        with self._lock:
+            if self._reader.is_open and not self._reader.rotated():
+                pending = self._reader.pending_bytes()
+                record = self._reader.peek() if pending else None
+                seconds = max(0.0, time.time() - record[4]) if record else 0.0
+            else:
+                # 日志已轮换或不存在，以快照是否变化估计
+                stat = self._stat()
+                pending = 0 if stat == self._snapshot_stat else (stat[1] if stat else 0)
+                seconds = 0.0
+                if stat != self._snapshot_stat and stat is not None:
+                    seconds = max(0.0, time.time() - stat[2] / 1e9)
+            return {"applied_seq": self.applied_seq, "pending_bytes": pending, "seconds": seconds}
+    
+    def close(self) -> None:
+        """停止后台追赶并关闭日志"""
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+        with self._lock:
+            self._reader.close()
+    
+    def _read_only(self, *args, **kwargs):
+        raise ReadOnlyReplicaError(f"只读副本不能写入: {self.data_file}")
+    
+    insert = upsert = insert_if_absent = delete = update = update_with = _read_only
+    compare_and_swap = replace_all = clear = save_to_disk = _read_only
+    
+    @property
+    def loaded(self) -> bool:
+        """是否已完成加载"""
+        return True
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """副本在构造时同步加载"""
+        return True
+    
+    def search(self, key: str) -> Optional[Any]:
+        """查询数据"""
+        return self.tree.search(key)
+    
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查询数据及其版本号"""
+        return self.tree.search_with_version(key)
+    
+    def get_all(self) -> List[Tuple[str, Any]]:
+        """获取所有数据"""
+        return self.tree.get_all()
+    
+    def size(self) -> int:
+        """获取数据量"""
+        return self.tree.size()
+    
+    def batch(self):
+        """副本不支持写入"""
+        raise ReadOnlyReplicaError(f"只读副本不能写入: {self.data_file}")
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """内存占用估算（字节）"""
+        with self._lock:
+            return tree_memory(self.tree)
+    
+    def last_sequence(self) -> int:
+        """已应用的序列号"""
+        return self.applied_seq
+    
+    def store_id(self) -> Optional[str]:
+        """主库的存储ID（最近一次加载的快照中的）"""
+        return self._store_id
+    
+    def changes_since(self, seq: int):
+        """获取序列号之后已应用的变更"""
+        return self.feed.changes_since(seq)
+    
+    def subscribe(self, since: Optional[int] = None):
+        """订阅已应用的变更（需在事件循环中调用）"""
+        return self.feed.subscribe(since)
@@ -9,36 +9,142 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sbt_storage_engine import SBTStorageEngine
+from sbt_storage_engine import SBTStorageEngine, SBTTree
 from core.interfaces import IStorageEngine
-from typing import Any, Optional, List, Tuple
+from core.metrics import OperationMetrics
+from storage.backup import BackupSet
+from storage.replica import SBTReplica
+from typing import Any, Callable, Dict, Optional, List, Tuple
 
 
 class SBTEngineAdapter(IStorageEngine):
-    """SBT存储引擎适配器"""
+    """SBT存储引擎适配器
     
-    def __init__(self, data_file: str = "app_storage.dat"):
-        self.engine = SBTStorageEngine(data_file)
+    replication_log=True 时主库在每次保存后追加复制日志；follower=True 时以只读副本打开
+    同一数据文件，每 poll_interval 秒追赶一次主库（见 storage/replica.py），写操作抛出
+    ReadOnlyReplicaError。
+    
+    memory_budget（字节）超出时按 budget_policy 告警或把冷数据溢出到磁盘（见 SBTStorageEngine）。
+    """
+    
+    engine_name = "sbt"
+    tree_factory = SBTTree  # 内存索引结构，子类可替换（见 storage/engines.py）
+    
+    def __init__(self, data_file: str = "app_storage.dat", lazy: bool = False,
+                 compression: Optional[str] = None, replication_log: bool = False,
+                 follower: bool = False, poll_interval: float = 0.1,
+                 memory_budget: Optional[int] = None, budget_policy: str = "warn"):
+        self.compression = compression  # 快照压缩方式，如 "zlib" / "lzma:9"
+        self.memory_budget = memory_budget
+        self.budget_policy = budget_policy
+        self.replication_log = replication_log
+        self.follower = follower
+        self.poll_interval = poll_interval
+        self.engine = self._create_engine(data_file, lazy)
+        
+        # 指标：操作次数/延迟、查询命中率、树大小
+        self.metrics = OperationMetrics("storage", engine=self.engine_name)
+        self._search_hits = self.metrics.counter("search_hits_total", "查询命中次数")
+        self._search_misses = self.metrics.counter("search_misses_total", "查询未命中次数")
+        self.metrics.gauge("keys", "存储的数据项数量", file=data_file).set_function(self.size)
+    
+    def _create_engine(self, data_file: str, lazy: bool) -> SBTStorageEngine:
+        """创建底层引擎，子类可替换（见 storage/lsm_engine.py）"""
+        if self.follower:
+            return SBTReplica(data_file, tree_factory=self.tree_factory,
+                              poll_interval=self.poll_interval)
+        return SBTStorageEngine(data_file, lazy=lazy, tree_factory=self.tree_factory,
+                                compression=self.compression,
+                                replication_log=self.replication_log,
+                                memory_budget=self.memory_budget, budget_policy=self.budget_policy)
+    
+    @property
+    def data_file(self) -> str:
+        """数据文件路径"""
+        return self.engine.data_file
+    
+    @property
+    def read_only(self) -> bool:
+        """是否为只读副本"""
+        return getattr(self.engine, "read_only", False)
+    
+    def refresh(self) -> int:
+        """只读副本立即追赶主库，返回应用的变更数"""
+        if not self.read_only:
+            raise NotImplementedError("只有只读副本需要追赶主库")
+        with self.metrics.track("refresh"):
+            return self.engine.refresh()
+    
+    def replication_lag(self) -> dict:
+        """只读副本的复制延迟"""
+        if not self.read_only:
+            raise NotImplementedError("只有只读副本有复制延迟")
+        return self.engine.replication_lag()
+    
+    def close(self) -> None:
+        """停止只读副本的后台追赶"""
+        if self.read_only:
+            self.engine.close()
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """内存占用估算（字节）"""
+        with self.metrics.track("memory_usage"):
+            return self.engine.memory_usage()
     
     def insert(self, key: str, value: Any) -> None:
         """插入数据"""
-        self.engine.insert(key, value)
+        with self.metrics.track("insert"):
+            self.engine.insert(key, value)
     
     def delete(self, key: str) -> bool:
         """删除数据"""
-        return self.engine.delete(key)
+        with self.metrics.track("delete"):
+            return self.engine.delete(key)
     
     def search(self, key: str) -> Optional[Any]:
         """查询数据"""
-        return self.engine.search(key)
+        with self.metrics.track("search"):
+            value = self.engine.search(key)
+        if value is None:
+            self._search_misses.inc()
+        else:
+            self._search_hits.inc()
+        return value
     
     def update(self, key: str, value: Any) -> bool:
         """更新数据"""
-        return self.engine.update(key, value)
+        with self.metrics.track("update"):
+            return self.engine.update(key, value)
+    
+    def upsert(self, key: str, value: Any) -> bool:
+        """插入或覆盖"""
+        with self.metrics.track("upsert"):
+            return self.engine.upsert(key, value)
+    
+    def insert_if_absent(self, key: str, value: Any) -> bool:
+        """键不存在时插入"""
+        with self.metrics.track("insert_if_absent"):
+            return self.engine.insert_if_absent(key, value)
+    
+    def update_with(self, key: str, fn: Callable[[Any], Any]) -> Optional[Any]:
+        """原子地读取-修改-写入"""
+        with self.metrics.track("update_with"):
+            return self.engine.update_with(key, fn)
+    
+    def search_with_version(self, key: str) -> Optional[Tuple[Any, int]]:
+        """查询数据及其版本号"""
+        with self.metrics.track("search"):
+            return self.engine.search_with_version(key)
+    
+    def compare_and_swap(self, key: str, expected_version: int, value: Any) -> bool:
+        """版本号匹配时写入"""
+        with self.metrics.track("compare_and_swap"):
+            return self.engine.compare_and_swap(key, expected_version, value)
     
     def get_all(self) -> List[Tuple[str, Any]]:
         """获取所有数据"""
-        return self.engine.get_all()
+        with self.metrics.track("get_all"):
+            return self.engine.get_all()
     
     def size(self) -> int:
         """获取数据量"""
@@ -48,23 +154,53 @@ class SBTEngineAdapter(IStorageEngine):
         """清空数据"""
         self.engine.clear()
     
-    def backup(self, backup_file: str) -> bool:
-        """备份数据"""
+    def batch(self):
+        """批量写入，批次结束时保存一次"""
+        return self.engine.batch()
+    
+    def last_sequence(self) -> int:
+        """最近一次写操作的序列号"""
+        return self.engine.last_sequence()
+    
+    def store_id(self) -> str:
+        """存储ID"""
+        return self.engine.store_id()
+    
+    def changes_since(self, seq: int):
+        """获取序列号之后的变更"""
+        return self.engine.changes_since(seq)
+    
+    def subscribe(self, since: Optional[int] = None):
+        """订阅变更"""
+        return self.engine.subscribe(since)
+    
+    @property
+    def loaded(self) -> bool:
+        """后台加载是否完成"""
+        return self.engine.loaded
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """等待后台加载完成"""
+        return self.engine.wait_until_loaded(timeout)
+    
+    def replace_all(self, items: List[Tuple[str, Any]]) -> None:
+        """以按键有序的键值对批量替换全部数据"""
+        with self.metrics.track("replace_all"):
+            self.engine.replace_all(items)
+    
+    def backup(self, backup_dir: str, full: bool = False) -> bool:
+        """备份到目录：仅保存上次备份之后的变更，无法增量时做全量备份"""
         try:
-            import shutil
-            shutil.copy2(self.engine.data_file, backup_file)
+            BackupSet(backup_dir).backup(self, full=full)
             return True
         except Exception as e:
             print(f"备份失败: {e}")
             return False
     
-    def restore(self, backup_file: str) -> bool:
-        """恢复数据"""
+    def restore(self, backup_dir: str, seq: Optional[int] = None) -> bool:
+        """恢复到备份中序列号 seq（默认最新备份点）时的数据"""
         try:
-            import shutil
-            shutil.copy2(backup_file, self.engine.data_file)
-            # 重新加载数据
-            self.engine = SBTStorageEngine(self.engine.data_file)
+            BackupSet(backup_dir).restore(self, seq)
             return True
         except Exception as e:
             print(f"恢复失败: {e}")
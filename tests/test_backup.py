@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量备份测试
+"""
+
+import unittest
+import glob
+import os
+import shutil
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.backup import BackupSet
+from storage.engines import create_storage_engine
+from storage.sbt_engine import SBTEngineAdapter
+
+
+class TestBackupSet(unittest.TestCase):
+    """全量/增量备份与按序列号恢复"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_backup.dat"
+        self.backup_dir = "test_backup_dir"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.backups = BackupSet(self.backup_dir)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+    
+    def test_incremental_contains_only_changes(self):
+        """测试增量备份只保存上次备份之后的变更"""
+        with self.engine.batch():
+            for i in range(1000):
+                self.engine.insert(f"key{i:04d}", {"n": i})
+        first = self.backups.backup(self.engine)
+        self.assertEqual(first["kind"], "full")
+        self.assertEqual(first["count"], 1000)
+        
+        self.engine.update("key0001", {"n": -1})
+        self.engine.delete("key0002")
+        second = self.backups.backup(self.engine)
+        self.assertEqual(second["kind"], "incremental")
+        self.assertEqual((second["from_seq"], second["seq"]), (first["seq"], self.engine.last_sequence()))
+        self.assertEqual(second["count"], 2)
+        self.assertLess(second["bytes"], first["bytes"] / 100)
+        
+        # 没有新写入时不产生新的备份点
+        self.assertEqual(self.backups.backup(self.engine), second)
+        self.assertEqual(len(self.backups.entries()), 2)
+    
+    def test_point_in_time_restore(self):
+        """测试恢复到任意序列号"""
+        self.engine.insert("a", 1)
+        self.backups.backup(self.engine)
+        self.engine.insert("b", 2)
+        seq_b = self.engine.last_sequence()
+        self.engine.update("a", 10)
+        self.engine.delete("b")
+        self.backups.backup(self.engine)
+        self.engine.insert("c", 3)
+        self.backups.backup(self.engine)
+        
+        self.assertEqual(self.backups.materialize(seq_b)[0], [("a", 1), ("b", 2)])
+        self.assertEqual(self.backups.materialize(seq_b + 1)[0], [("a", 10), ("b", 2)])
+        self.assertEqual(self.backups.materialize()[0], [("a", 10), ("c", 3)])
+        with self.assertRaises(ValueError):
+            self.backups.materialize(self.engine.last_sequence() + 1)
+        
+        self.engine.clear()
+        self.assertEqual(self.backups.restore(self.engine, seq_b), seq_b)
+        self.assertEqual(self.engine.get_all(), [("a", 1), ("b", 2)])
+        self.assertEqual(SBTEngineAdapter(self.test_file).get_all(), [("a", 1), ("b", 2)])
+    
+    def test_full_backup_when_history_unavailable(self):
+        """测试引擎重启或恢复后做全量备份，恢复时选择正确的链"""
+        self.engine.insert("a", 1)
+        self.backups.backup(self.engine)
+        self.engine.insert("b", 2)
+        
+        # 重启后只有快照之后的变更历史，上次备份之后的写入已无法逐条取得
+        reopened = SBTEngineAdapter(self.test_file)
+        self.assertEqual(self.backups.backup(reopened)["kind"], "full")
+        reopened.insert("c", 3)
+        self.assertEqual(self.backups.backup(reopened)["kind"], "incremental")
+        
+        self.assertTrue(reopened.restore(self.backup_dir))
+        self.assertEqual(self.backups.backup(reopened)["kind"], "full")
+        self.assertEqual(reopened.get_all(), [("a", 1), ("b", 2), ("c", 3)])
+    
+    def test_compacted_history(self):
+        """测试变更流压缩后被合并的中间状态不可恢复"""
+        self.engine.insert("a", 0)
+        base = self.backups.backup(self.engine)
+        self.engine.engine.feed.max_entries = 4
+        for i in range(1, 10):
+            self.engine.update("a", i)
+        self.engine.insert("b", 1)
+        entry = self.backups.backup(self.engine)
+        self.assertEqual(entry["kind"], "incremental")
+        self.assertEqual(entry["exact_until"], base["seq"])
+        
+        self.assertEqual(self.backups.materialize(entry["seq"])[0], [("a", 9), ("b", 1)])
+        with self.assertRaises(ValueError):
+            self.backups.materialize(entry["seq"] - 1)
+        self.assertEqual(self.backups.materialize(base["seq"])[0], [("a", 0)])
+    
+    def test_restore_across_engines(self):
+        """测试备份可恢复到其它引擎"""
+        for i in range(10):
+            self.engine.insert(f"key{i}", i)
+        self.assertTrue(self.engine.backup(self.backup_dir))
+        
+        path = "test_backup_lsm.dat"
+        lsm = create_storage_engine("lsm", path)
+        try:
+            self.assertTrue(lsm.restore(self.backup_dir))
+            self.assertEqual(lsm.get_all(), self.engine.get_all())
+        finally:
+            lsm.close()
+            for file in glob.glob(path + "*"):
+                os.remove(file)
+    
+    def test_engine_without_sequence_rejected(self):
+        """测试不支持序列号的引擎不能备份"""
+        class NoSequenceAdapter(SBTEngineAdapter):
+            def last_sequence(self):
+                return None
+        
+        engine = NoSequenceAdapter(self.test_file)
+        engine.insert("a", 1)
+        with self.assertRaises(ValueError):
+            self.backups.backup(engine)
+        self.assertEqual(self.backups.entries(), [])
+        self.assertFalse(engine.backup(self.backup_dir))
+    
+    def test_full_backup_after_history_reset(self):
+        """测试存储清空或重建后不把新写入接到旧备份链上"""
+        for i in range(10):
+            self.engine.insert(f"old{i}", i)
+        first = self.backups.backup(self.engine)
+        
+        # 清空并重启：序列号继续递增，重启后历史不可用
+        self.engine.clear()
+        reopened = SBTEngineAdapter(self.test_file)
+        for i in range(15):
+            reopened.insert(f"new{i:02d}", i)
+        self.assertEqual(self.backups.backup(reopened)["kind"], "full")
+        self.assertEqual(self.backups.materialize()[0], reopened.get_all())
+        
+        # 数据文件被删除后重建：序列号从0开始，越过上一个备份点时也不能衔接
+        reopened.clear()
+        os.remove(self.test_file)
+        recreated = SBTEngineAdapter(self.test_file)
+        self.assertNotEqual(recreated.store_id(), first["store_id"])
+        for i in range(self.backups.entries()[-1]["seq"] + 5):
+            recreated.insert(f"new{i:02d}", i)
+        entry = self.backups.backup(recreated)
+        self.assertEqual(entry["kind"], "full")
+        self.assertEqual(self.backups.materialize()[0], recreated.get_all())
+        recreated.insert("x", 1)
+        self.assertEqual(self.backups.backup(recreated)["kind"], "incremental")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更流测试
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.change_feed import ChangeFeed, OP_PUT, OP_DELETE
+from core.storage_adapter import TaskStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+class TestChangeFeed(unittest.TestCase):
+    """内存变更流测试"""
+    
+    def test_sequence_and_changes_since(self):
+        """测试序列号单调递增与增量获取"""
+        feed = ChangeFeed()
+        feed.append(OP_PUT, "a", 1)
+        feed.append(OP_PUT, "b", 2)
+        feed.append(OP_DELETE, "a")
+        
+        self.assertEqual(feed.last_seq, 3)
+        self.assertEqual([c.seq for c in feed.changes_since(0)], [1, 2, 3])
+        self.assertEqual([c.key for c in feed.changes_since(1)], ["b", "a"])
+        self.assertEqual(feed.changes_since(3), [])
+        self.assertIsNone(feed.changes_since(4))
+    
+    def test_compaction(self):
+        """测试按键压缩与历史下限"""
+        feed = ChangeFeed(max_entries=3)
+        for i in range(5):
+            feed.append(OP_PUT, "hot", i)
+        feed.compact()
+        self.assertEqual([(c.key, c.value) for c in feed.changes_since(0)], [("hot", 4)])
+        
+        for key in ["a", "b", "c"]:
+            feed.append(OP_PUT, key, key)
+        # 去重后仍超出上限，最旧的记录被丢弃
+        self.assertEqual(feed.floor, 5)
+        self.assertIsNone(feed.changes_since(0))
+        self.assertEqual([c.key for c in feed.changes_since(5)], ["a", "b", "c"])
+    
+    def test_subscription(self):
+        """测试异步订阅先回放历史再推送新变更"""
+        feed = ChangeFeed()
+        feed.append(OP_PUT, "a", 1)
+        
+        async def scenario():
+            subscription = feed.subscribe(since=0)
+            feed.append(OP_PUT, "b", 2)
+            received = []
+            async for change in subscription:
+                received.append(change.key)
+                if len(received) == 2:
+                    subscription.close()
+            return received
+        
+        self.assertEqual(asyncio.run(scenario()), ["a", "b"])
+
+
+class TestTaskChangeFeed(unittest.TestCase):
+    """任务变更流测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_change_feed.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.service = TodoService(TaskStorageAdapter(self.engine))
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_task_changes(self):
+        """测试任务变更及非任务键过滤"""
+        start = self.service.get_version()
+        task = self.service.create_task("同步任务")
+        self.engine.insert("app:config", {"theme": "dark"})
+        self.service.toggle_task(task.id)
+        self.service.delete_task(task.id)
+        
+        changes = self.service.changes_since(start)
+        self.assertEqual([c.op for c in changes], ["put", "put", "delete"])
+        self.assertTrue(changes[1].task.completed)
+        self.assertIsNone(changes[2].task)
+        self.assertEqual(self.service.get_version(), start + 4)
+    
+    def test_sequence_survives_restart(self):
+        """测试序列号随快照持久化"""
+        self.service.create_task("持久化")
+        seq = self.engine.last_sequence()
+        
+        reopened = SBTEngineAdapter(self.test_file)
+        self.assertEqual(reopened.last_sequence(), seq)
+        # 重启后没有历史，只能从当前序列号开始增量同步
+        self.assertIsNone(reopened.changes_since(0))
+        self.assertEqual(reopened.changes_since(seq), [])
+        reopened.insert("k", "v")
+        self.assertEqual(reopened.last_sequence(), seq + 1)
+    
+    def test_sequence_survives_clear_and_restart(self):
+        """测试清空并重启后序列号继续递增"""
+        for i in range(5):
+            self.engine.insert(f"k{i}", i)
+        self.engine.clear()
+        seq = self.engine.last_sequence()
+        self.assertEqual(seq, 6)
+        
+        reopened = SBTEngineAdapter(self.test_file)
+        self.assertEqual(reopened.size(), 0)
+        self.assertEqual(reopened.last_sequence(), seq)
+        reopened.insert("k", "v")
+        self.assertEqual(reopened.last_sequence(), seq + 1)
+        self.assertEqual(reopened.search_with_version("k"), ("v", seq + 1))
+    
+    def test_service_subscribe(self):
+        """测试服务层订阅"""
+        async def scenario():
+            received = []
+            stream = self.service.subscribe()
+            
+            async def consume():
+                async for change in stream:
+                    received.append(change.task.text)
+                    break
+            
+            consumer = asyncio.ensure_future(consume())
+            await asyncio.sleep(0)
+            self.service.create_task("推送")
+            await asyncio.wait_for(consumer, 1)
+            return received
+        
+        self.assertEqual(asyncio.run(scenario()), ["推送"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置存储测试
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.storage_adapter import ConfigStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+
+
+class TestConfigStorage(unittest.TestCase):
+    """配置存储适配器测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_config.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.config = ConfigStorageAdapter(self.engine)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_per_key_storage(self):
+        """测试配置项单独存储"""
+        self.config.save_config({"theme": "dark", "lang": "zh"})
+        self.config.update_config("theme", "light")
+        
+        self.assertEqual(self.engine.search("app:config:theme"), "light")
+        self.assertEqual(self.engine.search("app:config:lang"), "zh")
+        self.assertIsNone(self.engine.search("app:config"))
+        self.assertEqual(self.config.load_config(), {"theme": "light", "lang": "zh"})
+        
+        self.config.save_config({"lang": "en"})
+        self.assertEqual(ConfigStorageAdapter(SBTEngineAdapter(self.test_file)).load_config(),
+                         {"lang": "en"})
+    
+    def test_cached_reads_and_minimal_writes(self):
+        """测试读缓存与只写入变化的键"""
+        self.config.update_many({"theme": "dark", "lang": "zh"})
+        seq = self.engine.last_sequence()
+        
+        searches = []
+        search = self.engine.search
+        self.engine.search = lambda key: (searches.append(key), search(key))[1]
+        for _ in range(3):
+            self.assertEqual(self.config.get_config("theme"), "dark")
+            self.assertEqual(self.config.get_config("missing", "默认"), "默认")
+        self.assertEqual(searches, ["app:config:missing"])
+        
+        self.assertEqual(self.config.update_many({"theme": "dark", "lang": "en"}), ["lang"])
+        self.assertEqual(self.engine.last_sequence(), seq + 1)
+        self.assertEqual(self.config.update_many({"lang": "en"}), [])
+    
+    def test_change_notifications(self):
+        """测试变更通知，包括绕过适配器的写入"""
+        received = []
+        unsubscribe = self.config.subscribe(received.append)
+        self.config.update_many({"theme": "dark", "lang": "zh"})
+        self.assertTrue(self.config.delete_config("lang"))
+        self.assertFalse(self.config.delete_config("lang"))
+        
+        other = ConfigStorageAdapter(self.engine)
+        other.update_config("theme", "light")
+        self.assertEqual(self.config.get_config("theme"), "light")
+        
+        unsubscribe()
+        self.config.update_config("theme", "dark")
+        self.assertEqual(received, [
+            {"theme": "dark", "lang": "zh"},
+            {"lang": None},
+            {"theme": "light"},
+        ])
+    
+    def test_legacy_migration(self):
+        """测试旧版整体配置自动拆分"""
+        self.engine.insert("app:config", {"theme": "dark", "units": "metric"})
+        config = ConfigStorageAdapter(self.engine)
+        self.assertIsNone(self.engine.search("app:config"))
+        self.assertEqual(config.get_config("units"), "metric")
+        self.assertEqual(config.load_config(), {"theme": "dark", "units": "metric"})
+
+
+if __name__ == "__main__":
+    unittest.main()
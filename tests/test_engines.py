@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可选存储引擎一致性测试
+各引擎复用 test_sbt_engine.py 中的测试用例，并与字典模型做随机操作对比
+"""
+
+import unittest
+import os
+import random
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.engines import (INDEXES, ArenaSBTEngineAdapter, HashEngineAdapter,
+                             SkipListEngineAdapter, SortedArrayEngineAdapter, create_storage_engine)
+from sbt_storage_engine import ArenaSBTTree, SBTTree
+from tests import test_sbt_engine
+
+
+class TestArenaSBTEngine(test_sbt_engine.TestSBTEngine):
+    """数组存储的SBT引擎"""
+    engine_class = ArenaSBTEngineAdapter
+
+
+class TestSortedArrayEngine(test_sbt_engine.TestSBTEngine):
+    """有序数组引擎"""
+    engine_class = SortedArrayEngineAdapter
+
+
+class TestSkipListEngine(test_sbt_engine.TestSBTEngine):
+    """跳表引擎"""
+    engine_class = SkipListEngineAdapter
+
+
+class TestHashEngine(test_sbt_engine.TestSBTEngine):
+    """哈希+有序键引擎"""
+    engine_class = HashEngineAdapter
+
+
+class TestArenaSBTConditionalWrites(test_sbt_engine.TestConditionalWrites):
+    """数组存储的SBT引擎条件写入"""
+    engine_class = ArenaSBTEngineAdapter
+
+
+class TestSortedArrayConditionalWrites(test_sbt_engine.TestConditionalWrites):
+    """有序数组引擎条件写入"""
+    engine_class = SortedArrayEngineAdapter
+
+
+class TestSkipListConditionalWrites(test_sbt_engine.TestConditionalWrites):
+    """跳表引擎条件写入"""
+    engine_class = SkipListEngineAdapter
+
+
+class TestHashConditionalWrites(test_sbt_engine.TestConditionalWrites):
+    """哈希+有序键引擎条件写入"""
+    engine_class = HashEngineAdapter
+
+
+class TestIndexModel(unittest.TestCase):
+    """索引结构与字典模型对比"""
+    
+    def test_random_operations(self):
+        """测试随机增删改查与有序遍历"""
+        for name, index_class in INDEXES.items():
+            with self.subTest(index=name):
+                rng = random.Random(42)
+                index = index_class()
+                index.load([(f"k{i:03d}", i) for i in range(0, 200, 2)])
+                model = {f"k{i:03d}": i for i in range(0, 200, 2)}
+                for step in range(2000):
+                    key = f"k{rng.randrange(300):03d}"
+                    op = rng.random()
+                    if op < 0.4:
+                        self.assertEqual(index.upsert(key, step), key not in model)
+                        model[key] = step
+                    elif op < 0.6:
+                        self.assertEqual(index.delete(key), model.pop(key, None) is not None)
+                    elif op < 0.7:
+                        self.assertEqual(index.insert_if_absent(key, step), key not in model)
+                        model.setdefault(key, step)
+                    else:
+                        self.assertEqual(index.search(key), model.get(key))
+                    if step % 250 == 0:
+                        self.assertEqual(index.get_all(), sorted(model.items()))
+                self.assertEqual(index.size(), len(model))
+                self.assertEqual(index.get_all(), sorted(model.items()))
+    
+    def test_arena_matches_sbt(self):
+        """测试数组存储的SBT与对象节点SBT结构一致，删除的节点编号被复用"""
+        rng = random.Random(7)
+        tree, arena = SBTTree(), ArenaSBTTree()
+        for _ in range(3000):
+            key = f"k{rng.randrange(500):03d}"
+            if rng.random() < 0.6:
+                self.assertEqual(tree.upsert(key, 1), arena.upsert(key, 1))
+            else:
+                self.assertEqual(tree.delete(key), arena.delete(key))
+        self.assertEqual(arena.rotations, tree.rotations)
+        self.assertEqual(arena.get_all(), tree.get_all())
+        self.assertEqual(len(arena.keys) - 1 - len(arena.free), arena.size())
+        self.assertLessEqual(len(arena.keys), 501)
+    
+    def test_shared_file_format(self):
+        """测试不同引擎读写同一数据文件"""
+        path = "test_engines_shared.dat"
+        try:
+            writer = create_storage_engine("skiplist", path)
+            for i in range(20):
+                writer.insert(f"key{i:02d}", i)
+            for name in INDEXES:
+                reader = create_storage_engine(name, path)
+                self.assertEqual(reader.get_all(), writer.get_all())
+            with self.assertRaises(ValueError):
+                create_storage_engine("btree", path)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
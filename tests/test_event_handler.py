@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件合并与去抖测试
+"""
+
+import unittest
+import asyncio
+import gc
+import os
+import sys
+import threading
+import weakref
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.interfaces import IWeatherService, WeatherData
+from core.storage_adapter import TaskStorageAdapter
+from services.event_handler import BatchingEventHandler
+from services.todo_service import TodoService
+from storage.sbt_engine import SBTEngineAdapter
+
+
+class CountingWeatherService(IWeatherService):
+    """记录请求次数的天气服务"""
+    
+    def __init__(self):
+        self.requests = 0
+    
+    async def get_location(self):
+        return 39.9, 116.4
+    
+    async def get_current_weather(self, lat: float = None, lon: float = None) -> WeatherData:
+        self.requests += 1
+        await asyncio.sleep(0.02)
+        return WeatherData("北京", 20.0, "晴朗", "☀️", 40, 5.0, 1013, datetime.now())
+
+
+class TestBatchingEventHandler(unittest.TestCase):
+    """事件处理器测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_events.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.service = TodoService(TaskStorageAdapter(self.engine))
+        self.weather = CountingWeatherService()
+        self.results = []
+        self.reports = []
+        self.handler = BatchingEventHandler(self.service, self.weather,
+                                            on_flush=self.results.append,
+                                            on_weather=self.reports.append,
+                                            flush_delay=0.01, weather_debounce=0.01)
+        self.saves = []
+        self.save_threads = []
+        save_to_disk = self.engine.engine.save_to_disk
+        self.engine.engine.save_to_disk = lambda: (self.saves.append(1),
+                                                   self.save_threads.append(threading.current_thread()),
+                                                   save_to_disk())
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_coalesce_and_batch(self):
+        """测试同一任务的事件合并，并在一个批次中写入"""
+        a, b, c = self.service.create_tasks(["a", "b", "c"])
+        self.saves.clear()
+        self.save_threads.clear()
+        
+        async def scenario():
+            self.handler.on_task_toggle(a.id)
+            self.handler.on_task_toggle(a.id)  # 抵消
+            self.handler.on_task_toggle(b.id)
+            self.handler.on_task_toggle(c.id)
+            self.handler.on_task_delete(c.id)  # 覆盖切换
+            self.handler.on_task_add("d")
+            self.handler.on_task_add("  ")
+            self.assertEqual(self.handler.queue_depth(), 3)
+            await asyncio.sleep(0.05)
+        
+        asyncio.run(scenario())
+        self.assertEqual(len(self.results), 1)
+        result = self.results[0]
+        self.assertEqual([t.text for t in result.created], ["d"])
+        self.assertEqual([t.id for t in result.toggled], [b.id])
+        self.assertEqual(result.deleted, [c.id])
+        self.assertEqual(self.saves, [1])
+        self.assertNotIn(threading.main_thread(), self.save_threads)  # 不在事件循环线程中保存
+        self.assertEqual(self.handler.queue_depth(), 0)
+        
+        tasks = {t.text: t.completed for t in self.service.get_all_tasks()}
+        self.assertEqual(tasks, {"a": False, "b": True, "d": False})
+    
+    def test_toggle_pair_writes_nothing(self):
+        """测试两次切换不产生写入"""
+        task = self.service.create_task("a")
+        self.saves.clear()
+        
+        async def scenario():
+            self.handler.on_task_toggle(task.id)
+            self.handler.on_task_toggle(task.id)
+            await asyncio.sleep(0.05)
+        
+        asyncio.run(scenario())
+        self.assertEqual(self.saves, [])
+        self.assertEqual(self.results, [])
+    
+    def test_close_flushes(self):
+        """测试关闭时写入待写队列"""
+        async def scenario():
+            self.handler.on_task_add("关闭前")
+            await self.handler.close()
+        
+        asyncio.run(scenario())
+        self.assertEqual([t.text for t in self.service.get_all_tasks()], ["关闭前"])
+    
+    def test_handler_released(self):
+        """测试处理器不被全局指标注册表持有"""
+        handler = weakref.ref(self.handler)
+        self.handler = None
+        gc.collect()
+        self.assertIsNone(handler())
+    
+    def test_weather_debounce(self):
+        """测试连续刷新只请求一次，请求进行中的点击被忽略"""
+        async def scenario():
+            for _ in range(5):
+                self.handler.on_weather_refresh()
+                await asyncio.sleep(0.002)
+            await asyncio.sleep(0.02)
+            self.handler.on_weather_refresh()  # 请求进行中
+            await asyncio.sleep(0.05)
+            self.handler.on_weather_refresh()
+            await asyncio.sleep(0.02)
+            await self.handler.close()
+        
+        asyncio.run(scenario())
+        self.assertEqual(self.weather.requests, 2)
+        self.assertEqual(len(self.reports), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
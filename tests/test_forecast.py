@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+天气预报数组测试（需要 numpy）
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from core.forecast import METRICS, WeatherForecast
+from services.weather_service import MockWeatherService
+
+
+@unittest.skipIf(np is None, "需要 numpy")
+class TestForecast(unittest.TestCase):
+    """预报生成与向量化统计"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.service = MockWeatherService()
+        self.start = datetime(2026, 10, 19, 18, 0)
+    
+    def forecast(self, locations, hours=48, start=None):
+        """获取预报"""
+        return asyncio.run(self.service.get_forecast(locations, hours, start or self.start))
+    
+    def test_deterministic_series(self):
+        """测试同一地点同一小时的取值确定且与查询窗口无关"""
+        forecast = self.forecast(["北京", "上海", "未知城市"])
+        self.assertEqual(forecast.values.shape, (3, 48, len(METRICS)))
+        self.assertEqual(forecast.values.dtype, np.float32)
+        np.testing.assert_array_equal(forecast.values, self.forecast(["北京", "上海", "未知城市"]).values)
+        
+        later = self.forecast(["上海"], hours=24, start=datetime(2026, 10, 20, 6, 0))
+        np.testing.assert_array_equal(later.location("上海"), forecast.location("上海")[12:36])
+        self.assertEqual(forecast.times()[12], np.datetime64("2026-10-20T06", "h"))
+        
+        humidity = forecast.metric("humidity")
+        self.assertTrue(((humidity >= 0) & (humidity <= 100)).all())
+    
+    def test_daily(self):
+        """测试按自然日统计（首尾不完整的天单独统计）"""
+        values = np.arange(2 * 30 * len(METRICS), dtype=np.float32).reshape(2, 30, len(METRICS))
+        forecast = WeatherForecast(["a", "b"], datetime(2026, 10, 19, 20, 0), values)
+        days, stats = forecast.daily()
+        self.assertEqual(days, [datetime(2026, 10, 19), datetime(2026, 10, 20), datetime(2026, 10, 21)])
+        
+        # 第一天 20-23 点共4小时，第二天完整 24 小时，第三天剩余 2 小时
+        for stat, fn in (("min", np.min), ("max", np.max), ("mean", np.mean)):
+            expected = np.stack([fn(values[:, :4], axis=1), fn(values[:, 4:28], axis=1)], axis=1)
+            np.testing.assert_allclose(stats[stat][:, :2], expected)
+        self.assertEqual(stats["mean"].shape, (2, 3, len(METRICS)))
+    
+    def test_rolling(self):
+        """测试滑动窗口与逐窗口计算一致"""
+        forecast = self.forecast(["北京", "广州"], hours=30)
+        for stat, fn in (("mean", np.mean), ("min", np.min), ("max", np.max)):
+            result = forecast.rolling(6, stat)
+            self.assertEqual(result.shape, (2, 25, len(METRICS)))
+            expected = np.stack([fn(forecast.values[:, i:i + 6].astype(np.float64), axis=1)
+                                 for i in range(25)], axis=1)
+            np.testing.assert_allclose(result, expected, rtol=1e-6)
+        with self.assertRaises(ValueError):
+            forecast.rolling(0)
+        with self.assertRaises(ValueError):
+            forecast.rolling(3, "median")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP任务API测试
+"""
+
+import unittest
+import asyncio
+import json
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.storage_adapter import TaskStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+from services.http_api import TaskAPI, TaskHTTPServer
+
+
+class TestTaskAPI(unittest.TestCase):
+    """任务API测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_http_api.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.service = TodoService(TaskStorageAdapter(self.engine))
+        self.api = TaskAPI(self.service)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def request(self, method, target, payload=None, headers=None):
+        """发送请求并解析JSON响应"""
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        status, response_headers, response_body = self.api.handle(method, target, headers or {}, body)
+        data = json.loads(response_body) if response_body else None
+        return int(status), response_headers, data
+    
+    def test_crud(self):
+        """测试增删改查"""
+        status, _, task = self.request("POST", "/tasks", {"text": " 买菜 "})
+        self.assertEqual(status, 201)
+        self.assertEqual(task["text"], "买菜")
+        
+        status, _, toggled = self.request("POST", f"/tasks/{task['id']}/toggle")
+        self.assertEqual(status, 200)
+        self.assertTrue(toggled["completed"])
+        
+        status, _, updated = self.request("PATCH", f"/tasks/{task['id']}", {"text": "买水果"})
+        self.assertEqual(updated["text"], "买水果")
+        
+        status, _, fetched = self.request("GET", f"/tasks/{task['id']}")
+        self.assertEqual(fetched["text"], "买水果")
+        
+        status, _, _ = self.request("DELETE", f"/tasks/{task['id']}")
+        self.assertEqual(status, 204)
+        self.assertEqual(self.request("GET", f"/tasks/{task['id']}")[0], 404)
+        self.assertEqual(self.request("DELETE", f"/tasks/{task['id']}")[0], 404)
+    
+    def test_validation(self):
+        """测试参数校验"""
+        self.assertEqual(self.request("POST", "/tasks", {"text": "  "})[0], 400)
+        self.assertEqual(self.api.handle("POST", "/tasks", {}, b"not json")[0], 400)
+        self.assertEqual(self.request("GET", "/tasks?limit=abc")[0], 400)
+        self.assertEqual(self.request("GET", "/unknown")[0], 404)
+        self.assertEqual(self.request("PUT", "/tasks")[0], 405)
+    
+    def test_pagination(self):
+        """测试分页"""
+        for i in range(5):
+            self.service.create_task(f"任务{i}")
+        status, _, page = self.request("GET", "/tasks?offset=1&limit=2")
+        self.assertEqual(status, 200)
+        self.assertEqual(page["total"], 5)
+        self.assertEqual([t["text"] for t in page["tasks"]], ["任务1", "任务2"])
+    
+    def test_conditional_get(self):
+        """测试ETag与304"""
+        self.service.create_task("写代码")
+        status, headers, _ = self.request("GET", "/tasks")
+        etag = headers["ETag"]
+        
+        status, headers, body = self.request("GET", "/tasks", headers={"if-none-match": etag})
+        self.assertEqual(status, 304)
+        self.assertIsNone(body)
+        
+        self.service.create_task("写测试")
+        status, headers, page = self.request("GET", "/tasks", headers={"if-none-match": etag})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers["ETag"], etag)
+        self.assertEqual(page["total"], 2)
+    
+    def test_if_none_match_any(self):
+        """测试If-None-Match: *只对存在的资源返回304"""
+        task = self.service.create_task("写代码")
+        any_tag = {"if-none-match": "*"}
+        self.assertEqual(self.request("GET", f"/tasks/{task.id}", headers=any_tag)[0], 304)
+        self.assertEqual(self.request("GET", "/tasks/missing", headers=any_tag)[0], 404)
+    
+    def test_unexpected_error(self):
+        """测试处理中的意外异常返回500"""
+        def broken(*args):
+            raise RuntimeError("磁盘故障")
+        self.service.list_tasks = broken
+        status, _, data = self.request("GET", "/tasks")
+        self.assertEqual(status, 500)
+        self.assertIn("error", data)
+    
+    def test_etag_changes_with_store(self):
+        """测试存储重建后相同版本号的ETag不同"""
+        self.service.create_task("写代码")
+        etag = self.request("GET", "/tasks")[1]["ETag"]
+        
+        self.engine.clear()
+        os.remove(self.test_file)
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.service = TodoService(TaskStorageAdapter(self.engine))
+        self.api = TaskAPI(self.service)
+        self.service.create_task("写测试")
+        status, headers, page = self.request("GET", "/tasks", headers={"if-none-match": etag})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers["ETag"], etag)
+        self.assertEqual(page["tasks"][0]["text"], "写测试")
+    
+    def test_changes_endpoint(self):
+        """测试增量同步接口"""
+        _, _, start = self.request("GET", "/health")
+        task = self.service.create_task("同步")
+        self.service.delete_task(task.id)
+        
+        status, _, data = self.request("GET", f"/changes?since={start['version']}")
+        self.assertEqual(status, 200)
+        self.assertEqual([c["op"] for c in data["changes"]], ["put", "delete"])
+        self.assertEqual(data["changes"][0]["task"]["text"], "同步")
+        self.assertEqual(self.request("GET", "/changes?since=999999")[0], 410)
+    
+    def test_server_round_trip(self):
+        """测试通过TCP连接访问服务"""
+        handler_threads = []
+        
+        async def scenario():
+            server = TaskHTTPServer(self.service, port=0)
+            handle = server.api.handle
+            
+            def recording_handle(*args):
+                handler_threads.append(threading.current_thread())
+                return handle(*args)
+            
+            server.api.handle = recording_handle
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection(server.host, server.port)
+                body = json.dumps({"text": "联调"}).encode("utf-8")
+                writer.write(b"POST /tasks HTTP/1.1\r\nHost: localhost\r\n"
+                             b"Content-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                writer.write(b"GET /tasks HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                raw = await reader.read()
+                writer.close()
+                return raw
+            finally:
+                await server.close()
+        
+        raw = asyncio.run(scenario())
+        self.assertIn(b"HTTP/1.1 201 Created", raw)
+        self.assertIn(b"HTTP/1.1 200 OK", raw)
+        self.assertIn("联调".encode("utf-8"), raw)
+        self.assertIn(b"ETag: ", raw)
+        # 服务调用不在事件循环线程中执行
+        self.assertEqual(len(handler_threads), 2)
+        self.assertNotIn(threading.main_thread(), handler_threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
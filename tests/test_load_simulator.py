@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+负载模拟测试
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import cli_main
+from core.storage_adapter import TaskStorageAdapter
+from services.load_simulator import DEFAULT_MIX, LoadSimulator, _percentile, parse_mix
+from services.todo_service import TodoService
+from services.weather_service import MockWeatherService
+from storage.sbt_engine import SBTEngineAdapter
+
+
+class TestParseMix(unittest.TestCase):
+    """操作比例解析测试"""
+    
+    def test_parse(self):
+        """测试解析与默认值"""
+        self.assertEqual(parse_mix(None), DEFAULT_MIX)
+        self.assertEqual(parse_mix("create=2, toggle=0.5,list"),
+                         {"create": 2.0, "toggle": 0.5, "list": 1.0})
+    
+    def test_invalid(self):
+        """测试非法比例"""
+        for spec in ("fly=1", "create=x", "create=-1", "create=0"):
+            with self.assertRaises(ValueError, msg=spec):
+                parse_mix(spec)
+    
+    def test_percentile(self):
+        """测试分位数"""
+        samples = [float(i) for i in range(1, 101)]
+        self.assertEqual(_percentile(samples, 50), 50.0)
+        self.assertEqual(_percentile(samples, 99), 99.0)
+        self.assertEqual(_percentile([3.0], 95), 3.0)
+        self.assertEqual(_percentile([], 50), 0.0)
+
+
+class TestLoadSimulator(unittest.TestCase):
+    """负载模拟测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_simulate.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        self.repository.drop_index()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def run_simulation(self, mode):
+        simulator = LoadSimulator(self.service, MockWeatherService(latency=0), clients=3,
+                                  mode=mode, seed=7, data_file=self.test_file)
+        self.assertEqual(simulator.seed_tasks(50, batch_size=20), 50)
+        return simulator.run(120)
+    
+    def test_asyncio_clients(self):
+        """测试协程客户端"""
+        report = self.run_simulation("asyncio")
+        self.assertEqual(report.operations, 120)
+        self.assertEqual(report.errors, 0)
+        self.assertEqual(report.seeded, 50)
+        self.assertGreater(report.data_file_bytes, 0)
+        self.assertGreater(report.throughput, 0)
+        names = [s.name for s in report.stats]
+        self.assertIn("weather", names)
+        for s in report.stats:
+            self.assertLessEqual(s.p50, s.p99)
+            self.assertLessEqual(s.p99, s.max)
+        
+        # 任务数与已知ID一致
+        self.assertEqual(len(self.service.get_all_tasks()), len(LoadSimulator(self.service)._ids))
+        self.assertIn("吞吐", report.format())
+    
+    def test_thread_clients(self):
+        """测试线程客户端"""
+        report = self.run_simulation("threads")
+        self.assertEqual(report.operations, 120)
+        self.assertEqual(report.errors, 0)
+        json.dumps(report.as_dict())
+    
+    def test_without_weather_service(self):
+        """测试未提供天气服务时不发起天气请求"""
+        simulator = LoadSimulator(self.service, mix=parse_mix("delete=1,weather=5"), clients=1)
+        report = simulator.run(5)
+        # 没有任务可删时改为创建，删除与创建交替进行
+        self.assertEqual([s.name for s in report.stats], ["delete"])
+        self.assertEqual(len(self.service.get_all_tasks()), 1)
+    
+    def test_invalid_arguments(self):
+        """测试非法参数"""
+        with self.assertRaises(ValueError):
+            LoadSimulator(self.service, mode="processes")
+        with self.assertRaises(ValueError):
+            LoadSimulator(self.service, clients=0)
+
+
+class TestSimulateCommand(unittest.TestCase):
+    """命令行测试"""
+    
+    def test_simulate_json(self):
+        """测试 todo-app simulate 输出报告并清理数据"""
+        data_file = "test_simulate_cli.dat"
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            cli_main(["simulate", "--tasks", "20", "--operations", "30", "--clients", "2",
+                      "--weather-latency", "0", "--data-file", data_file, "--json", "--seed", "1"])
+        text = output.getvalue()
+        report = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        self.assertEqual(report["operations"], 30)
+        self.assertEqual(report["seeded"], 20)
+        self.assertGreater(report["memory"]["storage"]["keys"], 0)
+        self.assertFalse(os.path.exists(data_file))
+    
+    def test_options_not_leaked_to_environment(self):
+        """测试命令行选项作为参数传入，不修改环境变量"""
+        before = dict(os.environ)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli_main(["--engine", "sbt_arena", "--memory-budget", "64MB", "simulate", "--tasks", "5",
+                      "--operations", "5", "--clients", "1", "--weather-latency", "0",
+                      "--data-file", "test_simulate_env.dat", "--json"])
+        self.assertEqual(dict(os.environ), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LSM分层存储引擎测试
+"""
+
+import unittest
+import glob
+import os
+import pickle
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.lsm_engine import BloomFilter, LSMEngineAdapter, LSMStorageEngine, SortedRun, TOMBSTONE
+from tests import test_sbt_engine
+
+
+class TestLSMEngineInterface(test_sbt_engine.TestSBTEngine):
+    """LSM引擎复用SBT引擎的接口测试"""
+    engine_class = LSMEngineAdapter
+
+
+class TestLSMConditionalWrites(test_sbt_engine.TestConditionalWrites):
+    """LSM引擎条件写入"""
+    engine_class = LSMEngineAdapter
+
+
+class TestLSMStorageEngine(unittest.TestCase):
+    """memtable 落盘、合并与恢复"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_lsm.dat"
+    
+    def tearDown(self):
+        """测试后清理"""
+        for path in glob.glob(self.test_file + "*"):
+            os.remove(path)
+    
+    def open(self, **kwargs) -> LSMStorageEngine:
+        kwargs.setdefault("memtable_limit", 8)
+        kwargs.setdefault("background_compaction", False)
+        return LSMStorageEngine(self.test_file, **kwargs)
+    
+    def test_bloom_filter(self):
+        """测试布隆过滤器无漏判、误判率低"""
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f"key{i}")
+        self.assertTrue(all(bloom.might_contain(f"key{i}") for i in range(1000)))
+        false_positives = sum(bloom.might_contain(f"other{i}") for i in range(10000))
+        self.assertLess(false_positives, 300)
+        restored = BloomFilter.from_state(bloom.to_state())
+        self.assertTrue(restored.might_contain("key1"))
+    
+    def test_sorted_run(self):
+        """测试 run 文件的分块查找与遍历"""
+        entries = [(f"k{i:04d}", i, i + 1) for i in range(0, 1000, 2)]
+        entries[10] = (entries[10][0], TOMBSTONE, 5)
+        run = SortedRun.write(self.test_file + ".run-000001", entries)
+        self.assertEqual(run.get("k0004"), (4, 5))
+        self.assertEqual(run.get("k0020"), (TOMBSTONE, 5))
+        self.assertIsNone(run.get("k0005"))
+        self.assertIsNone(run.get("a"))
+        self.assertEqual(list(run.entries()), entries)
+        run.close()
+    
+    def test_flush_and_read_through_runs(self):
+        """测试 memtable 写成 run 后读取、覆盖和删除"""
+        engine = self.open()
+        for i in range(20):
+            engine.insert(f"key{i:02d}", i)
+        self.assertEqual(len(engine.runs), 2)
+        self.assertEqual(engine.memtable.size(), 4)
+        
+        self.assertTrue(engine.delete("key03"))
+        self.assertFalse(engine.upsert("key05", "new"))
+        self.assertIsNone(engine.search("key03"))
+        self.assertEqual(engine.search("key05"), "new")
+        self.assertEqual(engine.size(), 19)
+        
+        # 写入不重写已有 run，只追加日志
+        mtimes = [os.path.getmtime(run.path) for run in engine.runs]
+        engine.insert("key99", 99)
+        self.assertEqual([os.path.getmtime(run.path) for run in engine.runs], mtimes)
+        self.assertTrue(os.path.exists(engine.wal_file))
+    
+    def test_reopen_replays_wal(self):
+        """测试重启后由清单、run 和日志恢复"""
+        engine = self.open()
+        for i in range(13):
+            engine.insert(f"key{i:02d}", i)
+        engine.delete("key00")
+        engine.delete("key12")
+        engine.close()
+        
+        reopened = self.open()
+        self.assertEqual(reopened.get_all(), engine.get_all())
+        self.assertEqual(reopened.size(), 11)
+        self.assertEqual(reopened.last_sequence(), engine.last_sequence())
+    
+    def test_truncated_wal_record_ignored(self):
+        """测试日志末尾不完整的记录被忽略"""
+        engine = self.open(memtable_limit=100)
+        engine.insert("a", 1)
+        engine.insert("b", 2)
+        engine.close()
+        with open(engine.wal_file, 'ab') as f:
+            f.write(pickle.dumps((3, "put", "c", 3))[:-3])
+        
+        reopened = self.open(memtable_limit=100)
+        self.assertEqual(reopened.get_all(), [("a", 1), ("b", 2)])
+        self.assertEqual(reopened.last_sequence(), 2)
+    
+    def test_compaction_drops_tombstones(self):
+        """测试合并全部 run 并丢弃删除标记"""
+        engine = self.open(compaction_trigger=100)
+        for i in range(32):
+            engine.insert(f"key{i:02d}", i)
+        for i in range(0, 32, 2):
+            engine.delete(f"key{i:02d}")
+        engine.flush()
+        old_paths = [run.path for run in engine.runs]
+        self.assertGreater(len(old_paths), 1)
+        
+        expected = engine.get_all()
+        self.assertTrue(engine.compact())
+        self.assertEqual(len(engine.runs), 1)
+        self.assertEqual(engine.runs[0].count, 16)
+        self.assertEqual(engine.get_all(), expected)
+        self.assertFalse(any(os.path.exists(path) for path in old_paths))
+        self.assertEqual(self.open().get_all(), expected)
+    
+    def test_reopen_after_compaction_before_flush(self):
+        """测试合并时 memtable 中还有键，重新打开后数量不重复计入"""
+        engine = self.open(compaction_trigger=100)
+        for i in range(16):
+            engine.insert(f"key{i:02d}", i)
+        engine.insert("new0", 0)
+        engine.insert("new1", 1)
+        engine.delete("key00")
+        self.assertGreater(engine.memtable.size(), 0)
+        self.assertTrue(engine.compact())
+        expected = engine.get_all()
+        self.assertEqual(engine.size(), 17)
+        engine.close()
+        
+        reopened = self.open()
+        self.assertEqual(reopened.size(), 17)
+        self.assertEqual(reopened.get_all(), expected)
+    
+    def test_background_compaction(self):
+        """测试 run 数量达到阈值时后台合并"""
+        engine = self.open(compaction_trigger=3, background_compaction=True)
+        for i in range(40):
+            engine.insert(f"key{i:02d}", i)
+        deadline = time.time() + 5
+        while len(engine.runs) > 2 and time.time() < deadline:
+            time.sleep(0.01)
+        engine.close()
+        self.assertLessEqual(len(engine.runs), 2)
+        self.assertEqual(engine.size(), 40)
+        self.assertEqual(self.open().get_all(), [(f"key{i:02d}", i) for i in range(40)])
+    
+    def test_random_operations_match_model(self):
+        """测试随机操作与字典模型一致（含落盘、合并和重启）"""
+        rng = random.Random(3)
+        engine = self.open(compaction_trigger=4)
+        model = {}
+        for step in range(3000):
+            key = f"k{rng.randrange(200):03d}"
+            op = rng.random()
+            if op < 0.5:
+                self.assertEqual(engine.upsert(key, step), key not in model)
+                model[key] = step
+            elif op < 0.75:
+                self.assertEqual(engine.delete(key), model.pop(key, None) is not None)
+            else:
+                self.assertEqual(engine.search(key), model.get(key))
+            if step % 500 == 499:
+                engine.close()
+                engine = self.open(compaction_trigger=4)
+        self.assertEqual(engine.size(), len(model))
+        self.assertEqual(engine.get_all(), sorted(model.items()))
+    
+    def test_import_sbt_snapshot(self):
+        """测试打开SBT引擎的数据文件时导入为 run"""
+        with open(self.test_file, 'wb') as f:
+            pickle.dump({"format": 2, "seq": 5, "items": [("a", 1), ("b", 2)]}, f)
+        engine = self.open()
+        self.assertEqual(engine.get_all(), [("a", 1), ("b", 2)])
+        self.assertEqual(engine.last_sequence(), 5)
+        self.assertEqual(len(engine.runs), 1)
+        self.assertEqual(self.open().size(), 2)
+    
+    def test_replace_all(self):
+        """测试批量替换直接写成一个 run"""
+        engine = self.open()
+        for i in range(20):
+            engine.insert(f"key{i:02d}", i)
+        _, version = engine.search_with_version("key02")
+        
+        items = [("a", 1), ("key02", 2)]
+        engine.replace_all(items)
+        self.assertEqual(len(engine.runs), 1)
+        self.assertEqual(engine.memtable.size(), 0)
+        self.assertEqual(engine.get_all(), items)
+        # 替换前读到的版本号失效
+        self.assertFalse(engine.compare_and_swap("key02", version, "x"))
+        self.assertEqual(self.open().get_all(), items)
+    
+    def test_clear_keeps_sequence(self):
+        """测试清空后重新打开序列号继续递增，清空前取得的 run 仍可读取"""
+        engine = self.open()
+        for i in range(20):
+            engine.insert(f"key{i:02d}", i)
+        runs = list(engine.runs)
+        seq = engine.last_sequence()
+        engine.clear()
+        self.assertEqual(runs[-1].get("key00")[0], 0)
+        
+        store_id = engine.store_id()
+        engine = self.open()
+        self.assertEqual(engine.store_id(), store_id)
+        self.assertEqual(engine.size(), 0)
+        self.assertGreater(engine.last_sequence(), seq)
+        engine.insert("a", 1)
+        self.assertGreater(engine.search_with_version("a")[1], seq)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存统计与内存预算测试
+"""
+
+import unittest
+import contextlib
+import io
+import os
+import pickle
+import sys
+import tracemalloc
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.interfaces import Task
+from core.memory import (MemoryBudget, SpilledValue, allocation_report, deep_sizeof, format_size,
+                         parse_size, start_tracing, stop_tracing, top_allocations, tree_memory)
+from core.storage_adapter import TaskStorageAdapter
+from core.task_codec import encode_task
+from sbt_storage_engine import SBTStorageEngine
+from storage.engines import INDEXES
+from storage.lsm_engine import LSMEngineAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+def task_items(count: int) -> list:
+    """按键有序的任务记录"""
+    return [(f"task:task-{i:08x}", encode_task(Task(f"task-{i:08x}", f"任务 {i}", False,
+                                                   datetime(2026, 10, 19))))
+            for i in range(count)]
+
+
+class TestDeepSizeof(unittest.TestCase):
+    """对象大小估算测试"""
+    
+    def test_shared_objects_counted_once(self):
+        """测试共享对象只计一次"""
+        text = "x" * 1000
+        single = deep_sizeof([text])
+        self.assertGreater(single, 1000)
+        self.assertEqual(deep_sizeof([text, text]), single + 8)
+        
+        seen = set()
+        deep_sizeof(text, seen)
+        self.assertLess(deep_sizeof([text], seen), 100)
+    
+    def test_slots_and_dicts(self):
+        """测试遍历 __slots__ 和 __dict__，跳过类型"""
+        value = SpilledValue(None, 10 ** 20, 10 ** 21)
+        self.assertGreater(deep_sizeof(value), sys.getsizeof(value) + 2 * sys.getsizeof(0))
+        self.assertGreater(deep_sizeof({"a": [1.5, "b" * 100]}), 100)
+        self.assertEqual(deep_sizeof(int), 0)
+    
+    def test_sizes(self):
+        """测试大小解析和格式化"""
+        self.assertEqual(parse_size("512MB"), 512 * 1024 ** 2)
+        self.assertEqual(parse_size("1.5g"), 3 * 1024 ** 3 // 2)
+        self.assertEqual(parse_size("4096"), 4096)
+        for text in ("", "12XB", "-1M", "0"):
+            with self.assertRaises(ValueError, msg=text):
+                parse_size(text)
+        self.assertEqual(format_size(512), "512B")
+        self.assertEqual(format_size(3 * 1024 ** 2), "3.0MB")
+    
+    def test_tracemalloc(self):
+        """测试分配诊断"""
+        start_tracing()
+        try:
+            blocks = [bytearray(4096) for _ in range(100)]
+            self.assertTrue(top_allocations(5))
+            self.assertIn("峰值", allocation_report(5))
+            del blocks
+        finally:
+            stop_tracing()
+        self.assertEqual(top_allocations(), [])
+
+
+class TestMemoryUsage(unittest.TestCase):
+    """内存统计测试"""
+    
+    def test_tree_breakdown(self):
+        """测试各内存索引的分项统计"""
+        items = task_items(200)
+        for name, factory in INDEXES.items():
+            with self.subTest(index=name):
+                tree = factory()
+                tree.load(items)
+                usage = tree_memory(tree)
+                self.assertEqual(usage["items"], 200)
+                self.assertEqual(usage["keys"], sum(sys.getsizeof(key) for key, _ in items))
+                self.assertGreater(usage["values"], usage["keys"])
+                self.assertGreater(usage["nodes"], 0)
+                self.assertEqual(usage["total"], usage["nodes"] + usage["keys"] + usage["values"])
+    
+    def test_engines(self):
+        """测试存储引擎和任务仓库的内存统计"""
+        engine = SBTEngineAdapter("test_memory.dat")
+        lsm = LSMEngineAdapter("test_memory_lsm.dat")
+        try:
+            for storage in (engine, lsm):
+                repository = TaskStorageAdapter(storage)
+                service = TodoService(repository)
+                for i in range(20):
+                    service.create_task(f"任务 {i}")
+                service.search_tasks("任务")
+                
+                usage = repository.memory_usage()
+                self.assertEqual(usage["storage"]["items"], 20)
+                self.assertGreater(usage["index"], 0)
+                self.assertEqual(usage["schedule_index"], 0)  # 尚未构建
+                self.assertGreater(usage["total"], usage["storage"]["total"])
+                repository.drop_index()
+            
+            with self.assertRaises(ValueError):
+                LSMEngineAdapter("test_memory_lsm.dat", memory_budget=1024)
+        finally:
+            engine.clear()
+            lsm.clear()
+            lsm.close()
+            for path in (engine.data_file, lsm.data_file):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def test_index_shares_record_ids(self):
+        """测试派生索引引用记录中的任务ID，不另存副本"""
+        engine = SBTEngineAdapter("test_memory.dat")
+        try:
+            repository = TaskStorageAdapter(engine)
+            TodoService(repository).create_task("任务")
+            (task_id, record), = repository._task_items()
+            self.assertIs(task_id, record[1])
+            self.assertIs(engine.get_all()[0][1][1], record[1])
+        finally:
+            engine.clear()
+            os.remove(engine.data_file)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """内存预算测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_memory_budget.dat"
+        self.items = task_items(500)
+    
+    def tearDown(self):
+        """测试后清理"""
+        SBTStorageEngine(self.test_file).clear()
+        for path in (self.test_file, f"{self.test_file}.spill"):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def open_engine(self, limit: int, policy: str, check_interval: int = 1) -> SBTStorageEngine:
+        engine = SBTStorageEngine(self.test_file, memory_budget=limit, budget_policy=policy)
+        engine.memory_budget.check_interval = check_interval
+        return engine
+    
+    def test_budget_checks(self):
+        """测试统计间隔和超出判定"""
+        budget = MemoryBudget(1000, "warn")
+        self.assertFalse(any(budget.tick(10) for _ in range(999)))
+        self.assertTrue(budget.tick(10))
+        self.assertTrue(budget.record(2000))
+        self.assertFalse(budget.record(3000))
+        self.assertFalse(budget.record(500))
+        self.assertTrue(budget.record(2000))
+        with self.assertRaises(ValueError):
+            MemoryBudget(1000, "evict")
+    
+    def test_warn(self):
+        """测试超出预算时告警一次"""
+        engine = self.open_engine(10 * 1024, "warn")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            engine.replace_all(self.items)
+            engine.upsert("task:zzz", self.items[0][1])
+            engine.upsert("task:zzz", self.items[1][1])
+        self.assertEqual(output.getvalue().count("内存超出预算"), 1)
+        self.assertTrue(engine.memory_budget.exceeded)
+        self.assertEqual(engine.memory_usage()["spilled"], 0)
+        
+        # 打开时即统计
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            SBTStorageEngine(self.test_file, memory_budget=10 * 1024)
+        self.assertIn("内存超出预算", output.getvalue())
+    
+    def test_spill(self):
+        """测试冷数据溢出到磁盘后读写透明"""
+        engine = SBTStorageEngine(self.test_file)
+        engine.replace_all(self.items)
+        full = engine.memory_usage()["total"]
+        
+        engine = self.open_engine(full * 3 // 4, "spill")
+        engine.upsert("task:zzz", self.items[0][1])
+        usage = engine.memory_usage()
+        self.assertGreater(usage["spilled"], 0)
+        self.assertGreater(usage["spill_file_bytes"], 0)
+        self.assertLessEqual(usage["total"], full * 3 // 4)
+        self.assertTrue(os.path.exists(f"{self.test_file}.spill"))
+        
+        # 最久未写入的值先溢出，版本号不变
+        key, record = self.items[0]
+        self.assertIsInstance(engine.tree.search(key), SpilledValue)
+        self.assertEqual(engine.search(key), record)
+        self.assertEqual(engine.search_with_version(key), (record, engine.tree.base_version))
+        self.assertEqual(engine.get_all()[:len(self.items)], self.items)
+        self.assertEqual(engine.update_with(key, lambda old: old[:2] + ("新",) + old[3:])[2], "新")
+        
+        # 快照保存的是值本身
+        engine.save_to_disk()
+        self.assertEqual(dict(SBTStorageEngine(self.test_file).get_all())[self.items[1][0]],
+                         self.items[1][1])
+        
+        engine.clear()
+        self.assertFalse(os.path.exists(f"{self.test_file}.spill"))
+    
+    def test_save_streams_spilled_values(self):
+        """测试保存快照时逐个读回溢出的值，峰值内存不随溢出的数据量增长"""
+        items = [(f"key{i:05d}", f"{i}" + "x" * 1000) for i in range(2000)]
+        engine = SBTStorageEngine(self.test_file)
+        engine.replace_all(items)
+        engine = self.open_engine(engine.memory_usage()["total"] // 10, "spill")
+        engine.upsert("zzz", "z")
+        spilled = engine.memory_usage()["spill_file_bytes"]
+        self.assertGreater(spilled, 1024 * 1024)
+        
+        start_tracing()
+        try:
+            engine.save_to_disk()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            stop_tracing()
+        self.assertLess(peak, spilled / 4)
+        self.assertEqual(SBTStorageEngine(self.test_file).get_all(), items + [("zzz", "z")])
+        
+        # 压缩快照同样按块读回
+        engine.compression = ("zlib", 1)
+        engine.save_to_disk()
+        self.assertEqual(SBTStorageEngine(self.test_file).get_all(), items + [("zzz", "z")])
+    
+    def test_spill_file_rewritten(self):
+        """测试溢出文件中的旧值被回收"""
+        engine = SBTStorageEngine(self.test_file)
+        engine.replace_all(self.items)
+        engine = self.open_engine(engine.memory_usage()["total"] // 2, "spill", check_interval=100)
+        with engine.batch():
+            for _ in range(5):
+                for key, value in self.items:
+                    engine.upsert(key, value)
+        # 五轮覆盖写入都溢出过，不回收时文件会超过全部值序列化后的数倍
+        values = len(pickle.dumps([value for _, value in self.items], protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertLess(engine.memory_usage()["spill_file_bytes"], 3 * values)
+        self.assertEqual(engine.get_all(), self.items)
+
+
+if __name__ == "__main__":
+    unittest.main()
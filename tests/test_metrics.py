@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标采集测试
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.metrics import MetricsRegistry, OperationMetrics, metrics
+from core.storage_adapter import TaskStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """指标注册表测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.registry = MetricsRegistry(enabled=True)
+    
+    def test_counter_and_gauge(self):
+        """测试计数器和仪表"""
+        counter = self.registry.counter("ops_total", "操作次数", op="insert")
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(counter.value, 3)
+        self.assertIs(self.registry.counter("ops_total", op="insert"), counter)
+        
+        gauge = self.registry.gauge("keys")
+        gauge.set(5)
+        gauge.dec()
+        self.assertEqual(gauge.value, 4)
+        gauge.set_function(lambda: 42)
+        self.assertEqual(gauge.value, 42)
+    
+    def test_disabled_registry_records_nothing(self):
+        """测试停用时不记录"""
+        registry = MetricsRegistry(enabled=False)
+        counter = registry.counter("ops_total")
+        histogram = registry.histogram("latency_seconds")
+        counter.inc()
+        histogram.observe(0.5)
+        with histogram.time():
+            pass
+        self.assertEqual(counter.value, 0)
+        self.assertEqual(histogram.count, 0)
+    
+    def test_histogram_percentiles(self):
+        """测试直方图分位数误差"""
+        histogram = self.registry.histogram("size_bytes", scale=1)
+        for value in range(1, 10001):
+            histogram.observe(value)
+        
+        self.assertEqual(histogram.count, 10000)
+        self.assertEqual(histogram.min, 1)
+        self.assertEqual(histogram.max, 10000)
+        for q, expected in [(50, 5000), (90, 9000), (99, 9900)]:
+            estimate = histogram.percentile(q)
+            self.assertLessEqual(abs(estimate - expected) / expected, 0.07)
+        self.assertEqual(histogram.percentile(100), 10000)
+    
+    def test_prometheus_exposition(self):
+        """测试Prometheus文本导出"""
+        self.registry.counter("ops_total", "操作次数", op="insert").inc()
+        histogram = self.registry.histogram("latency_seconds", "延迟")
+        histogram.observe(0.001)
+        histogram.observe(0.002)
+        
+        text = self.registry.render_prometheus()
+        self.assertIn("# TYPE ops_total counter", text)
+        self.assertIn('ops_total{op="insert"} 1', text)
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("latency_seconds_count 2", text)
+    
+    def test_operation_metrics_counts_errors(self):
+        """测试操作统计记录错误"""
+        ops = OperationMetrics("demo", registry=self.registry)
+        with ops.track("work"):
+            pass
+        with self.assertRaises(ValueError):
+            with ops.track("work"):
+                raise ValueError("boom")
+        
+        self.assertEqual(self.registry.get("demo_operations_total", op="work").value, 2)
+        self.assertEqual(self.registry.get("demo_operation_errors_total", op="work").value, 1)
+        self.assertEqual(self.registry.get("demo_operation_duration_seconds", op="work").count, 2)
+
+
+class TestStackInstrumentation(unittest.TestCase):
+    """存储和服务层指标接入测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_metrics.dat"
+        metrics.enable()
+        metrics.reset()
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.service = TodoService(TaskStorageAdapter(self.engine))
+    
+    def tearDown(self):
+        """测试后清理"""
+        metrics.disable()
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_operations_are_recorded(self):
+        """测试各层操作都被记录"""
+        task = self.service.create_task("写报告")
+        self.service.toggle_task(task.id)
+        self.service.get_all_tasks()
+        
+        self.assertEqual(metrics.get("todo_service_operations_total", op="toggle_task").value, 1)
+        self.assertEqual(metrics.get("task_repository_operations_total", op="save").value, 1)
+        self.assertEqual(metrics.get("storage_operations_total", engine="sbt", op="insert").value, 1)
+        self.assertEqual(metrics.get("storage_operations_total", engine="sbt", op="update_with").value, 1)
+        self.assertGreater(metrics.get("sbt_save_bytes").count, 0)
+        self.assertEqual(metrics.get("storage_keys", engine="sbt", file=self.test_file).value, 1)
+        self.assertIn("todo_service_operation_duration_seconds_bucket", metrics.render_prometheus())
+
+
+if __name__ == "__main__":
+    unittest.main()
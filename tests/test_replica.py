@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+只读副本测试
+"""
+
+import unittest
+import multiprocessing
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.storage_adapter import TaskStorageAdapter
+from storage.replica import ReadOnlyReplicaError
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+def _count_tasks(data_file, queue):
+    """子进程：以只读副本打开并统计任务数"""
+    follower = SBTEngineAdapter(data_file, follower=True, poll_interval=0)
+    queue.put(len(TodoService(TaskStorageAdapter(follower)).get_all_tasks()))
+    follower.close()
+
+
+class TestReplica(unittest.TestCase):
+    """只读副本测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_replica.dat"
+        self.primary = SBTEngineAdapter(self.test_file, replication_log=True)
+        self.followers = []
+    
+    def tearDown(self):
+        """测试后清理"""
+        for follower in self.followers:
+            follower.close()
+        self.primary.clear()
+        for suffix in ("", ".log", ".idx", ".due"):
+            if os.path.exists(self.test_file + suffix):
+                os.remove(self.test_file + suffix)
+    
+    def _follower(self, poll_interval=0):
+        follower = SBTEngineAdapter(self.test_file, follower=True, poll_interval=poll_interval)
+        self.followers.append(follower)
+        return follower
+    
+    def test_incremental_apply(self):
+        """测试副本按日志增量追赶，不重新加载快照"""
+        self.primary.insert("a", 1)
+        follower = self._follower()
+        self.assertEqual(follower.search("a"), 1)
+        loads = follower.engine.snapshot_loads
+        
+        self.primary.insert("b", 2)
+        self.primary.update("a", 10)
+        self.assertEqual(follower.refresh(), 2)
+        self.assertEqual(follower.get_all(), [("a", 10), ("b", 2)])
+        self.assertEqual(follower.engine.snapshot_loads, loads)
+        self.assertEqual(follower.last_sequence(), self.primary.last_sequence())
+        self.assertEqual(follower.search_with_version("a"), self.primary.search_with_version("a"))
+    
+    def test_batch_delete_clear(self):
+        """测试批量写入、删除和清空"""
+        self.primary.insert("a", 1)
+        follower = self._follower()
+        with self.primary.batch():
+            for i in range(5):
+                self.primary.insert(f"k{i}", i)
+            self.primary.delete("a")
+        follower.refresh()
+        self.assertEqual(follower.size(), 5)
+        self.assertIsNone(follower.search("a"))
+        
+        self.primary.clear()
+        self.primary.insert("z", 26)
+        follower.refresh()
+        self.assertEqual(follower.get_all(), [("z", 26)])
+    
+    def test_rotation_reloads_snapshot(self):
+        """测试日志轮换后重新加载快照"""
+        self.primary.insert("a", 1)
+        follower = self._follower()
+        loads = follower.engine.snapshot_loads
+        self.primary.replace_all([("x", 1), ("y", 2)])
+        self.primary.insert("z", 3)
+        follower.refresh()
+        self.assertEqual([k for k, _ in follower.get_all()], ["x", "y", "z"])
+        self.assertEqual(follower.engine.snapshot_loads, loads + 1)
+    
+    def test_divergent_log_reloads_snapshot(self):
+        """测试主库回到更早的序列号或数据文件被重建后重新加载快照"""
+        with self.primary.batch():
+            for i in range(5):
+                self.primary.insert(f"old{i}", i)
+        follower = self._follower()
+        self.assertEqual(follower.last_sequence(), 5)
+        
+        # 重建后的主库在相同序列号处轮换日志，只有存储ID不同
+        self.primary.close()
+        for suffix in ("", ".log"):
+            os.remove(self.test_file + suffix)
+        self.primary = SBTEngineAdapter(self.test_file, replication_log=True)
+        with self.primary.batch():
+            for i in range(5):
+                self.primary.insert(f"new{i}", i)
+        self.assertEqual(follower.refresh(), -1)
+        self.assertEqual(follower.get_all(), self.primary.get_all())
+        self.assertEqual(follower.store_id(), self.primary.store_id())
+        
+        # 序列号回退
+        self.primary.close()
+        for suffix in ("", ".log"):
+            os.remove(self.test_file + suffix)
+        self.primary = SBTEngineAdapter(self.test_file, replication_log=True)
+        self.primary.insert("a", 1)
+        self.assertEqual(follower.refresh(), -1)
+        self.assertEqual(follower.get_all(), [("a", 1)])
+        self.assertEqual(follower.last_sequence(), 1)
+    
+    def test_writes_rejected(self):
+        """测试副本拒绝写入"""
+        follower = self._follower()
+        self.assertTrue(follower.read_only)
+        self.assertFalse(self.primary.read_only)
+        with self.assertRaises(ReadOnlyReplicaError):
+            follower.insert("a", 1)
+        with self.assertRaises(ReadOnlyReplicaError):
+            follower.clear()
+        with self.assertRaises(ReadOnlyReplicaError):
+            follower.batch()
+        with self.assertRaises(NotImplementedError):
+            self.primary.refresh()
+    
+    def test_task_repository_on_follower(self):
+        """测试在副本上读取任务和检索，不写入索引文件"""
+        service = TodoService(TaskStorageAdapter(self.primary))
+        service.create_tasks(["买牛奶", "写报告"])
+        follower = self._follower()
+        repo = TaskStorageAdapter(follower)
+        self.assertTrue(repo.read_only)
+        self.assertEqual([t.text for t in repo.search_tasks("牛奶")], ["买牛奶"])
+        repo.flush_index()
+        self.assertFalse(os.path.exists(self.test_file + ".idx"))
+        
+        service.create_task("买面包")
+        follower.refresh()
+        self.assertEqual(len(repo.get_all_tasks()), 3)
+        self.assertEqual([t.text for t in repo.search_tasks("面包")], ["买面包"])
+    
+    def test_snapshot_polling_without_log(self):
+        """测试主库未开启复制日志时按快照文件变化重新加载"""
+        plain = SBTEngineAdapter(self.test_file + ".plain")
+        try:
+            plain.insert("a", 1)
+            follower = SBTEngineAdapter(plain.data_file, follower=True, poll_interval=0)
+            self.followers.append(follower)
+            self.assertEqual(follower.refresh(), 0)
+            time.sleep(0.01)
+            plain.insert("b", 2)
+            self.assertEqual(follower.refresh(), -1)
+            self.assertEqual(follower.get_all(), [("a", 1), ("b", 2)])
+        finally:
+            plain.clear()
+            os.remove(plain.data_file)
+    
+    def test_replication_lag(self):
+        """测试复制延迟"""
+        self.primary.insert("a", 1)
+        follower = self._follower()
+        self.assertEqual(follower.replication_lag()["pending_bytes"], 0)
+        self.primary.insert("b", 2)
+        lag = follower.replication_lag()
+        self.assertGreater(lag["pending_bytes"], 0)
+        self.assertGreaterEqual(lag["seconds"], 0)
+        follower.refresh()
+        lag = follower.replication_lag()
+        self.assertEqual(lag["pending_bytes"], 0)
+        self.assertEqual(lag["applied_seq"], self.primary.last_sequence())
+    
+    def test_background_poll(self):
+        """测试后台线程自动追赶"""
+        follower = self._follower(poll_interval=0.01)
+        self.primary.insert("a", 1)
+        deadline = time.time() + 2
+        while follower.search("a") is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(follower.search("a"), 1)
+    
+    @unittest.skipUnless(hasattr(os, "fork"), "需要 fork")
+    def test_follower_in_worker_process(self):
+        """测试工作进程以副本打开主库数据"""
+        service = TodoService(TaskStorageAdapter(self.primary))
+        service.create_tasks(["a", "b", "c"])
+        ctx = multiprocessing.get_context("fork")
+        queue = ctx.Queue()
+        worker = ctx.Process(target=_count_tasks, args=(self.test_file, queue))
+        worker.start()
+        self.assertEqual(queue.get(timeout=10), 3)
+        worker.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,15 +10,18 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from storage.sbt_engine import SBTEngineAdapter
+from sbt_storage_engine import SBTTree
 
 
 class TestSBTEngine(unittest.TestCase):
-    """SBT存储引擎测试"""
+    """SBT存储引擎测试（其它引擎复用为一致性测试，见 test_engines.py）"""
+    
+    engine_class = SBTEngineAdapter
     
     def setUp(self):
         """测试前准备"""
         self.test_file = "test_sbt.dat"
-        self.engine = SBTEngineAdapter(self.test_file)
+        self.engine = self.engine_class(self.test_file)
     
     def tearDown(self):
         """测试后清理"""
@@ -88,6 +91,160 @@ class TestSBTEngine(unittest.TestCase):
         self.engine.clear()
         self.assertEqual(self.engine.size(), 0)
         self.assertIsNone(self.engine.search("key1"))
+    
+    def test_delete_non_root(self):
+        """测试删除非根节点时返回值正确"""
+        for key in ["key1", "key2", "key3"]:
+            self.engine.insert(key, key)
+        self.assertTrue(self.engine.delete("key3"))
+        self.assertFalse(self.engine.delete("key3"))
+        self.assertEqual(self.engine_class(self.test_file).size(), 2)
+    
+    def test_batch(self):
+        """测试批量写入只在结束时保存"""
+        with self.engine.batch():
+            for i in range(10):
+                self.engine.insert(f"key{i}", i)
+            self.engine.delete("key0")
+            self.assertFalse(os.path.exists(self.test_file))
+            self.assertEqual(self.engine.search("key5"), 5)
+        
+        reopened = self.engine_class(self.test_file)
+        self.assertEqual(reopened.size(), 9)
+        self.assertEqual(reopened.last_sequence(), self.engine.last_sequence())
+
+
+
+class TestConditionalWrites(unittest.TestCase):
+    """条件写入测试"""
+    
+    engine_class = SBTEngineAdapter
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_sbt_cas.dat"
+        self.engine = self.engine_class(self.test_file)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_upsert_and_insert_if_absent(self):
+        """测试插入或覆盖与不存在时插入"""
+        self.assertTrue(self.engine.upsert("key1", 1))
+        self.assertFalse(self.engine.upsert("key1", 2))
+        self.assertFalse(self.engine.insert_if_absent("key1", 3))
+        self.assertTrue(self.engine.insert_if_absent("key2", 4))
+        self.assertEqual(self.engine.get_all(), [("key1", 2), ("key2", 4)])
+        self.assertEqual(self.engine.size(), 2)
+    
+    def test_compare_and_swap(self):
+        """测试按版本号比较并写入"""
+        self.assertTrue(self.engine.compare_and_swap("key1", 0, "a"))
+        self.assertFalse(self.engine.compare_and_swap("key1", 0, "b"))
+        
+        value, version = self.engine.search_with_version("key1")
+        self.assertEqual((value, version), ("a", self.engine.last_sequence()))
+        self.engine.insert("other", "x")
+        self.assertTrue(self.engine.compare_and_swap("key1", version, "b"))
+        self.assertFalse(self.engine.compare_and_swap("key1", version, "c"))
+        self.assertEqual(self.engine.search("key1"), "b")
+        self.assertFalse(self.engine.compare_and_swap("missing", 1, "d"))
+        
+        # 重启后版本号为快照序列号，旧版本号不会误匹配
+        _, version = self.engine.search_with_version("key1")
+        reopened = self.engine_class(self.test_file)
+        self.assertEqual(reopened.search_with_version("other")[1], reopened.last_sequence())
+        self.assertTrue(reopened.compare_and_swap("key1", reopened.last_sequence(), "e"))
+    
+    def test_update_with(self):
+        """测试原子读取-修改-写入"""
+        self.engine.insert("counter", 0)
+        self.assertEqual(self.engine.update_with("counter", lambda v: v + 1), 1)
+        self.assertIsNone(self.engine.update_with("missing", lambda v: v + 1))
+        seq = self.engine.last_sequence()
+        self.assertIsNone(self.engine.update_with("counter", lambda v: None))
+        self.assertEqual(self.engine.last_sequence(), seq)
+
+
+class TestSBTStartup(unittest.TestCase):
+    """启动加载测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_sbt_startup.dat"
+        engine = SBTEngineAdapter(self.test_file)
+        for i in range(200):
+            engine.insert(f"key{i:03d}", i)
+    
+    def tearDown(self):
+        """测试后清理"""
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def _check_balance(self, tree, node):
+        """校验子树大小和SBT性质"""
+        if node is None:
+            return
+        size = tree._get_size
+        self.assertEqual(node.size, 1 + size(node.left) + size(node.right))
+        if node.left:
+            self.assertLessEqual(size(node.left.left), size(node.right))
+            self.assertLessEqual(size(node.left.right), size(node.right))
+        if node.right:
+            self.assertLessEqual(size(node.right.right), size(node.left))
+            self.assertLessEqual(size(node.right.left), size(node.left))
+        self._check_balance(tree, node.left)
+        self._check_balance(tree, node.right)
+    
+    def test_build_from_sorted_is_balanced(self):
+        """测试线性构建的树满足SBT性质"""
+        for count in [0, 1, 2, 5, 17, 100, 1000]:
+            tree = SBTTree()
+            tree.load([(f"k{i:05d}", i) for i in range(count)])
+            self.assertEqual(tree.size(), count)
+            self._check_balance(tree, tree.root)
+            tree.insert("k99999", -1)
+            tree.delete("k00000")
+            self._check_balance(tree, tree.root)
+    
+    def test_eager_reload(self):
+        """测试同步重新加载"""
+        engine = SBTEngineAdapter(self.test_file)
+        self.assertEqual(engine.size(), 200)
+        self.assertEqual(engine.search("key150"), 150)
+    
+    def test_lazy_start(self):
+        """测试延迟加载期间读写"""
+        engine = SBTEngineAdapter(self.test_file, lazy=True)
+        self.assertEqual(engine.search("key042"), 42)
+        self.assertIsNone(engine.search("missing"))
+        self.assertEqual(engine.size(), 200)
+        
+        engine.insert("key200", 200)
+        self.assertTrue(engine.loaded)
+        self.assertEqual(engine.size(), 201)
+        self.assertEqual(engine.search("key200"), 200)
+    
+    def test_lazy_start_without_file(self):
+        """测试数据文件不存在时的延迟加载"""
+        os.remove(self.test_file)
+        engine = SBTEngineAdapter(self.test_file, lazy=True)
+        self.assertTrue(engine.wait_until_loaded(5))
+        self.assertEqual(engine.size(), 0)
+    
+    def test_tree_update_without_rebalance(self):
+        """测试更新已有键不触发旋转"""
+        tree = SBTTree()
+        for i in range(100):
+            tree.insert(f"key{i:03d}", i)
+        rotations = tree.rotations
+        self.assertTrue(tree.update("key050", -1))
+        self.assertFalse(tree.insert_if_absent("key051", -1))
+        self.assertEqual(tree.rotations, rotations)
+        self.assertEqual(tree.size(), 100)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+截止时间、提醒索引与提醒调度测试
+"""
+
+import unittest
+import asyncio
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.schedule_index import ScheduleIndex, TimeIndex
+from core.storage_adapter import TaskStorageAdapter
+from services.reminder_scheduler import ReminderScheduler
+from services.todo_service import TodoService
+from storage.sbt_engine import SBTEngineAdapter
+
+
+class TestTimeIndex(unittest.TestCase):
+    """有序时间索引"""
+    
+    def test_between(self):
+        """测试区间查询与更新"""
+        index = TimeIndex()
+        for key, when in (("a", 30), ("b", 10), ("c", 20), ("d", 20)):
+            index.set(key, when)
+        self.assertEqual(index.between(10, 20), ["b", "c", "d"])
+        self.assertEqual(index.between(10, 20, include_start=False), ["c", "d"])
+        self.assertEqual(index.first_after(20), 30)
+        self.assertIsNone(index.first_after(30))
+        
+        index.set("b", 40)
+        index.set("c", None)
+        self.assertEqual(index.between(0, 100), ["d", "a", "b"])
+        self.assertEqual(len(index), 3)
+    
+    def test_build_matches_incremental(self):
+        """测试批量构建与逐个添加结果一致"""
+        now = datetime(2026, 10, 19, 9, 0)
+        items = [(f"t{i}", {"due_at": (now + timedelta(minutes=i % 7)).isoformat(),
+                            "remind_at": None if i % 2 else now.isoformat()}) for i in range(20)]
+        built = ScheduleIndex.build(items)
+        added = ScheduleIndex()
+        for key, data in items:
+            added.add(key, data)
+        self.assertEqual(built.due._entries, added.due._entries)
+        self.assertEqual(built.remind._entries, added.remind._entries)
+
+
+class TestDueTasks(unittest.TestCase):
+    """任务截止时间"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_schedule.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+        self.now = datetime(2026, 10, 19, 9, 0)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        self.repository.drop_index()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def add(self, text: str, due_in: timedelta, remind_in: timedelta = None):
+        """创建带截止时间的任务"""
+        task = self.service.create_task(text)
+        remind_at = self.now + remind_in if remind_in is not None else None
+        return self.service.set_due(task.id, self.now + due_in, remind_at)
+    
+    def test_round_trip(self):
+        """测试截止/提醒时间随任务保存和导出导入"""
+        task = self.add("交报告", timedelta(hours=2), timedelta(hours=1))
+        loaded = self.repository.get_task(task.id)
+        self.assertEqual((loaded.due_at, loaded.remind_at),
+                         (self.now + timedelta(hours=2), self.now + timedelta(hours=1)))
+        
+        stream = io.StringIO()
+        self.service.export_tasks(stream)
+        self.engine.clear()
+        self.service.import_tasks(stream.getvalue().splitlines())
+        self.assertEqual(self.repository.get_task(task.id).due_at, loaded.due_at)
+    
+    def test_get_due_tasks(self):
+        """测试按窗口查询到期任务"""
+        soon = self.add("半小时后", timedelta(minutes=30))
+        later = self.add("两小时后", timedelta(hours=2))
+        self.add("已过期", timedelta(minutes=-5))
+        first = self.add("十分钟后", timedelta(minutes=10))
+        self.service.create_task("没有截止时间")
+        
+        due = self.service.get_due_tasks(timedelta(hours=1), now=self.now)
+        self.assertEqual([t.id for t in due], [first.id, soon.id])
+        
+        self.service.toggle_task(first.id)
+        self.service.set_due(later.id, self.now + timedelta(minutes=50))
+        due = self.service.get_due_tasks(timedelta(hours=1), now=self.now)
+        self.assertEqual([t.id for t in due], [soon.id, later.id])
+        
+        self.service.delete_task(soon.id)
+        self.service.set_due(later.id, None)
+        self.assertEqual(self.service.get_due_tasks(timedelta(hours=1), now=self.now), [])
+    
+    def test_index_persisted_and_caught_up(self):
+        """测试时间索引保存后重新打开，按变更流追平之后的写入"""
+        task = self.add("任务", timedelta(minutes=30))
+        self.service.get_due_tasks(timedelta(hours=1), now=self.now)
+        self.repository.flush_index()
+        self.assertTrue(os.path.exists(self.repository.schedule_file))
+        
+        # 另一个适配器在索引保存之后写入
+        other = TodoService(TaskStorageAdapter(self.engine))
+        extra = other.create_task("之后写入")
+        other.set_due(extra.id, self.now + timedelta(minutes=20))
+        
+        reopened = TodoService(TaskStorageAdapter(self.engine))
+        self.assertEqual([t.id for t in reopened.get_due_tasks(timedelta(hours=1), now=self.now)],
+                         [extra.id, task.id])
+    
+    def test_index_of_recreated_store_rebuilt(self):
+        """测试数据文件重建后序列号恰好相同时不沿用旧的时间索引"""
+        self.add("旧任务", timedelta(minutes=30))
+        self.service.get_due_tasks(timedelta(hours=1), now=self.now)
+        self.repository.flush_index()
+        self.engine.close()
+        os.remove(self.test_file)
+        self.assertTrue(os.path.exists(self.repository.schedule_file))
+        
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+        task = self.add("新任务", timedelta(minutes=40))
+        self.assertEqual([t.id for t in self.service.get_due_tasks(timedelta(hours=1), now=self.now)],
+                         [task.id])
+
+
+class TestReminderScheduler(unittest.TestCase):
+    """提醒调度"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_reminders.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        self.repository.drop_index()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_fires_reminders(self):
+        """测试到期回调，运行中新设置的提醒也能触发，已完成的任务不提醒"""
+        first = self.service.create_task("先提醒")
+        done = self.service.create_task("已完成")
+        later = self.service.create_task("后设置")
+        now = datetime.now()
+        self.service.set_due(first.id, now + timedelta(hours=1), now + timedelta(seconds=0.05))
+        self.service.set_due(done.id, now + timedelta(hours=1), now + timedelta(seconds=0.05))
+        self.service.toggle_task(done.id)
+        
+        async def scenario():
+            fired = []
+            
+            async def callback(task):
+                fired.append(task.text)
+            
+            scheduler = ReminderScheduler(self.repository, callback)
+            runner = asyncio.ensure_future(scheduler.run(since=now))
+            await asyncio.sleep(0.01)
+            # 调度器此时在等待第一个提醒，新的更早的提醒通过变更订阅唤醒它
+            self.service.set_due(later.id, None, datetime.now() + timedelta(seconds=0.02))
+            for _ in range(100):
+                if len(fired) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            runner.cancel()
+            return fired
+        
+        self.assertEqual(asyncio.run(scenario()), ["后设置", "先提醒"])
+
+
+if __name__ == "__main__":
+    unittest.main()
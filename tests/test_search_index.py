@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文检索测试
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.search_index import SearchIndex, tokenize, query_terms, _encode_postings, _decode_postings
+from core.storage_adapter import TaskStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+class TestSearchIndex(unittest.TestCase):
+    """倒排索引测试"""
+    
+    def test_tokenize(self):
+        """测试中英文混合分词"""
+        self.assertEqual(tokenize("测试SBT引擎"), ["测", "试", "测试", "sbt", "引", "擎", "引擎"])
+        self.assertEqual(query_terms("存储引擎"), ["存储", "储引", "引擎"])
+        self.assertEqual(query_terms("优"), ["优"])
+        self.assertEqual(query_terms("Hello, hello world"), ["hello", "world"])
+    
+    def test_postings_round_trip(self):
+        """测试倒排表编解码"""
+        postings = {0: 1, 5: 2, 300: 1, 100000: 7}
+        self.assertEqual(_decode_postings(_encode_postings(postings)), postings)
+    
+    def test_ranked_search(self):
+        """测试检索与排序"""
+        index = SearchIndex.build([
+            ("t1", "完成项目文档"),
+            ("t2", "测试SBT存储引擎"),
+            ("t3", "存储引擎文档和存储引擎测试"),
+            ("t4", "write unit tests"),
+        ])
+        self.assertEqual([k for k, _ in index.search("存储引擎")], ["t3", "t2"])
+        self.assertEqual({k for k, _ in index.search("文档")}, {"t1", "t3"})
+        self.assertEqual([k for k, _ in index.search("Unit")], ["t4"])
+        self.assertEqual(index.search("天气"), [])
+        self.assertEqual(len(index.search("存储引擎", limit=1)), 1)
+        
+        index.remove("t3")
+        self.assertEqual([k for k, _ in index.search("存储引擎")], ["t2"])
+        index.add("t2", "优化天气服务")
+        self.assertEqual(index.search("存储引擎"), [])
+        self.assertEqual([k for k, _ in index.search("天气")], ["t2"])
+    
+    def test_doc_ids_reused(self):
+        """测试反复更新和增删不会让文档号表增长"""
+        index = SearchIndex.build([("a", "编写单元测试"), ("b", "单元测试覆盖率")])
+        postings = index._postings["测试"]
+        for i in range(100):
+            index.add("a", "编写单元测试")
+            index.add("b", f"单元测试覆盖率 {i}")
+            index.remove("c")
+            index.add("c", "测试")
+            index.remove("c")
+        self.assertEqual(len(index._doc_keys), 3)
+        # 词频不变的更新不修改倒排表
+        self.assertIs(index._postings["测试"], postings)
+        self.assertEqual([k for k, _ in index.search("覆盖率 99")], ["b"])
+        self.assertEqual([k for k, _ in index.search("编写")], ["a"])
+        
+        index.add("c", "测试")
+        self.assertEqual(len(index._doc_keys), 3)
+        self.assertEqual({k for k, _ in index.search("测试")}, {"a", "b", "c"})
+    
+    def test_save_and_load(self):
+        """测试压缩持久化"""
+        path = "test_search.idx"
+        index = SearchIndex.build([("a", "编写单元测试"), ("b", "单元测试覆盖率")])
+        index.remove("a")
+        index.add("c", "测试")
+        try:
+            index.save(path, seq=7, store_id="s1")
+            self.assertEqual(SearchIndex.load(path, "s2"), (None, None))
+            loaded, seq = SearchIndex.load(path, "s1")
+            self.assertEqual(seq, 7)
+            self.assertEqual(len(loaded), 2)
+            self.assertEqual(loaded.search("测试"), index.search("测试"))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class TestTaskSearch(unittest.TestCase):
+    """任务检索测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_task_search.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        self.repository.drop_index()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_index_follows_writes(self):
+        """测试索引随增删改更新"""
+        doc = self.service.create_task("完成项目文档")
+        self.service.create_task("测试SBT存储引擎")
+        self.assertEqual([t.text for t in self.service.search_tasks("文档")], ["完成项目文档"])
+        
+        self.service.update_task_text(doc.id, "整理会议纪要")
+        self.assertEqual(self.service.search_tasks("文档"), [])
+        self.assertEqual([t.id for t in self.service.search_tasks("会议")], [doc.id])
+        
+        self.service.delete_task(doc.id)
+        self.assertEqual(self.service.search_tasks("会议"), [])
+        
+        # 绕过仓库直接写存储也能被索引追平
+        self.engine.insert("task:manual", {
+            "id": "manual", "text": "手工写入的文档", "completed": False,
+            "created_at": doc.created_at.isoformat(), "updated_at": None,
+        })
+        self.assertEqual([t.id for t in self.service.search_tasks("文档")], ["manual"])
+    
+    def test_index_persisted_next_to_data_file(self):
+        """测试索引持久化与重启加载"""
+        self.service.create_task("优化天气服务")
+        self.service.search_tasks("天气")
+        self.repository.flush_index()
+        self.assertTrue(os.path.exists(self.test_file + ".idx"))
+        
+        reopened = TaskStorageAdapter(SBTEngineAdapter(self.test_file))
+        self.assertEqual([t.text for t in reopened.search_tasks("天气")], ["优化天气服务"])
+        
+        # 索引文件过期（重启后又有写入）时自动重建
+        self.service.create_task("天气预报接口")
+        stale = TaskStorageAdapter(SBTEngineAdapter(self.test_file))
+        self.assertEqual(len(stale.search_tasks("天气")), 2)
+    
+    def test_index_of_recreated_store_rebuilt(self):
+        """测试数据文件重建后序列号恰好相同时不沿用旧索引"""
+        self.service.create_task("apple")
+        self.service.create_task("banana")
+        self.service.search_tasks("apple")
+        self.repository.flush_index()
+        self.engine.close()
+        os.remove(self.test_file)
+        self.assertTrue(os.path.exists(self.test_file + ".idx"))
+        
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+        self.service.create_task("cherry")
+        self.service.create_task("durian")
+        self.assertEqual([t.text for t in self.service.search_tasks("cherry")], ["cherry"])
+        self.assertEqual(self.service.search_tasks("apple"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩快照编码测试
+"""
+
+import unittest
+import glob
+import os
+import pickle
+import sys
+import zlib
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.snapshot_codec import decode_snapshot, encode_snapshot, is_compressed, parse_compression
+from sbt_storage_engine import SBTStorageEngine
+from storage.lsm_engine import LSMStorageEngine
+from storage.sbt_engine import SBTEngineAdapter
+from tests import test_sbt_engine
+
+
+def make_tasks(count: int) -> list:
+    """与任务存储相同形式的键值对"""
+    return [(f"task:task-{i:08x}", {
+        "id": f"task-{i:08x}",
+        "text": f"任务 {i}",
+        "completed": i % 3 == 0,
+        "created_at": "2026-10-19T09:00:00.123456",
+        "updated_at": None,
+    }) for i in range(count)]
+
+
+class ZlibSBTEngineAdapter(SBTEngineAdapter):
+    """压缩保存的SBT引擎"""
+    
+    def __init__(self, data_file: str, lazy: bool = False):
+        super().__init__(data_file, lazy=lazy, compression="zlib:1")
+
+
+class TestCompressedSBTEngine(test_sbt_engine.TestSBTEngine):
+    """压缩保存时的接口测试"""
+    engine_class = ZlibSBTEngineAdapter
+
+
+class TestSnapshotCodec(unittest.TestCase):
+    """编解码测试"""
+    
+    def test_round_trip(self):
+        """测试混合取值的往返编码"""
+        items = make_tasks(10) + [
+            ("user:张三", {"name": "张三", "age": 25}),
+            ("user:李四", {"age": 30, "name": "李四"}),
+            ("x", [1, 2, 3]),
+            ("y", None),
+            ("z", {}),
+        ]
+        items.sort()
+        for codec in ("zlib", "lzma"):
+            with self.subTest(codec=codec):
+                data = encode_snapshot(items, 42, codec, block_size=4)
+                self.assertTrue(is_compressed(data))
+                decoded, seq = decode_snapshot(data)
+                self.assertEqual(seq, 42)
+                self.assertEqual(decoded, items)
+                # 字段顺序保持不变
+                self.assertEqual(list(dict(decoded)["user:李四"]), ["age", "name"])
+        self.assertEqual(decode_snapshot(encode_snapshot([], 0)), ([], 0))
+    
+    def test_parallel_decode(self):
+        """测试多线程解压时块的顺序与单线程一致"""
+        items = make_tasks(1000)
+        for codec in ("zlib", "lzma"):
+            with self.subTest(codec=codec):
+                data = encode_snapshot(items, 3, codec, block_size=7)
+                self.assertEqual(decode_snapshot(data, workers=4), (items, 3))
+                self.assertEqual(decode_snapshot(data, workers=1), (items, 3))
+    
+    def test_parse_compression(self):
+        """测试压缩设置解析"""
+        self.assertIsNone(parse_compression(None))
+        self.assertIsNone(parse_compression("none"))
+        self.assertEqual(parse_compression("zlib"), ("zlib", 6))
+        self.assertEqual(parse_compression("lzma:2"), ("lzma", 2))
+        with self.assertRaises(ValueError):
+            parse_compression("brotli")
+    
+    def test_smaller_than_pickle(self):
+        """测试比原始 pickle 和整体 zlib 压缩都小"""
+        items = make_tasks(5000)
+        raw = pickle.dumps(items)
+        encoded = encode_snapshot(items, 1, "zlib")
+        self.assertLess(len(encoded), len(raw) / 5)
+        self.assertLess(len(encoded), len(zlib.compress(raw)))
+
+
+class TestCompressedPersistence(unittest.TestCase):
+    """引擎压缩持久化"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_codec.dat"
+    
+    def tearDown(self):
+        """测试后清理"""
+        for path in glob.glob(self.test_file + "*"):
+            os.remove(path)
+    
+    def test_switch_between_formats(self):
+        """测试压缩与未压缩格式互相读取"""
+        engine = SBTStorageEngine(self.test_file, compression="lzma")
+        engine.tree.load(make_tasks(100))
+        engine.insert("task:extra", {"id": "extra"})
+        with open(self.test_file, 'rb') as f:
+            self.assertTrue(is_compressed(f.read()))
+        
+        plain = SBTStorageEngine(self.test_file)
+        self.assertEqual(plain.get_all(), engine.get_all())
+        self.assertEqual(plain.last_sequence(), engine.last_sequence())
+        plain.delete("task:extra")
+        with open(self.test_file, 'rb') as f:
+            self.assertFalse(is_compressed(f.read()))
+        
+        lazy = SBTStorageEngine(self.test_file, lazy=True, compression="zlib")
+        lazy.wait_until_loaded()
+        self.assertEqual(lazy.size(), 100)
+    
+    def test_lsm_compressed_runs(self):
+        """测试LSM引擎按块压缩 run，并可导入压缩快照"""
+        with open(self.test_file, 'wb') as f:
+            f.write(encode_snapshot(make_tasks(300), 7))
+        engine = LSMStorageEngine(self.test_file, memtable_limit=50, compression="zlib",
+                                  background_compaction=False)
+        self.assertEqual(engine.size(), 300)
+        self.assertEqual(engine.last_sequence(), 7)
+        for i in range(100):
+            engine.upsert(f"task:new-{i:03d}", {"id": i})
+        self.assertEqual(engine.search("task:new-042"), {"id": 42})
+        self.assertEqual(engine.search("task:task-00000005")["text"], "任务 5")
+        engine.compact()
+        reopened = LSMStorageEngine(self.test_file, background_compaction=False)
+        self.assertEqual(reopened.get_all(), engine.get_all())
+
+
+if __name__ == "__main__":
+    unittest.main()
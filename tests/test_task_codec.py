@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务记录编码测试
+"""
+
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.interfaces import Task
+from core.storage_adapter import TaskStorageAdapter
+from core.task_codec import (TASK_SCHEMA, TaskMigrator, decode_task, encode_task, from_micros,
+                             is_legacy, task_schedule, task_text, to_micros)
+from services.todo_service import TodoService
+from storage.sbt_engine import SBTEngineAdapter
+
+
+def legacy_record(task: Task) -> dict:
+    """旧版字典记录"""
+    return {
+        "id": task.id,
+        "text": task.text,
+        "completed": task.completed,
+        "created_at": task.created_at.isoformat(),
+        "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+        "due_at": task.due_at.isoformat() if task.due_at else None,
+        "remind_at": task.remind_at.isoformat() if task.remind_at else None,
+    }
+
+
+class TestTaskCodec(unittest.TestCase):
+    """编解码测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        now = datetime(2026, 10, 19, 9, 30, 15, 123456)
+        self.task = Task("t1", "写报告", True, now, now + timedelta(minutes=5),
+                         now + timedelta(days=1), now + timedelta(hours=20))
+    
+    def test_round_trip(self):
+        """测试编码后解码得到相同任务"""
+        record = encode_task(self.task)
+        self.assertEqual(record[0], TASK_SCHEMA)
+        self.assertEqual(decode_task(record), self.task)
+        
+        bare = Task("t2", "", False, datetime(1969, 12, 31, 23, 59, 59, 999999))
+        self.assertEqual(decode_task(encode_task(bare)), bare)
+    
+    def test_micros(self):
+        """测试微秒数转换"""
+        self.assertEqual(to_micros(datetime(1970, 1, 1, 0, 0, 1)), 1000000)
+        self.assertIsNone(to_micros(None))
+        self.assertIsNone(from_micros(None))
+        aware = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.assertEqual(from_micros(to_micros(aware)), aware.astimezone().replace(tzinfo=None))
+    
+    def test_legacy_record(self):
+        """测试旧版字典记录透明读取"""
+        record = legacy_record(self.task)
+        self.assertTrue(is_legacy(record))
+        self.assertFalse(is_legacy(encode_task(self.task)))
+        self.assertEqual(decode_task(record), self.task)
+        self.assertEqual(task_text(record), task_text(encode_task(self.task)))
+        self.assertEqual(task_schedule(record), task_schedule(encode_task(self.task)))
+        
+        # 更早的记录没有截止/提醒字段
+        del record["due_at"], record["remind_at"]
+        self.assertIsNone(decode_task(record).due_at)
+        self.assertEqual(task_schedule(record), (None, None))
+    
+    def test_unknown_schema(self):
+        """测试未知格式版本"""
+        record = (TASK_SCHEMA + 1,) + encode_task(self.task)[1:]
+        with self.assertRaises(ValueError):
+            decode_task(record)
+
+
+class TestTaskMigration(unittest.TestCase):
+    """旧版记录迁移测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_task_codec.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+        start = datetime(2026, 10, 19, 9, 0)
+        self.legacy = [Task(f"old{i}", f"旧任务 {i}", i % 2 == 0, start + timedelta(minutes=i),
+                            due_at=start + timedelta(hours=i)) for i in range(5)]
+        with self.engine.batch():
+            for task in self.legacy:
+                self.engine.insert(f"task:{task.id}", legacy_record(task))
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        self.repository.drop_index()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_mixed_records(self):
+        """测试新旧记录混合读取和检索"""
+        task = self.service.create_task("新任务")
+        self.assertFalse(is_legacy(self.engine.search(f"task:{task.id}")))
+        self.assertEqual(self.service.get_all_tasks(), self.legacy + [task])
+        self.assertEqual([t.id for t in self.service.search_tasks("旧任务 3")][:1], ["old3"])
+        due = self.repository.tasks_due_between(datetime(2026, 10, 19, 10, 0),
+                                                datetime(2026, 10, 19, 11, 0))
+        self.assertEqual([t.id for t in due], ["old1", "old2"])
+    
+    def test_migrate(self):
+        """测试迁移后记录为当前格式，内容和索引不变"""
+        self.service.search_tasks("旧任务")
+        self.assertEqual(sorted(self.repository.legacy_task_ids()), [t.id for t in self.legacy])
+        
+        migrator = TaskMigrator(self.repository, batch_size=2, pause=0)
+        self.assertEqual(migrator.run(), 5)
+        self.assertEqual(self.repository.legacy_task_ids(), [])
+        self.assertEqual(self.service.get_all_tasks(), self.legacy)
+        self.assertEqual(len(self.service.search_tasks("旧任务")), 5)
+        
+        reopened = TaskStorageAdapter(SBTEngineAdapter(self.test_file))
+        self.assertEqual(reopened.get_all_tasks(), self.legacy)
+        self.assertEqual(reopened.migrate_tasks(["old0"]), 0)
+    
+    def test_background_migration(self):
+        """测试后台迁移"""
+        migrator = TaskMigrator(self.repository, batch_size=1, pause=0).start()
+        self.assertTrue(migrator.join(timeout=5))
+        self.assertEqual(migrator.migrated, 5)
+        self.assertEqual(self.repository.legacy_task_ids(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
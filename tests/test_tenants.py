@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多租户任务仓库测试
+"""
+
+import unittest
+import gc
+import os
+import shutil
+import sys
+import weakref
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.metrics import metrics
+from core.tenants import TenantRepositories
+from services.todo_service import TodoService
+from storage.engines import create_storage_engine
+from storage.sbt_engine import SBTEngineAdapter
+
+
+class TestTenantRepositories(unittest.TestCase):
+    """租户隔离、统计、删除与按需加载"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.data_dir = "test_tenants_dir"
+        self.tenants = TenantRepositories(self.data_dir, SBTEngineAdapter, max_loaded=2)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.tenants.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+    
+    def add(self, tenant_id: str, text: str, completed: bool = False):
+        """为租户添加任务"""
+        service = TodoService(self.tenants.repository(tenant_id))
+        task = service.create_task(text)
+        if completed:
+            service.toggle_task(task.id)
+        return task
+    
+    def test_isolation(self):
+        """测试租户之间互不可见"""
+        task = self.add("alice", "alice 的任务")
+        self.add("bob", "bob 的任务")
+        self.assertEqual([t.text for t in self.tenants.repository("alice").get_all_tasks()],
+                         ["alice 的任务"])
+        self.assertIsNone(self.tenants.repository("bob").get_task(task.id))
+        self.assertEqual(self.tenants.tenants(), ["alice", "bob"])
+    
+    def test_stats(self):
+        """测试租户统计"""
+        self.add("alice", "一")
+        self.add("alice", "二", completed=True)
+        stats = self.tenants.stats("alice")
+        self.assertEqual((stats["tasks"], stats["completed"]), (2, 1))
+        self.assertGreater(stats["bytes"], 0)
+        self.assertEqual(self.tenants.stats("carol")["tasks"], 0)
+    
+    def test_lru_eviction_and_reload(self):
+        """测试超过上限时移出最久未使用的租户，再次访问时重新加载"""
+        for name in ("a", "b", "c"):
+            self.add(name, f"{name} 的任务")
+        self.assertEqual(self.tenants.loaded_tenants(), ["b", "c"])
+        
+        self.assertEqual([t.text for t in self.tenants.repository("a").get_all_tasks()], ["a 的任务"])
+        self.assertEqual(self.tenants.loaded_tenants(), ["c", "a"])
+        self.assertEqual(self.tenants.tenants(), ["a", "b", "c"])
+    
+    def test_evicted_tenant_released(self):
+        """测试移出的租户不被全局指标注册表持有"""
+        self.add("a", "a 的任务")
+        engine = weakref.ref(self.tenants._loaded["a"].engine)
+        gauge = metrics.get("storage_keys", engine="sbt", file=self.tenants.data_file("a"))
+        self.assertEqual(gauge.value, 1)
+        
+        self.assertTrue(self.tenants.evict("a"))
+        gc.collect()
+        self.assertIsNone(engine())
+        self.assertEqual(gauge.samples(), [])
+        
+        # 再次加载后仪表绑定到新的引擎
+        self.add("a", "又一个任务")
+        self.assertEqual(gauge.value, 2)
+    
+    def test_pinned_tenant_not_evicted(self):
+        """测试 use() 期间租户不会被移出"""
+        with self.tenants.use("a") as repository:
+            self.add("b", "任务")
+            self.add("c", "任务")
+            # 超出上限时跳过使用中的 a，移出 b
+            self.assertEqual(self.tenants.loaded_tenants(), ["a", "c"])
+            self.assertFalse(self.tenants.evict("a"))
+            self.assertEqual(self.tenants.evict_idle(0), ["c"])
+            self.assertIs(repository, self.tenants.repository("a"))
+        self.assertEqual(self.tenants.evict_idle(0), ["a"])
+        self.assertEqual(self.tenants.loaded_tenants(), [])
+    
+    def test_delete_tenant(self):
+        """测试删除租户的全部数据文件"""
+        self.add("alice", "任务")
+        self.add("bob", "任务")
+        self.assertTrue(self.tenants.delete_tenant("alice"))
+        self.assertFalse(os.path.exists(self.tenants.data_file("alice")))
+        self.assertEqual(self.tenants.tenants(), ["bob"])
+        self.assertEqual(self.tenants.stats("alice")["tasks"], 0)
+        self.assertFalse(self.tenants.delete_tenant("nobody"))
+    
+    def test_invalid_tenant_id(self):
+        """测试非法租户标识"""
+        for tenant_id in ("", "../etc", "a/b", "x" * 65):
+            with self.assertRaises(ValueError):
+                self.tenants.repository(tenant_id)
+    
+    def test_lsm_tenants(self):
+        """测试LSM引擎的租户移出时关闭引擎并可重新加载"""
+        tenants = TenantRepositories(self.data_dir, lambda path: create_storage_engine("lsm", path),
+                                     max_loaded=1)
+        try:
+            TodoService(tenants.repository("a")).create_task("lsm 任务")
+            tenants.repository("b")
+            self.assertEqual([t.text for t in tenants.repository("a").get_all_tasks()], ["lsm 任务"])
+        finally:
+            tenants.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
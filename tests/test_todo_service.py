@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Todo服务批量操作测试
+"""
+
+import unittest
+import io
+import json
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.storage_adapter import TaskStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+class TestBulkOperations(unittest.TestCase):
+    """批量操作测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_todo_bulk.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.repository = TaskStorageAdapter(self.engine)
+        self.service = TodoService(self.repository)
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.engine.clear()
+        self.repository.drop_index()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_create_toggle_delete_completed(self):
+        """测试批量创建、切换和清理已完成任务"""
+        tasks = self.service.create_tasks(["写代码", " ", "写测试", "写文档"])
+        self.assertEqual([t.text for t in tasks], ["写代码", "写测试", "写文档"])
+        
+        toggled = self.service.toggle_tasks([tasks[0].id, "task-missing", tasks[2].id])
+        self.assertEqual([t.id for t in toggled], [tasks[0].id, tasks[2].id])
+        self.assertTrue(all(t.completed for t in toggled))
+        
+        self.assertEqual(self.service.delete_completed(), 2)
+        self.assertEqual([t.text for t in self.service.get_all_tasks()], ["写测试"])
+        self.assertEqual(self.service.delete_completed(), 0)
+        
+        # 批次结束后已持久化
+        reopened = TodoService(TaskStorageAdapter(SBTEngineAdapter(self.test_file)))
+        self.assertEqual([t.text for t in reopened.get_all_tasks()], ["写测试"])
+    
+    def test_batch_persists_once(self):
+        """测试一个批次只保存一次"""
+        saves = []
+        save_to_disk = self.engine.engine.save_to_disk
+        self.engine.engine.save_to_disk = lambda: (saves.append(1), save_to_disk())
+        self.service.create_tasks(f"任务{i}" for i in range(50))
+        self.service.toggle_tasks(t.id for t in self.service.get_all_tasks())
+        self.service.delete_completed()
+        self.assertEqual(len(saves), 3)
+        self.assertEqual(self.service.get_all_tasks(), [])
+    
+    def test_export_import_round_trip(self):
+        """测试JSON Lines导出导入"""
+        tasks = self.service.create_tasks(["买菜", "做饭"])
+        self.service.toggle_task(tasks[1].id)
+        
+        stream = io.StringIO()
+        self.assertEqual(self.service.export_tasks(stream), 2)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[0])["text"], "买菜")
+        
+        self.engine.clear()
+        extra = ["", "not json", json.dumps({"text": "  "}), json.dumps({"text": "洗碗"})]
+        self.assertEqual(self.service.import_tasks(lines + extra), 3)
+        
+        imported = {t.text: t for t in self.service.get_all_tasks()}
+        self.assertEqual(set(imported), {"买菜", "做饭", "洗碗"})
+        self.assertEqual(imported["做饭"].id, tasks[1].id)
+        self.assertTrue(imported["做饭"].completed)
+        self.assertEqual(imported["买菜"].created_at, tasks[0].created_at)
+        self.assertEqual([t.text for t in self.service.search_tasks("洗碗")], ["洗碗"])
+    
+    
+    def test_concurrent_toggles(self):
+        """测试并发切换不会丢失写入"""
+        task = self.service.create_task("并发")
+        
+        def worker():
+            for _ in range(25):
+                self.service.toggle_task(task.id)
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertFalse(self.service.get_task(task.id).completed)
+        _, version = self.engine.search_with_version(f"task:{task.id}")
+        self.assertEqual(version, self.engine.last_sequence())
+        self.assertEqual(len(self.engine.changes_since(0)), 101)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+链路追踪测试
+"""
+
+import unittest
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.tracing import Tracer, tracer
+from core.storage_adapter import TaskStorageAdapter
+from storage.sbt_engine import SBTEngineAdapter
+from services.todo_service import TodoService
+
+
+class TestTracer(unittest.TestCase):
+    """追踪器测试"""
+    
+    def test_disabled_tracer_records_nothing(self):
+        """测试采样率为0时不记录"""
+        local = Tracer(sample_rate=0)
+        with local.span("root") as s:
+            s.set("key", "value")
+        self.assertEqual(len(local.traces), 0)
+    
+    def test_nested_spans_build_tree(self):
+        """测试嵌套span形成计时树"""
+        local = Tracer(sample_rate=1.0)
+        
+        @local.traced("inner")
+        def inner():
+            return 42
+        
+        with local.span("root", request="r1"):
+            with local.span("child"):
+                self.assertEqual(inner(), 42)
+        
+        self.assertEqual(len(local.traces), 1)
+        root = local.traces[0]
+        self.assertEqual(root.name, "root")
+        self.assertEqual([c.name for c in root.children], ["child"])
+        self.assertEqual(root.children[0].children[0].name, "inner")
+        self.assertIn("inner", local.format_tree(root))
+    
+    def test_unsampled_root_suppresses_children(self):
+        """测试未采样请求的子span不会成为新的根"""
+        local = Tracer(sample_rate=0.5)
+        local._random.random = lambda: 0.9
+        with local.span("root"):
+            with local.span("child"):
+                pass
+        self.assertEqual(len(local.traces), 0)
+    
+    def test_chrome_trace_export_and_profile(self):
+        """测试Chrome Trace导出与剖析"""
+        local = Tracer(sample_rate=1.0, profile=True)
+        with local.span("root"):
+            with local.span("child"):
+                sum(range(1000))
+        
+        path = "test_trace.json"
+        profile_path = "test_trace.prof"
+        try:
+            self.assertEqual(local.export_chrome_trace(path), 2)
+            with open(path, encoding="utf-8") as f:
+                events = json.load(f)["traceEvents"]
+            self.assertEqual({e["name"] for e in events}, {"root", "child"})
+            self.assertTrue(all(e["ph"] == "X" and e["dur"] >= 0 for e in events))
+            self.assertTrue(local.export_profile(profile_path))
+        finally:
+            for p in (path, profile_path):
+                if os.path.exists(p):
+                    os.remove(p)
+
+
+class TestStackTracing(unittest.TestCase):
+    """服务到存储层的追踪测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.test_file = "test_tracing.dat"
+        self.engine = SBTEngineAdapter(self.test_file)
+        self.service = TodoService(TaskStorageAdapter(self.engine))
+        tracer.clear()
+        tracer.configure(sample_rate=1.0)
+    
+    def tearDown(self):
+        """测试后清理"""
+        tracer.configure(sample_rate=0.0)
+        tracer.clear()
+        self.engine.clear()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+    
+    def test_toggle_task_spans(self):
+        """测试toggle_task的span覆盖各层"""
+        task = self.service.create_task("写周报")
+        tracer.clear()
+        self.service.toggle_task(task.id)
+        
+        self.assertEqual(len(tracer.traces), 1)
+        names = [s.name for s in tracer.traces[0].walk()]
+        self.assertEqual(names[0], "todo.toggle_task")
+        for expected in ["repo.update_task_with", "repo.deserialize_task",
+                         "sbt.tree_update", "sbt.save_to_disk"]:
+            self.assertIn(expected, names)
+
+
+if __name__ == "__main__":
+    unittest.main()